@@ -0,0 +1,353 @@
+"""
+End-to-end load test of the web app against the stub LLM backend
+
+Starts the app under gunicorn (gunicorn.conf.py, with LLM_BACKEND=stub so
+no request leaves the machine), then drives each endpoint
+with a closed loop of concurrent clients for a fixed time per concurrency
+level. Reports throughput, latency percentiles, errors and the memory of the
+server processes (RSS and PSS summed over the master and workers).
+
+Endpoints:
+    chat         POST /chat, JSON reply; each client holds a conversation of --turns messages
+    chat_stream  POST /chat with "stream": true; also reports time to first token event
+    index        GET /
+    health       GET /health
+    reload       POST /reload-data (unchanged data files are not parsed again)
+
+--server picks the deployment mode: "wsgi" (src.web_embed_generator:app on
+gthread workers) or "asgi" (src.asgi:app on uvicorn workers, SERVER_MODE=asgi).
+Pass both to compare them; a slow stub LLM (--first-token-ms) and few threads
+show how many requests each mode can wait on per worker.
+
+Results can be written as JSON and compared with a previous run, e.g. from
+the parent commit; --compare exits non-zero when a result regresses by more
+than --threshold.
+
+Usage:
+    python benchmarks/bench_app.py [--concurrency 1 8 32] [--duration 10] [--json results.json]
+    python benchmarks/bench_app.py --compare baseline.json [--threshold 0.1]
+    python benchmarks/bench_app.py --server wsgi asgi --endpoints chat chat_stream --first-token-ms 2000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import aiohttp
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import chatbot_config as config
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENDPOINTS = ("chat", "chat_stream", "index", "health", "reload")
+SERVERS = {"wsgi": "src.web_embed_generator:app", "asgi": "src.asgi:app"}
+TOPICS = ["billing", "refunds", "accounts", "passwords", "shipping", "orders", "plans", "invoices"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(root_pid):
+    """The pid of the server master and all of its descendants"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces, the parent pid follows it
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree = [root_pid]
+    for pid in tree:
+        tree += [child for child, parent in parents.items() if parent == pid]
+    return tree
+
+
+def server_memory_mb(root_pid):
+    """RSS and PSS of the server process tree (Linux)"""
+    rss = pss = 0.0
+    for pid in process_tree(root_pid):
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    parts = line.split()
+                    if parts[0] == "Rss:":
+                        rss += int(parts[1]) / 1024
+                    elif parts[0] == "Pss:":
+                        pss += int(parts[1]) / 1024
+        except OSError:
+            continue
+    return rss, pss
+
+
+def start_server(args, mode, port):
+    env = dict(os.environ)
+    env.update({
+        "SERVER_MODE": mode,
+        "LLM_BACKEND": "stub",
+        "STUB_LLM_FIRST_TOKEN_MS": str(args.first_token_ms),
+        "STUB_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "GUNICORN_WORKERS": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads),
+    })
+    if args.no_cache:
+        env["RESPONSE_CACHE_BACKEND"] = "none"
+    # Every virtual user comes from the same address, so per-client rate limits would stop the run
+    env["RATE_LIMIT_PER_MINUTE"] = "0"
+    if args.no_admission:
+        env["ADMISSION_ENABLED"] = "0"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}",
+         "--log-level", "warning", SERVERS[mode]],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL
+    )
+    # /health answers 503 until a worker has warmed up
+    deadline = time.monotonic() + 60
+    url = f"http://127.0.0.1:{port}/health"
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The server exited during startup, rerun with --verbose")
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("The server did not become healthy within 60s")
+
+
+class Client:
+    """One closed-loop virtual user"""
+
+    def __init__(self, http, base_url, endpoint, turns, rng):
+        self.http = http
+        self.base_url = base_url
+        self.endpoint = endpoint
+        self.turns = turns
+        self.rng = rng
+        self.session_id = None
+        self.turn = 0
+
+    def question(self):
+        topic = self.rng.choice(TOPICS)
+        return f"How do I change my {topic} settings for workspace {self.rng.randrange(1000)}?"
+
+    async def request(self):
+        """Make one request; returns (seconds to first token or None, ok)"""
+        if self.endpoint == "index":
+            return None, await self._get("/")
+        if self.endpoint == "health":
+            return None, await self._get("/health")
+        if self.endpoint == "reload":
+            async with self.http.post(f"{self.base_url}/reload-data") as response:
+                await response.read()
+                return None, response.status == 200
+
+        if self.turn >= self.turns:
+            self.session_id, self.turn = None, 0
+        self.turn += 1
+        headers = {config.SESSION_HEADER_NAME: self.session_id} if self.session_id else {}
+        body = {"message": self.question(), "stream": self.endpoint == "chat_stream"}
+        start = time.perf_counter()
+        async with self.http.post(f"{self.base_url}/chat", json=body, headers=headers) as response:
+            if self.endpoint == "chat":
+                data = await response.json(content_type=None)
+                self.session_id = data.get("session_id")
+                return None, response.status == 200 and "response" in data
+            first_token = None
+            async for _ in response.content.iter_any():
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+            cookie = response.cookies.get(config.SESSION_COOKIE_NAME)
+            if cookie is not None:
+                self.session_id = cookie.value
+            return first_token, response.status == 200
+
+    async def _get(self, path):
+        async with self.http.get(f"{self.base_url}{path}") as response:
+            await response.read()
+            return response.status == 200
+
+
+async def run_level(base_url, mode, endpoint, concurrency, duration, turns, server_pid, seed):
+    latencies, first_tokens = [], []
+    errors = 0
+    peak = [0.0, 0.0]
+    stop = time.perf_counter() + duration
+
+    async def user(i):
+        nonlocal errors
+        # Distinct questions per level, so one level doesn't warm the response cache for the next
+        rng = random.Random(f"{seed}:{mode}:{endpoint}:{concurrency}:{i}")
+        client = Client(http, base_url, endpoint, turns, rng)
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                first_token, ok = await client.request()
+            except aiohttp.ClientError:
+                first_token, ok = None, False
+            if not ok:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if first_token is not None:
+                first_tokens.append(first_token)
+
+    async def sample_memory():
+        while time.perf_counter() < stop:
+            rss, pss = server_memory_mb(server_pid)
+            peak[0], peak[1] = max(peak[0], rss), max(peak[1], pss)
+            await asyncio.sleep(0.5)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as http:
+        start = time.perf_counter()
+        await asyncio.gather(sample_memory(), *(user(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    def percentiles(values):
+        if not values:
+            return None
+        values = np.array(values) * 1000
+        return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)), "mean": float(values.mean()), "max": float(values.max())}
+
+    return {
+        "server": mode,
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_ms": percentiles(latencies),
+        "first_token_ms": percentiles(first_tokens),
+        "memory_mb": {"rss_peak": peak[0], "pss_peak": peak[1]},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result):
+    latency = result["latency_ms"] or {}
+    first_token = result["first_token_ms"]
+    print(f"{result['server']:>6} {result['endpoint']:>12} {result['concurrency']:>5} {result['throughput_rps']:>9.1f} "
+          f"{latency.get('p50', 0):>9.1f} {latency.get('p95', 0):>9.1f} {latency.get('p99', 0):>9.1f} "
+          f"{first_token['p50'] if first_token else 0:>9.1f} {result['errors']:>7} "
+          f"{result['memory_mb']['rss_peak']:>8.0f} {result['memory_mb']['pss_peak']:>8.0f}")
+
+
+def compare(results, baseline_path, threshold):
+    """Print changes against a baseline run; returns the number of regressions"""
+    with open(baseline_path) as f:
+        # Runs from before --server existed were all WSGI
+        baseline = {(r.get("server", "wsgi"), r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path} (regression threshold {threshold:.0%}):")
+    print(f"{'server':>6} {'endpoint':>12} {'conc':>5} {'rps':>9} {'p95':>9} {'p99':>9} {'rss peak':>9}")
+    regressions = 0
+    for result in results:
+        old = baseline.get((result["server"], result["endpoint"], result["concurrency"]))
+        if old is None or not old["latency_ms"] or not result["latency_ms"]:
+            continue
+        changes = {
+            "rps": result["throughput_rps"] / old["throughput_rps"] - 1,
+            "p95": result["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1,
+            "p99": result["latency_ms"]["p99"] / old["latency_ms"]["p99"] - 1,
+            "rss": result["memory_mb"]["rss_peak"] / old["memory_mb"]["rss_peak"] - 1
+            if old["memory_mb"]["rss_peak"] else 0.0,
+        }
+        # Lower throughput is worse, higher latency and memory are worse
+        worse = [-changes["rps"], changes["p95"], changes["p99"], changes["rss"]]
+        flag = " REGRESSION" if max(worse) > threshold else ""
+        regressions += bool(flag)
+        print(f"{result['server']:>6} {result['endpoint']:>12} {result['concurrency']:>5} {changes['rps']:>+9.1%} {changes['p95']:>+9.1%} "
+              f"{changes['p99']:>+9.1%} {changes['rss']:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", nargs="+", choices=sorted(SERVERS), default=["wsgi"],
+                        help="deployment modes to run, one after the other")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per endpoint and concurrency level")
+    parser.add_argument("--turns", type=int, default=3, help="chat messages per conversation")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--first-token-ms", type=float, default=300, help="median stub time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="mean stub token rate")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--no-admission", action="store_true",
+                        help="disable load shedding; rejected requests otherwise count as errors")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="compare with the JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--verbose", action="store_true", help="show the server's log")
+    args = parser.parse_args()
+
+    results, idle_memory = [], {}
+    for mode in args.server:
+        port = free_port()
+        server = start_server(args, mode, port)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            idle_rss, idle_pss = server_memory_mb(server.pid)
+            idle_memory[mode] = {"rss": idle_rss, "pss": idle_pss}
+            workers = f"{args.threads} threads" if mode == "wsgi" else "an event loop"
+            print(f"{mode.upper()}: gunicorn with {args.workers} workers x {workers}, stub LLM "
+                  f"({args.first_token_ms:.0f}ms to first token, {args.tokens_per_second:.0f} tokens/s), "
+                  f"idle memory {idle_rss:.0f}MB RSS / {idle_pss:.0f}MB PSS\n")
+            print(f"{'server':>6} {'endpoint':>12} {'conc':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} "
+                  f"{'p99 ms':>9} {'ttft p50':>9} {'errors':>7} {'RSS MB':>8} {'PSS MB':>8}")
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    result = asyncio.run(run_level(base_url, mode, endpoint, concurrency, args.duration,
+                                                   args.turns, server.pid, args.seed))
+                    results.append(result)
+                    print_result(result)
+            print()
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "meta": {
+                    "commit": git_commit(),
+                    "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "cpus": os.cpu_count(),
+                    "idle_memory_mb": idle_memory,
+                    "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare", "verbose")},
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"Wrote {args.json}")
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
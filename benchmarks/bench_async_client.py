@@ -0,0 +1,104 @@
+"""
+Load test the blocking and pooled async completion paths against a local stub
+
+Starts benchmarks/stub_openai_server.py, then measures requests per second
+for a single worker using the old blocking openai.ChatCompletion.create call
+and the pooled async client behind Chatbot.get_response.
+
+Usage:
+    python benchmarks/bench_async_client.py [--requests 400] [--concurrency 200] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import openai
+from config import chatbot_config as config
+from src.chatbot_logic import Chatbot
+from src.session_store import ConversationSession
+
+STUB_SERVER = os.path.join(os.path.dirname(__file__), 'stub_openai_server.py')
+
+
+def start_stub_server(port, latency):
+    """Start the stub OpenAI server and wait until it accepts connections"""
+    process = subprocess.Popen(
+        [sys.executable, STUB_SERVER, '--port', str(port), '--latency', str(latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Stub server did not start")
+
+
+def bench_blocking(num_requests):
+    """One sync worker: each request blocks until its completion returns"""
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        openai.ChatCompletion.create(
+            model=config.OPENAI_MODEL,
+            messages=[{"role": "user", "content": "How do I integrate the chatbot?"}],
+            max_tokens=config.MAX_TOKENS,
+            temperature=config.TEMPERATURE
+        )
+    return num_requests / (time.perf_counter() - start)
+
+
+async def bench_async(num_requests, concurrency):
+    """One worker: many sessions in flight on the pooled client"""
+    bot = Chatbot(use_defaults=True)
+    bot.completion_client.max_concurrency = concurrency
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one_chat():
+        async with limit:
+            return await bot.get_response("How do I integrate the chatbot?", session=ConversationSession("bench"))
+
+    await asyncio.gather(one_chat())  # warm up the loop and connection pool
+    start = time.perf_counter()
+    replies = await asyncio.gather(*(one_chat() for _ in range(num_requests)))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for reply in replies if reply.startswith("I apologize"))
+    return num_requests / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.2, help="Stub upstream latency in seconds")
+    parser.add_argument('--port', type=int, default=8099)
+    args = parser.parse_args()
+
+    openai.api_base = f"http://127.0.0.1:{args.port}/v1"
+    openai.api_key = "sk-stub"
+    server = start_stub_server(args.port, args.latency)
+    try:
+        blocking_requests = max(1, min(args.requests, int(5 / args.latency)))
+        before = bench_blocking(blocking_requests)
+        after, errors = asyncio.run(bench_async(args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"Upstream latency:             {args.latency * 1000:.0f} ms")
+    print(f"Blocking client (before):    {before:8.1f} req/s per worker ({blocking_requests} requests)")
+    print(f"Pooled async client (after): {after:8.1f} req/s per worker "
+          f"({args.requests} requests, concurrency {args.concurrency}, {errors} errors)")
+    print(f"Speedup:                      {after / before:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark upstream calls saved by single-flight coalescing under a traffic trace
+
+Replays a trace of widget questions against the chatbot with a simulated
+completion backend (fixed latency, no network) and counts the upstream calls
+made with and without coalescing. The response cache is off unless --cache is
+given, so the saving comes from coalescing concurrent requests alone.
+
+The default trace is synthetic: Poisson arrivals with Zipf-distributed
+question popularity and bursts where one trending question dominates. A real
+trace can be given as a JSONL file of {"t": seconds, "question": "..."} lines.
+
+Usage:
+    python benchmarks/bench_coalescing.py [--trace trace.jsonl] [--rate 50] [--latency 1.5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import chatbot_config as config
+from src.chatbot_logic import Chatbot
+from src.response_cache import MemoryCacheBackend, ResponseCache
+from src.session_store import ConversationSession
+
+TOPICS = ["outage", "pricing change", "new release", "password reset", "refund", "invoice",
+          "api limits", "data export", "sso setup", "mobile app"]
+
+
+class SimulatedClient:
+    """Completion client that answers every request after a fixed latency"""
+
+    model = "simulated"
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _reply(self, params):
+        question = params["messages"][-1]["content"].rsplit("\n", 1)[-1]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"About {question}"))])
+
+    def submit(self, **params):
+        with self._lock:
+            self.calls += 1
+        future = Future()
+        threading.Timer(self.latency, future.set_result, args=(self._reply(params),)).start()
+        return future
+
+    async def create(self, **params):
+        return await asyncio.wrap_future(self.submit(**params))
+
+
+def synthetic_trace(duration, rate, seed=7):
+    """Bursty arrivals: a Zipf mix of questions plus periodic trending spikes"""
+    rng = random.Random(seed)
+    questions = [f"Is there an update about the {topic}?" for topic in TOPICS]
+    questions += [f"How do I configure option {i} for my team?" for i in range(200)]
+    weights = [1 / (rank + 1) for rank in range(len(questions))]
+    trace = []
+    t = 0.0
+    while t < duration:
+        t += rng.expovariate(rate)
+        # Every 10 seconds, a 2 second burst where most visitors ask the trending question
+        burst = t % 10 < 2
+        if burst and rng.random() < 0.7:
+            question = questions[int(t // 10) % len(TOPICS)]
+        else:
+            question = rng.choices(questions, weights)[0]
+        trace.append((t, question))
+    return trace
+
+
+def load_trace(path):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    start = min(record["t"] for record in records)
+    return sorted((record["t"] - start, record["question"]) for record in records)
+
+
+async def replay(bot, trace, speed):
+    async def visitor(i, t, question):
+        await asyncio.sleep(t / speed)
+        await bot.get_response(question, ConversationSession(f"visitor-{i:08d}"))
+
+    await asyncio.gather(*(visitor(i, t, question) for i, (t, question) in enumerate(trace)))
+
+
+def run(trace, latency, speed, coalesce, cache):
+    config.COALESCE_COMPLETIONS = coalesce
+    bot = Chatbot(use_defaults=True)
+    bot.completion_client = SimulatedClient(latency / speed)
+    bot.summarizer = None
+    # A fresh in-memory cache per run, so the second run doesn't reuse the first one's answers
+    bot.response_cache = ResponseCache(MemoryCacheBackend()) if cache else None
+    asyncio.run(replay(bot, trace, speed))
+    return bot.completion_client.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="JSONL trace of {\"t\": seconds, \"question\": ...}")
+    parser.add_argument("--duration", type=float, default=60, help="synthetic trace length in seconds")
+    parser.add_argument("--rate", type=float, default=50, help="synthetic requests per second")
+    parser.add_argument("--latency", type=float, default=1.5, help="simulated completion latency in seconds")
+    parser.add_argument("--speed", type=float, default=10, help="replay speed-up factor")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on")
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(args.duration, args.rate)
+    print(f"{len(trace)} requests, {len(set(q for _, q in trace))} distinct questions, "
+          f"{args.latency}s completion latency, response cache {'on' if args.cache else 'off'}\n")
+
+    coalesce_enabled = config.COALESCE_COMPLETIONS
+    try:
+        baseline = run(trace, args.latency, args.speed, False, args.cache)
+        coalesced = run(trace, args.latency, args.speed, True, args.cache)
+    finally:
+        config.COALESCE_COMPLETIONS = coalesce_enabled
+    print(f"{'mode':>12} {'upstream calls':>15} {'saved':>9}")
+    print(f"{'per request':>12} {baseline:>15} {'':>9}")
+    print(f"{'coalesced':>12} {coalesced:>15} {1 - coalesced / baseline if baseline else 0:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark peak memory of loading FAQ corpora, whole-file read vs streaming
+
+Generates synthetic FAQ files of increasing size and measures, in a fresh
+subprocess per run, the peak RSS added by parsing them with the original
+read/split approach and with the streaming reader in src/corpus_reader.py.
+
+Usage:
+    python benchmarks/bench_corpus_loader.py [--sizes-mb 50 200 800] [--format txt]
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.corpus_reader import iter_faq_records
+
+MODES = ("read-split", "stream", "stream-dict")
+
+
+def write_corpus(path, size_mb, file_format):
+    """Write a synthetic FAQ file of roughly size_mb megabytes"""
+    target = size_mb * 1024 * 1024
+    written = 0
+    i = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f) if file_format == 'csv' else None
+        if writer:
+            writer.writerow(["question", "answer"])
+        while written < target:
+            question = f"How do I configure option {i} for service {i % 977}?"
+            answer = f"Option {i} is configured from the settings page of service {i % 977}. " * 3
+            if file_format == 'jsonl':
+                record = json.dumps({"question": question, "answer": answer}) + "\n"
+                f.write(record)
+            elif writer:
+                writer.writerow([question, answer])
+                record = question + answer
+            else:
+                record = f"{question}\n{answer}\n\n"
+                f.write(record)
+            written += len(record)
+            i += 1
+    return i
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, path):
+    """Parse a corpus in this process and print records, seconds and added peak RSS"""
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "read-split":
+        # The original DataLoader._read_faqs (text format only)
+        with open(path, 'r') as f:
+            content = f.read().strip().split('\n\n')
+        faqs = {}
+        for qa in content:
+            if '?' in qa:
+                q, a = qa.split('?', 1)
+                faqs[q.strip() + '?'] = a.strip()
+        records = len(faqs)
+    elif mode == "stream":
+        records = sum(1 for _ in iter_faq_records(path))
+    else:
+        faqs = dict(iter_faq_records(path))
+        records = len(faqs)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"records": records, "seconds": elapsed, "peak_rss_mb": peak_rss_mb() - baseline}))
+
+
+def measure(mode, path):
+    output = subprocess.run(
+        [sys.executable, __file__, "--run-mode", mode, "--path", path],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--format", choices=["txt", "jsonl", "csv"], default="txt")
+    parser.add_argument("--run-mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        run_mode(args.run_mode, args.path)
+        return
+
+    modes = MODES if args.format == "txt" else MODES[1:]
+    print(f"{'size':>8} {'records':>10} {'mode':>12} {'seconds':>9} {'peak RSS +MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes_mb:
+            path = os.path.join(tmp, f"faqs_{size_mb}.{args.format}")
+            write_corpus(path, size_mb, args.format)
+            for mode in modes:
+                result = measure(mode, path)
+                print(f"{size_mb:>6}MB {result['records']:>10} {mode:>12} "
+                      f"{result['seconds']:>9.2f} {result['peak_rss_mb']:>13.1f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of prompt construction with large FAQ sets
+
+Compares the original per-request context rendering (repeated string
+concatenation) with the memoized DataLoader.get_context, and times a full
+Chatbot._create_prompt on top of it.
+
+Usage:
+    python benchmarks/bench_prompt_build.py [--sizes 1000 10000 50000] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import chatbot_config as config
+from src.chatbot_logic import Chatbot
+from src.data_loader import KnowledgeSnapshot
+
+
+def render_context_uncached(data_loader):
+    """The original get_context: rebuilt with += on every call"""
+    context = "I am a helpful AI assistant ready to help you.\n\n"
+    if data_loader.training_data:
+        context += f"Additional Training Context:\n{data_loader.training_data}\n\n"
+    if data_loader.faqs:
+        context += "Frequently Asked Questions:\n"
+        for q, a in data_loader.faqs.items():
+            context += f"Q: {q}\nA: {a}\n\n"
+    return context.strip()
+
+
+def time_per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(size, repeat):
+    bot = Chatbot(use_defaults=True)
+    loader = bot.data_loader
+    loader.snapshot = KnowledgeSnapshot({
+        f"How do I configure option number {i} for my deployment?": f"Set option {i} in the settings panel and restart the service."
+        for i in range(size)
+    }, loader.training_data)
+
+    uncached = time_per_call(lambda: render_context_uncached(loader), repeat)
+    start = time.perf_counter()
+    loader.get_context()
+    first_build = (time.perf_counter() - start) * 1000
+    cached = time_per_call(loader.get_context, repeat)
+
+    retrieval_enabled = config.RETRIEVAL_ENABLED
+    config.RETRIEVAL_ENABLED = False
+    try:
+        prompt = time_per_call(lambda: bot._create_prompt("How do I configure option 7?"), repeat)
+    finally:
+        config.RETRIEVAL_ENABLED = retrieval_enabled
+
+    assert render_context_uncached(loader) == loader.get_context()
+    print(f"{size:>8,} | {uncached:>12.2f} ms | {first_build:>12.2f} ms | {cached:>12.4f} ms | {prompt:>12.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'FAQs':>8} | {'Uncached':>15} | {'First build':>15} | {'Memoized':>15} | {'Full prompt':>15}")
+    for size in args.sizes:
+        run(size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
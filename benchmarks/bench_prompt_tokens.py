@@ -0,0 +1,92 @@
+"""
+Benchmark input tokens per request, flattened prompt vs role-separated messages
+
+Replays a multi-turn conversation against a synthetic FAQ set and counts the
+input tokens of each request with the original layout (the system prompt sent
+twice, context and a text transcript flattened into one user message, the
+current question repeated) and with the role-separated messages of
+PromptBuilder. Both get the same context, cut to CONTEXT_TOKEN_BUDGET, so
+the difference is down to the layout alone. Also reports how many tokens sit in the stable system-message
+prefix that provider-side prompt caching can reuse.
+
+Usage:
+    python benchmarks/bench_prompt_tokens.py [--faqs 200 2000] [--turns 8]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import chatbot_config as config
+from src.data_loader import DataLoader, KnowledgeSnapshot
+from src.prompt_builder import create_prompt_builder
+
+TOPICS = ["billing", "refunds", "accounts", "passwords", "shipping", "orders", "plans", "invoices"]
+
+
+def original_messages(loader, counter, history, user_input):
+    """The messages the chatbot sent before role separation (history includes the input)"""
+    context = counter.truncate(loader.get_context(user_input), config.CONTEXT_TOKEN_BUDGET)
+    conv_history = ""
+    for role, content in history[-5:]:
+        conv_history += f"{'User' if role == 'user' else 'Assistant'}: {content}\n"
+    prompt = (f"{config.DEFAULT_SYSTEM_PROMPT}\n\nContext:\n{context}\n\nConversation History:\n"
+              f"{conv_history}\nUser: {user_input}\nAssistant:")
+    return [
+        {"role": "system", "content": config.DEFAULT_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def run(faq_count, turns, retrieval):
+    config.RETRIEVAL_ENABLED = retrieval
+    loader = DataLoader(None, use_defaults=True)
+    loader.snapshot = KnowledgeSnapshot({
+        f"How do I update my {TOPICS[i % len(TOPICS)]} settings for workspace {i}?":
+            f"Open the {TOPICS[i % len(TOPICS)]} page of workspace {i}, change the settings and save."
+        for i in range(faq_count)
+    }, "Support is available on weekdays from 9 to 5. Refunds are processed within five business days.")
+    builder = create_prompt_builder()
+    counter = builder.counter
+
+    history = []
+    old_total = new_total = prefix_total = 0
+    for turn in range(turns):
+        user_input = f"How do I update my {TOPICS[turn % len(TOPICS)]} settings for workspace {turn * 7}?"
+        answer = f"To update {TOPICS[turn % len(TOPICS)]} settings, open the page for workspace {turn * 7}. " * 3
+
+        static_context, context = loader.get_context_parts(user_input)
+        prompt = builder.build(config.DEFAULT_SYSTEM_PROMPT, static_context, context, history, user_input)
+        old = counter.count_messages(original_messages(loader, counter, history + [("user", user_input)], user_input))
+        old_total += old
+        new_total += prompt.usage["total"]
+        prefix_total += prompt.usage["prefix"]
+        history += [("user", user_input), ("assistant", answer)]
+
+    mode = "retrieval" if retrieval else "full context"
+    print(f"{faq_count:>7} {mode:>13} {old_total / turns:>12.0f} {new_total / turns:>12.0f} "
+          f"{1 - new_total / old_total:>9.1%} {prefix_total / turns:>13.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faqs", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--turns", type=int, default=8)
+    args = parser.parse_args()
+
+    counter = create_prompt_builder().counter
+    print(f"Token counts are {'exact (tiktoken)' if counter.exact else 'estimated'}; "
+          f"averages per request over {args.turns} turns\n")
+    print(f"{'FAQs':>7} {'mode':>13} {'flattened':>12} {'role-split':>12} {'saved':>9} {'stable prefix':>13}")
+    retrieval_enabled = config.RETRIEVAL_ENABLED
+    try:
+        for faq_count in args.faqs:
+            for retrieval in (True, False):
+                run(faq_count, args.turns, retrieval)
+    finally:
+        config.RETRIEVAL_ENABLED = retrieval_enabled
+
+
+if __name__ == "__main__":
+    main()
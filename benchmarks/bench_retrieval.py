@@ -0,0 +1,83 @@
+"""
+Benchmark prompt size and index build/query time for retrieval-based context
+
+Generates synthetic FAQ sets and compares the full-dump context with the
+top-k retrieved context.
+
+Usage:
+    python benchmarks/bench_retrieval.py [--sizes 10000 100000 1000000] [--queries 200]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import chatbot_config as config
+from src.retrieval import RetrievalIndex, estimate_tokens
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "su", "ra", "to", "vi", "pe", "zu", "do", "fa", "gi", "hu", "ja", "be"]
+
+
+def make_vocabulary(size, rng):
+    """Build a vocabulary of pronounceable synthetic words"""
+    words = set()
+    while len(words) < size:
+        length = rng.integers(2, 5)
+        words.add("".join(rng.choice(SYLLABLES, size=length)))
+    return np.array(sorted(words))
+
+
+def make_faqs(count, vocabulary, rng):
+    """Generate FAQ pairs with a Zipf-like word distribution"""
+    ranks = np.arange(1, len(vocabulary) + 1)
+    probabilities = 1.0 / ranks
+    probabilities /= probabilities.sum()
+    question_words = vocabulary[rng.choice(len(vocabulary), size=(count, 10), p=probabilities)]
+    answer_words = vocabulary[rng.choice(len(vocabulary), size=(count, 30), p=probabilities)]
+    return [
+        (" ".join(q) + "?", " ".join(a) + ".")
+        for q, a in zip(question_words, answer_words)
+    ]
+
+
+def run(size, num_queries, vocabulary, rng):
+    faqs = make_faqs(size, vocabulary, rng)
+    passages = [f"Q: {q}\nA: {a}" for q, a in faqs]
+    full_tokens = sum(estimate_tokens(p) for p in passages)
+
+    start = time.perf_counter()
+    index = RetrievalIndex(passages)
+    build_time = time.perf_counter() - start
+
+    queries = [faqs[i][0] for i in rng.integers(0, size, size=num_queries)]
+    prompt_tokens = []
+    start = time.perf_counter()
+    for query in queries:
+        selected = index.select(query, top_k=config.RETRIEVAL_TOP_K, token_budget=config.CONTEXT_TOKEN_BUDGET)
+        prompt_tokens.append(sum(estimate_tokens(p) for p in selected))
+    query_time = (time.perf_counter() - start) / num_queries
+
+    print(f"{size:>10,} | {full_tokens:>14,} | {np.mean(prompt_tokens):>15,.0f} | "
+          f"{build_time:>9.2f} s | {query_time * 1000:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    print(f"top_k={config.RETRIEVAL_TOP_K}, token budget={config.CONTEXT_TOKEN_BUDGET}")
+    print(f"{'FAQs':>10} | {'Full ctx tokens':>14} | {'Retrieved tokens':>15} | {'Build':>11} | {'Query':>11}")
+    for size in args.sizes:
+        run(size, args.queries, vocabulary, rng)
+
+
+if __name__ == "__main__":
+    main()
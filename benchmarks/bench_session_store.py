@@ -0,0 +1,73 @@
+"""
+Benchmark memory per session and lookup latency of the session store
+
+Usage:
+    python benchmarks/bench_session_store.py [--sessions 10000] [--lookups 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.session_store import SessionStore
+
+SAMPLE_TURNS = [
+    ("user", "Hi, how do I integrate the chatbot with my website?"),
+    ("assistant", "Add the provided JavaScript widget code to your site and make sure the backend server is running."),
+    ("user", "Is the conversation secure?"),
+    ("assistant", "Yes, conversations are processed securely using industry-standard encryption."),
+]
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a sorted list"""
+    index = min(len(samples) - 1, int(len(samples) * pct / 100))
+    return samples[index]
+
+
+def run(num_sessions, num_lookups):
+    store = SessionStore(max_sessions=num_sessions, ttl_seconds=3600, max_bytes=1024 * 1024 * 1024)
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    session_ids = []
+    for i in range(num_sessions):
+        session = store.get_or_create()
+        for role, content in SAMPLE_TURNS:
+            # Unique strings so the measurement includes message text
+            session.add_message(role, f"{content} ({i})")
+        session.conversation_steps = len(SAMPLE_TURNS) // 2
+        store.save(session)
+        session_ids.append(session.session_id)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(42)
+    timings = []
+    for _ in range(num_lookups):
+        session_id = rng.choice(session_ids)
+        start = time.perf_counter_ns()
+        store.get(session_id)
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+
+    stats = store.stats()
+    print(f"Active sessions:          {stats['active_sessions']}")
+    print(f"Messages per session:     {len(SAMPLE_TURNS)}")
+    print(f"Measured memory/session:  {(after - before) / num_sessions:.0f} bytes")
+    print(f"Estimated memory/session: {stats['bytes'] / num_sessions:.0f} bytes (store accounting)")
+    print(f"Lookup latency p50:       {percentile(timings, 50) / 1000:.2f} us")
+    print(f"Lookup latency p99:       {percentile(timings, 99) / 1000:.2f} us")
+    print(f"Lookups per second:       {num_lookups / (sum(timings) / 1e9):,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=200000)
+    args = parser.parse_args()
+    run(args.sessions, args.lookups)
@@ -0,0 +1,120 @@
+"""
+Benchmark worker cold start and memory, text data files vs a compiled snapshot
+
+Generates a synthetic data directory, compiles it with src/snapshot.py and
+measures, in a fresh subprocess per run (like a new gunicorn worker), the
+app's real warm-up (web_embed_generator.warm_up(): loading, warming and
+publishing the data to the shared state store) and a first retrieval query,
+plus the memory added.
+Private dirty memory (heap the worker wrote itself) is what each extra worker
+costs; the clean pages of the mapped snapshot are shared between workers
+through the page cache.
+
+Usage:
+    python benchmarks/bench_snapshot.py [--faqs 10000 100000 500000] [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.snapshot import compile_snapshot, default_snapshot_path, source_signature
+
+TOPICS = ["billing", "refunds", "accounts", "passwords", "shipping", "orders", "plans", "invoices",
+          "exports", "teams", "api", "webhooks", "security", "backups", "limits", "reports"]
+
+
+def write_data(data_dir, count):
+    """Write a FAQ file with count entries and some training data"""
+    with open(os.path.join(data_dir, "training_faqs.txt"), 'w') as f:
+        for i in range(count):
+            topic = TOPICS[i % len(TOPICS)]
+            f.write(f"How do I manage {topic} setting {i} in workspace {i % 991}?\n"
+                    f"Open the {topic} page, select setting {i} and save the workspace {i % 991} changes.\n\n")
+    with open(os.path.join(data_dir, "training_data.txt"), 'w') as f:
+        for i in range(max(1, count // 20)):
+            f.write(f"Workspace {i} keeps its {TOPICS[i % len(TOPICS)]} history for {i % 90} days. "
+                    f"Owners can change this from the admin console.\n\n")
+
+
+def memory_mb():
+    """Current RSS and private dirty memory of this process (Linux)"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return values.get("Rss", 0.0), values.get("Private_Dirty", 0.0)
+
+
+def run_mode(mode, data_dir):
+    """Warm up the app like a fresh worker and print timings and memory"""
+    from config import chatbot_config as config
+    config.DATA_DIR = data_dir
+    config.KNOWLEDGE_SNAPSHOT_ENABLED = mode == "snapshot"
+    config.STATE_BACKEND = "sqlite"
+    config.STATE_PATH = os.path.join(data_dir, f"state-{mode}.sqlite3")
+    from src import web_embed_generator as web
+    rss_before, private_before = memory_mb()
+    start = time.perf_counter()
+    web.warm_up()
+    loaded = time.perf_counter()
+    web.chatbot.data_loader.get_relevant_context("how do I change billing setting 42")
+    first_query = time.perf_counter()
+    rss, private = memory_mb()
+    print(json.dumps({
+        "load_seconds": loaded - start,
+        "cold_start_seconds": first_query - start,
+        "rss_mb": rss - rss_before,
+        "private_mb": private - private_before,
+    }))
+
+
+def measure(mode, data_dir):
+    output = subprocess.run(
+        [sys.executable, __file__, "--run-mode", mode, "--data-dir", data_dir],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faqs", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--runs", type=int, default=3, help="runs per mode; the best is reported")
+    parser.add_argument("--run-mode", choices=["text", "snapshot"], help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        run_mode(args.run_mode, args.data_dir)
+        return
+
+    print(f"{'faqs':>8} {'mode':>9} {'warm-up s':>10} {'cold start s':>13} {'RSS +MB':>8} {'private dirty +MB':>18}")
+    for count in args.faqs:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_data(data_dir, count)
+            from src.data_loader import DataLoader
+            loader = DataLoader(data_dir, use_snapshot=False)
+            start = time.perf_counter()
+            compile_snapshot(loader.faqs, loader.training_data, default_snapshot_path(data_dir),
+                             sources=source_signature(data_dir))
+            compile_seconds = time.perf_counter() - start
+            del loader
+            for mode in ("text", "snapshot"):
+                result = min((measure(mode, data_dir) for _ in range(args.runs)),
+                             key=lambda r: r["cold_start_seconds"])
+                print(f"{count:>8} {mode:>9} {result['load_seconds']:>10.3f} {result['cold_start_seconds']:>13.3f} "
+                      f"{result['rss_mb']:>8.1f} {result['private_mb']:>18.1f}")
+            print(f"{'':>8} compiled in {compile_seconds:.2f}s, "
+                  f"{os.path.getsize(default_snapshot_path(data_dir)) / 1024 / 1024:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
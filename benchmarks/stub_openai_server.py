@@ -0,0 +1,77 @@
+"""
+Local stub of the OpenAI chat completions API for offline load tests
+
+Usage:
+    python benchmarks/stub_openai_server.py [--port 8099] [--latency 0.2] [--token-delay 0.0]
+"""
+import argparse
+import asyncio
+import json
+import time
+from aiohttp import web
+
+STUB_REPLY = "This is a stubbed reply from the local test server."
+
+
+def create_app(latency=0.2, token_delay=0.0):
+    """Create the stub server application"""
+    stats = {"requests": 0}
+
+    async def stream_completion(request, body):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = STUB_REPLY.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(token_delay)
+            chunk = {
+                "id": f"chatcmpl-stub-{stats['requests']}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": None,
+                }],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def chat_completions(request):
+        body = await request.json()
+        stats["requests"] += 1
+        await asyncio.sleep(latency)
+        if body.get("stream"):
+            return await stream_completion(request, body)
+        await asyncio.sleep(token_delay * len(STUB_REPLY.split(" ")))
+        return web.json_response({
+            "id": f"chatcmpl-stub-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_REPLY},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    async def get_stats(request):
+        return web.Response(text=json.dumps(stats), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds to wait before the first token")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Seconds between generated tokens")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.token_delay), host="127.0.0.1", port=args.port)
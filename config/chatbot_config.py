@@ -1,18 +1,140 @@
 """
 Configuration settings for the chatbot
 """
+import os
 
 # Conversation flow settings
 MAX_CONVERSATION_STEPS = 9
 DEFAULT_SYSTEM_PROMPT = """You are a helpful AI assistant. Be concise and clear in your responses.
 Follow the conversation flow naturally and provide relevant information."""
 
+# Knowledge data settings
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+# FAQ files loaded from DATA_DIR when present: blank-line separated text,
+# JSON lines with question/answer keys, or CSV with question,answer columns
+FAQ_FILES = ["training_faqs.txt", "training_faqs.jsonl", "training_faqs.csv"]
+DATA_WATCH_ENABLED = True  # Hot-reload the data files when they change
+DATA_WATCH_INTERVAL = 2.0  # Seconds between checks of the data directory
+# Compiled snapshot of the data files (python -m src.snapshot compile), used
+# at startup instead of parsing and indexing them when it's up to date
+KNOWLEDGE_SNAPSHOT_ENABLED = True
+KNOWLEDGE_SNAPSHOT_FILE = "knowledge.snapshot"
+
+# Retrieval settings - only the most relevant knowledge goes into each prompt
+RETRIEVAL_ENABLED = True
+RETRIEVAL_TOP_K = 5
+RETRIEVAL_CHUNK_WORDS = 120  # Training data is split into passages of this size
+CONTEXT_TOKEN_BUDGET = 1000
+
+# FAQ short-circuit - answer near-verbatim FAQ questions without calling the LLM
+FAQ_MATCH_ENABLED = True
+FAQ_MATCH_THRESHOLD = 0.85  # Minimum n-gram similarity (0-1) for a fuzzy match
+
+# Response cache - "memory" (per worker), "sqlite" (shared by all workers on the host) or None
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', '/tmp/chatbot_response_cache.sqlite3')
+RESPONSE_CACHE_TTL_SECONDS = 60 * 60
+RESPONSE_CACHE_MAX_ENTRIES = 10000
+
+# State shared by all gunicorn workers (sessions and knowledge data):
+# "sqlite" keeps it in a local file every worker can read, "memory" keeps it per worker
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite')
+STATE_PATH = os.getenv('STATE_PATH', '/tmp/chatbot_state.sqlite3')
+KNOWLEDGE_SYNC_INTERVAL = 1.0  # Minimum seconds between checks for data published by other workers
+
+# Session settings
+SESSION_COOKIE_NAME = "chat_session_id"
+SESSION_HEADER_NAME = "X-Session-ID"
+SESSION_TTL_SECONDS = 30 * 60
+SESSION_MAX_COUNT = 20000
+SESSION_MAX_BYTES = 64 * 1024 * 1024  # Memory bound for all sessions in one worker
+
+# Conversation memory - each session keeps its last HISTORY_MAX_MESSAGES messages
+# in a ring buffer; older ones are folded into a running summary in the background.
+# The ring is also the prompt's history window, so every message is either sent
+# verbatim or on its way into the summary
+HISTORY_MAX_MESSAGES = 6
+CONVERSATION_SUMMARY_ENABLED = True
+SUMMARY_MAX_TOKENS = 200
+SUMMARY_MIN_MESSAGES = 2  # Messages waiting before a summary update is started
+
 # OpenAI settings
 OPENAI_MODEL = "gpt-3.5-turbo"
 MAX_TOKENS = 150
 TEMPERATURE = 0.7
+OPENAI_MAX_CONNECTIONS = 100  # Keep-alive connection pool size per worker
+OPENAI_MAX_CONCURRENCY = 200  # In-flight completions per worker
+OPENAI_KEEPALIVE_SECONDS = 30
+OPENAI_REQUEST_TIMEOUT = 60
+OPENAI_WARM_CONNECTIONS = 2  # Connections each worker opens to the API during warm-up
+COALESCE_COMPLETIONS = os.getenv('COALESCE_COMPLETIONS', '1') != '0'  # Identical in-flight requests share one call
+
+# Upstream resilience (src/resilience.py)
+LLM_ATTEMPT_TIMEOUT = float(os.getenv('LLM_ATTEMPT_TIMEOUT', '20'))  # Deadline per attempt; for streams, per token
+LLM_TOTAL_TIMEOUT = 45  # No retry is started after this many seconds
+LLM_MAX_ATTEMPTS = int(os.getenv('LLM_MAX_ATTEMPTS', '3'))
+LLM_BACKOFF_BASE = 0.25  # Seconds; retries wait a random time up to base * 2^retry
+LLM_BACKOFF_MAX = 4
+LLM_HEDGE_AFTER_MS = float(os.getenv('LLM_HEDGE_AFTER_MS', '0'))  # Send a second request if the first is this slow, 0 disables it
+CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive upstream failures that open the circuit
+CIRCUIT_RESET_SECONDS = 30  # How long an open circuit fails fast before letting one request probe
+FAQ_FALLBACK_ENABLED = True  # Answer with the closest FAQ when the upstream fails
+FAQ_FALLBACK_THRESHOLD = 0.5  # Minimum similarity for a fallback answer (lower than FAQ_MATCH_THRESHOLD)
+
+# LLM backend: "openai", "stub" (simulated replies, no network) or "local" (small model on the CPU)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')
+LLM_BATCH_WINDOW_MS = int(os.getenv('LLM_BATCH_WINDOW_MS', '0'))  # Micro-batching window for the local backend, 0 disables it
+LLM_MAX_BATCH_SIZE = 16
+
+# Stub backend - latency and reply length distributions, deterministic for a given seed
+STUB_LLM_FIRST_TOKEN_MS = float(os.getenv('STUB_LLM_FIRST_TOKEN_MS', '300'))  # Median time to first token
+STUB_LLM_FIRST_TOKEN_SIGMA = 0.5  # Spread of the log-normal time to first token
+STUB_LLM_TOKENS_PER_SECOND = float(os.getenv('STUB_LLM_TOKENS_PER_SECOND', '50'))
+STUB_LLM_TOKENS_PER_SECOND_SD = 10
+STUB_LLM_OUTPUT_TOKENS = 60  # Mean reply length, capped at MAX_TOKENS
+STUB_LLM_SEED = int(os.getenv('STUB_LLM_SEED', '0'))
+STUB_LLM_ERROR_RATE = float(os.getenv('STUB_LLM_ERROR_RATE', '0'))  # Share of requests failing with a simulated upstream error
+
+# Local backend - needs the transformers and torch packages
+LOCAL_MODEL_NAME = os.getenv('LOCAL_MODEL_NAME', 'Qwen/Qwen2.5-0.5B-Instruct')
+LOCAL_MODEL_THREADS = 0  # Torch CPU threads, 0 keeps the default
+
+# Metrics - each worker flushes its totals here so /metrics can merge them, empty keeps them per process
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/chatbot_metrics')
+METRICS_FLUSH_SECONDS = 5
+
+# Prompt budget - the prompt is fitted into the model's context window minus MAX_TOKENS
+MODEL_CONTEXT_WINDOW = 4096
+PROMPT_HISTORY_MESSAGES = HISTORY_MAX_MESSAGES  # Most recent history messages considered for the prompt
+TOKEN_COUNT_CACHE_SIZE = 10000  # Memoized token counts of prompt parts
 
 # Web integration settings
 FLASK_HOST = "0.0.0.0"
 FLASK_PORT = 5000
 FLASK_DEBUG = False
+LANDING_PAGE_MAX_AGE = 300  # Browser cache lifetime of the landing page, revalidated by ETag afterwards
+WIDGET_LOADER_MAX_AGE = 300  # How long host pages may use a cached loader before picking up a new bundle
+
+# Admission control in front of /chat (and WebSocket messages)
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1') != '0'
+RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', '30'))  # Per client (API key or address), 0 disables it
+RATE_LIMIT_BURST = 10  # Requests a client may send at once before the rate applies
+RATE_LIMIT_API_KEY_HEADER = "X-API-Key"
+RATE_LIMIT_TRUST_FORWARDED = os.getenv('RATE_LIMIT_TRUST_FORWARDED', '0') == '1'  # Key on X-Forwarded-For behind a proxy
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')  # "asgi" serves src.asgi:app on uvicorn workers
+# Per worker. With gthread workers, running plus queued requests should leave
+# threads free for /health; an event-loop worker can wait on far more
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '256' if SERVER_MODE == 'asgi' else '24'))
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '256' if SERVER_MODE == 'asgi' else '4'))
+ADMISSION_QUEUE_TIMEOUT = 5.0  # Seconds a queued request waits for a slot before it gets a 503
+
+# WebSocket transport (served in the ASGI mode, see src/asgi.py)
+WEBSOCKET_PATH = "/ws"
+WEBSOCKET_HEARTBEAT_SECONDS = 20  # Server pings keep proxies from closing idle connections
+WEBSOCKET_IDLE_TIMEOUT = 60  # Close connections that sent nothing, not even a pong, for this long
+WEBSOCKET_SEND_QUEUE_SIZE = 64  # Frames buffered per connection before its replies wait for the client
+WEBSOCKET_MAX_IN_FLIGHT = 4  # Replies streaming at once on one connection
+WEBSOCKET_MAX_MESSAGE_BYTES = 16 * 1024
+WEBSOCKET_MAX_CONNECTIONS = 10000  # Open connections per worker
+WSGI_BRIDGE_THREADS = 32  # Threads running the Flask routes in the ASGI mode
+ASGI_BLOCKING_THREADS = 16  # Threads for blocking steps of native ASGI requests (SQLite, prompt building)
@@ -12,10 +12,17 @@ if [ "$FLASK_ENV" = "development" ]; then
     echo "Starting development server with hot reload..."
     exec flask run --host=0.0.0.0 --port=5000 --debug
 else
-    echo "Starting production server with Gunicorn..."
-    exec gunicorn --bind 0.0.0.0:5000 \
-        --workers 4 \
-        --timeout 120 \
-        --log-level info \
-        "src.web_embed_generator:app"
+    echo "Compiling knowledge snapshot..."
+    # Workers map the compiled data instead of parsing it; they fall back to
+    # the text files if this fails
+    python -m src.snapshot compile || echo "Warning: could not compile knowledge snapshot"
+    # Workers, threads and the warm-up hooks are set in gunicorn.conf.py, which
+    # also picks the worker class for SERVER_MODE
+    if [ "$SERVER_MODE" = "asgi" ]; then
+        echo "Starting production server with Gunicorn and uvicorn workers (ASGI)..."
+        exec gunicorn -c gunicorn.conf.py "src.asgi:app"
+    else
+        echo "Starting production server with Gunicorn..."
+        exec gunicorn -c gunicorn.conf.py "src.web_embed_generator:app"
+    fi
 fi
@@ -0,0 +1,38 @@
+"""
+Gunicorn configuration
+
+The app is preloaded in the master so the knowledge data, search index and
+compiled templates are built once and shared with every worker by fork.
+Each worker then starts its own threads and connection pool before it
+accepts traffic.
+"""
+import os
+
+bind = "0.0.0.0:5000"
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+if os.getenv("SERVER_MODE", "wsgi") == "asgi":
+    # One event loop per worker serving src.asgi:app; threads only run the Flask routes
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    # Threaded workers let each worker wait on many upstream completions at once
+    worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+timeout = 120
+loglevel = "info"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+
+def when_ready(server):
+    """Warm up in the master once the preloaded app is imported, before workers fork"""
+    # Metrics files of workers from a previous run would be counted again
+    from src.metrics import metrics
+    metrics.clear_directory()
+    if server.cfg.preload_app:
+        from src.web_embed_generator import warm_up
+        warm_up()
+
+
+def post_worker_init(worker):
+    """Start the worker's background threads and connection pool before it serves requests"""
+    from src.web_embed_generator import start_worker
+    start_worker()
@@ -0,0 +1,269 @@
+"""
+Admission control for chat requests: per-client rate limits and load shedding
+
+Two checks run before a chat request does any work. A token bucket per
+client (API key or address) turns away clients sending faster than their
+rate with a 429. A concurrency limiter with a bounded queue turns away
+requests the worker can't start soon with a 503. Both answer immediately
+with a Retry-After, so admitted requests keep a predictable latency and
+/health keeps getting a thread.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from config import chatbot_config as config
+from src.metrics import metrics
+
+
+class AdmissionDenied(Exception):
+    """A request turned away by admission control"""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def _take(tokens, updated_at, now, rate, burst):
+    """Refill a bucket and take one token; returns (tokens, allowed, seconds until the next token)"""
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+    if tokens >= 1:
+        return tokens - 1, True, 0.0
+    return tokens, False, (1 - tokens) / rate
+
+
+class MemoryRateLimiter:
+    """Token buckets for a single worker"""
+
+    def __init__(self, rate, burst, max_clients=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Take a token from a client's bucket; returns (allowed, retry_after seconds)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens, allowed, retry_after = _take(tokens, updated_at, now, self.rate, self.burst)
+            # Reinserted last, so the first entries are the longest unused
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                del self._buckets[next(iter(self._buckets))]
+        return allowed, retry_after
+
+
+class SQLiteRateLimiter:
+    """Token buckets in a SQLite file, so every worker on the host enforces the same limit"""
+
+    # Buckets idle long enough to be full again are deleted every few calls
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self._local = threading.local()
+        self._calls = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        """Get this thread's connection, reopening it in forked workers"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def acquire(self, key):
+        conn = self._connect()
+        now = time.time()
+        # The write lock makes the read, refill and take atomic across workers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limit WHERE key = ?", (key,)).fetchone()
+            tokens, updated_at = row if row else (self.burst, now)
+            tokens, allowed, retry_after = _take(tokens, updated_at, now, self.rate, self.burst)
+            conn.execute("INSERT OR REPLACE INTO rate_limit (key, tokens, updated_at) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM rate_limit WHERE updated_at < ?", (now - self.burst / self.rate,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+
+class ConcurrencyLimiter:
+    """Bound the requests a worker runs at once, with a bounded queue for the rest
+
+    Slots are handed to waiters as concurrent.futures.Future objects, so
+    callers on any thread or event loop can wait for one.
+    """
+
+    def __init__(self, max_concurrent, max_queue, queue_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        # Smoothed time a request holds its slot, to suggest when to retry
+        self.hold_seconds = 1.0
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def try_enter(self):
+        """Return a Future that resolves when a slot is granted, or None if the queue is full"""
+        future = Future()
+        with self._lock:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                future.set_result(True)
+            elif len(self._waiters) < self.max_queue:
+                self._waiters.append(future)
+            else:
+                return None
+        return future
+
+    def release(self, held_seconds=None):
+        """Free a slot, handing it to the longest-waiting request"""
+        with self._lock:
+            if held_seconds is not None:
+                self.hold_seconds += 0.1 * (held_seconds - self.hold_seconds)
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                # Waiters that timed out have been cancelled
+                if waiter.set_running_or_notify_cancel():
+                    waiter.set_result(True)
+                    return
+            self.active -= 1
+
+    def retry_after(self):
+        """Seconds until the queue has likely drained"""
+        return self.hold_seconds * (self.queued + 1) / self.max_concurrent
+
+
+class Ticket:
+    """An admitted request's slot; release it exactly once when the request ends"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.start = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.limiter.release(time.perf_counter() - self.start)
+
+
+class AdmissionController:
+    """Rate-limit each client, then wait for a slot in the concurrency limiter"""
+
+    def __init__(self, rate_limiter, limiter):
+        self.rate_limiter = rate_limiter
+        self.limiter = limiter
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+
+    def check_rate(self, client_key):
+        """Raise AdmissionDenied (429) if the client is over its rate"""
+        if self.rate_limiter is None:
+            return
+        try:
+            allowed, retry_after = self.rate_limiter.acquire(client_key)
+        except Exception as e:
+            # Fail open: a broken limiter store shouldn't take chat down
+            print(f"Warning: Rate limiter unavailable: {e}")
+            return
+        if not allowed:
+            self.rate_limited += 1
+            metrics.inc("chatbot_rejected_total", reason="rate_limit")
+            raise AdmissionDenied(429, "Too many requests", retry_after)
+
+    async def admit(self, client_key):
+        """Admit a request: returns a Ticket, or raises AdmissionDenied (429 or 503)"""
+        self.check_rate(client_key)
+        return await self.enter()
+
+    async def enter(self):
+        """Wait for a concurrency slot: returns a Ticket, or raises AdmissionDenied (503)"""
+        future = self.limiter.try_enter()
+        if future is None:
+            self.shed += 1
+            metrics.inc("chatbot_rejected_total", reason="overload")
+            raise AdmissionDenied(503, "Server busy", self.limiter.retry_after())
+        if not future.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.limiter.queue_timeout)
+            except asyncio.TimeoutError:
+                # If the slot was granted meanwhile the cancel fails and the request goes ahead
+                if future.cancel():
+                    self.shed += 1
+                    metrics.inc("chatbot_rejected_total", reason="queue_timeout")
+                    raise AdmissionDenied(503, "Server busy", self.limiter.retry_after())
+            except asyncio.CancelledError:
+                if not future.cancel():
+                    self.limiter.release()
+                raise
+        self.admitted += 1
+        return Ticket(self.limiter)
+
+    def stats(self):
+        """Return admitted and rejected requests and the current load of this worker"""
+        return {
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+            "active": self.limiter.active,
+            "queued": self.limiter.queued,
+            "max_concurrent": self.limiter.max_concurrent,
+            "max_queue": self.limiter.max_queue,
+        }
+
+
+def client_key(api_key, remote_addr, forwarded_for=None):
+    """The rate limit bucket of a request: its API key, else its address"""
+    if api_key:
+        # Keys aren't stored in the clear
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+    if forwarded_for and config.RATE_LIMIT_TRUST_FORWARDED:
+        remote_addr = forwarded_for.split(",")[0].strip()
+    return f"addr:{remote_addr or 'unknown'}"
+
+
+def create_admission_controller():
+    """Create the admission controller configured in chatbot_config, or None"""
+    if not config.ADMISSION_ENABLED:
+        return None
+    rate_limiter = None
+    if config.RATE_LIMIT_PER_MINUTE > 0:
+        rate = config.RATE_LIMIT_PER_MINUTE / 60
+        if config.STATE_BACKEND == "sqlite":
+            rate_limiter = SQLiteRateLimiter(config.STATE_PATH, rate, config.RATE_LIMIT_BURST)
+        else:
+            rate_limiter = MemoryRateLimiter(rate, config.RATE_LIMIT_BURST)
+    limiter = ConcurrencyLimiter(config.ADMISSION_MAX_CONCURRENT, config.ADMISSION_MAX_QUEUE,
+                                 config.ADMISSION_QUEUE_TIMEOUT)
+    return AdmissionController(rate_limiter, limiter)
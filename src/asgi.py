@@ -0,0 +1,258 @@
+"""
+ASGI entry point: native chat routes, the WebSocket transport and the Flask app
+
+Selected with SERVER_MODE=asgi, which runs it under gunicorn with uvicorn
+workers: one event loop per worker. /chat, /health and /reload-data are
+served on that loop, so a worker holds any number of requests waiting on
+the LLM instead of one per thread. Their blocking steps (the SQLite session
+store and rate limiter, FAQ matching, prompt building) run on a small thread
+pool so they never stall the loop. The WebSocket path goes to the
+transport. Every other route (the landing page, the widget, /metrics,
+/stats) is served by the Flask app on a thread pool.
+
+Usage:
+    SERVER_MODE=asgi ./entrypoint.sh
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker src.asgi:app
+    uvicorn src.asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.http import dump_cookie, parse_cookie
+from config import chatbot_config as config
+from src import web_embed_generator as web
+from src.admission import AdmissionDenied, client_key
+from src.metrics import metrics
+from src.ws_transport import create_websocket_transport
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs WSGI apps on its single thread-sensitive thread; use a pool instead
+    _run = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run, thread_sensitive=False, executor=self.executor)(body)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """Serve a WSGI app from ASGI, running concurrent requests on a thread pool"""
+
+    def __init__(self, wsgi_application, threads=32):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        instance = _ThreadedWsgiInstance(self.wsgi_application, self.duplicate_header_limit)
+        instance.executor = self.executor
+        await instance(scope, receive, send)
+
+
+# Blocking steps of the native routes and the WebSocket transport
+blocking_executor = ThreadPoolExecutor(config.ASGI_BLOCKING_THREADS, thread_name_prefix="blocking")
+
+
+async def blocking(func, *args):
+    """Run a blocking call on the blocking pool"""
+    return await asyncio.get_running_loop().run_in_executor(blocking_executor, func, *args)
+
+
+def get_chatbot():
+    """The chatbot, running the blocking steps of its answers on the blocking pool"""
+    bot = web.get_chatbot()
+    bot.executor = blocking_executor
+    return bot
+
+
+websocket_transport = create_websocket_transport(get_chatbot, web.session_store, web.admission, blocking_executor)
+metrics.gauge("chatbot_websocket_connections", "Open WebSocket chat connections",
+              lambda: websocket_transport.connections)
+flask_app = ThreadedWsgiToAsgi(web.app, config.WSGI_BRIDGE_THREADS)
+
+
+async def lifespan(receive, send):
+    """Warm up and start the worker before serving (a no-op if a gunicorn hook already did)"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, web.start_worker)
+                await send({"type": "lifespan.startup.complete"})
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def header(scope, name):
+    """The value of a request header, or None"""
+    name = name.lower().encode("latin-1")
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def get_session(scope):
+    """Get or create the conversation session for a request, as web_embed_generator.get_session"""
+    session_id = header(scope, config.SESSION_HEADER_NAME)
+    if not session_id:
+        session_id = parse_cookie(header(scope, "cookie") or "").get(config.SESSION_COOKIE_NAME)
+    return web.session_store.get_or_create(session_id)
+
+
+def session_cookie(session):
+    """The Set-Cookie header web_embed_generator.attach_session sets"""
+    value = dump_cookie(config.SESSION_COOKIE_NAME, session.session_id, max_age=config.SESSION_TTL_SECONDS,
+                        httponly=True, samesite="Lax")
+    return (b"set-cookie", value.encode("latin-1"))
+
+
+def request_client_key(scope):
+    """The rate limit bucket of a request, as web_embed_generator.request_client_key"""
+    client = scope.get("client")
+    return client_key(header(scope, config.RATE_LIMIT_API_KEY_HEADER), client[0] if client else None,
+                      header(scope, "x-forwarded-for"))
+
+
+async def send_json(send, status, data, headers=()):
+    body = json.dumps(data).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+                   + list(headers),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def chat(scope, receive, send):
+    """Handle chat requests on the event loop, like the Flask /chat route"""
+    start = time.perf_counter()
+    ticket = None
+    try:
+        body = await read_body(receive)
+        if body is None:
+            return
+        data = json.loads(body or b"null")
+        user_message = data.get("message", "") if isinstance(data, dict) else ""
+        if not user_message:
+            await send_json(send, 400, {"error": "No message provided"})
+            return
+
+        if web.admission:
+            try:
+                await blocking(web.admission.check_rate, request_client_key(scope))
+                ticket = await web.admission.enter()
+            except AdmissionDenied as denied:
+                await send_json(send, denied.status, {"error": str(denied), "retry_after": denied.retry_after},
+                                [(b"retry-after", str(denied.retry_after).encode())])
+                return
+
+        bot = get_chatbot()
+        session = await blocking(get_session, scope)
+        if data.get("stream") or "text/event-stream" in (header(scope, "accept") or ""):
+            await stream_chat(bot, session, user_message, start, receive, send)
+            return
+
+        response = await bot.get_response(user_message, session=session)
+        await blocking(web.session_store.save, session)
+        bot.summarize_history(session, web.session_store)
+        metrics.observe("chatbot_request_seconds", time.perf_counter() - start, mode="json")
+        await send_json(send, 200, {"response": response, "session_id": session.session_id},
+                        [session_cookie(session)])
+    except Exception as e:
+        metrics.inc("chatbot_errors_total", stage="request")
+        await send_json(send, 500, {"error": str(e)})
+    finally:
+        if ticket:
+            ticket.release()
+
+
+async def stream_chat(bot, session, user_message, start, receive, send):
+    """Send the reply as server-sent events, stopping if the client disconnects"""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            session_cookie(session),
+        ],
+    })
+
+    async def wait_for_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    tokens = bot.stream_response(user_message, session=session)
+    try:
+        async for token in tokens:
+            if disconnected.done():
+                return
+            await send({"type": "http.response.body", "body": f"data: {json.dumps({'token': token})}\n\n".encode(),
+                        "more_body": True})
+        await blocking(web.session_store.save, session)
+        bot.summarize_history(session, web.session_store)
+        metrics.observe("chatbot_request_seconds", time.perf_counter() - start, mode="stream")
+        done = {"done": True, "session_id": session.session_id}
+        await send({"type": "http.response.body", "body": f"data: {json.dumps(done)}\n\n".encode()})
+    finally:
+        disconnected.cancel()
+        await tokens.aclose()
+
+
+async def health(scope, receive, send):
+    """Health check, unhealthy until this worker has warmed up"""
+    if not web.is_ready():
+        web.start_worker_in_background()
+        await send_json(send, 503, {"status": "starting"})
+        return
+    await send_json(send, 200, {"status": "healthy"})
+
+
+async def reload_data(scope, receive, send):
+    """Reload the training data on a thread, so the loop keeps serving meanwhile"""
+    try:
+        bot = get_chatbot()
+        await asyncio.get_running_loop().run_in_executor(None, bot.reload_training_data)
+        await send_json(send, 200, {"status": "success", "message": "Training data reloaded"})
+    except Exception as e:
+        await send_json(send, 500, {"status": "error", "message": str(e)})
+
+
+ROUTES = {
+    ("POST", "/chat"): chat,
+    ("GET", "/health"): health,
+    ("POST", "/reload-data"): reload_data,
+}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "websocket":
+        if scope["path"] == config.WEBSOCKET_PATH:
+            await websocket_transport(scope, receive, send)
+        else:
+            await receive()
+            await send({"type": "websocket.close"})
+    else:
+        route = ROUTES.get((scope["method"], scope["path"]))
+        await (route or flask_app)(scope, receive, send)
@@ -1,48 +1,110 @@
 """
 Core chatbot logic for handling conversations
 """
+import asyncio
 import os
+import threading
+import time
 import openai
 from dotenv import load_dotenv
 from config import chatbot_config as config
+from src.coalescing import SingleFlight
 from src.data_loader import DataLoader
+from src.faq_matcher import FAQMatchStats
+from src.llm_client import get_completion_client
+from src.metrics import metrics
+from src.prompt_builder import PromptTokenStats, create_prompt_builder
+from src.response_cache import get_response_cache, make_cache_key
+from src.retrieval import estimate_tokens
+from src.session_store import ConversationSession
+from src.summarizer import ConversationSummarizer
 
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '../config/.env'))
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+MAX_STEPS_MESSAGE = "I apologize, but we've reached the maximum number of conversation steps. Please start a new conversation."
+ERROR_MESSAGE = "I apologize, but I encountered an error. Please try again."
+
+def _completion_tokens(response, text):
+    """Completion tokens reported by the backend, estimated if it doesn't say"""
+    usage = response.get("usage") if hasattr(response, "get") else None
+    if usage and usage.get("completion_tokens") is not None:
+        return usage["completion_tokens"]
+    return estimate_tokens(text)
+
 class Chatbot:
-    def __init__(self, lazy_load=False, use_defaults=False):
-        self.conversation_steps = 0
-        self.conversation_history = []
+    def __init__(self, lazy_load=False, use_defaults=False, knowledge_sync=None):
+        # Conversation state used when no per-visitor session is passed in
+        self.session = ConversationSession('default', config.HISTORY_MAX_MESSAGES)
         self.data_loader = None
         self._data_initialized = False
+        self._init_lock = threading.Lock()
+        self.completion_client = get_completion_client()
+        self.faq_stats = FAQMatchStats()
+        self.response_cache = get_response_cache()
+        # Concurrent identical requests (e.g. a trending question) share one upstream call
+        self.single_flight = SingleFlight() if config.COALESCE_COMPLETIONS else None
+        self.prompt_builder = create_prompt_builder()
+        self.token_stats = PromptTokenStats()
+        self.summarizer = ConversationSummarizer(
+            self.completion_client,
+            max_tokens=config.SUMMARY_MAX_TOKENS,
+            min_pending=config.SUMMARY_MIN_MESSAGES
+        ) if config.CONVERSATION_SUMMARY_ENABLED else None
+        # Keeps knowledge data consistent with the other workers, if configured
+        self.knowledge_sync = knowledge_sync
+        # Thread pool for the blocking steps of a request (FAQ matching, prompt
+        # building, a SQLite response cache). Servers running every request on
+        # one event loop (src/asgi.py) set it; threaded servers run them inline
+        self.executor = None
         if not lazy_load:
             self.initialize_data_loader(use_defaults)
 
-    def _create_prompt(self, user_input):
-        """Create the prompt for the OpenAI API"""
-        # Ensure data is loaded before creating prompt
+    @property
+    def conversation_steps(self):
+        """Steps taken in the default conversation"""
+        return self.session.conversation_steps
+
+    @property
+    def conversation_history(self):
+        """Messages in the default conversation"""
+        return self.session.conversation_history
+
+    def ensure_data_loaded(self):
+        """Load the knowledge data once, even with concurrent first requests"""
         if not self._data_initialized:
-            self.initialize_data_loader()
-        
-        context = self.data_loader.get_context() if self.data_loader else ""
-        
-        # Build conversation history
-        conv_history = ""
-        for msg in self.conversation_history[-5:]:  # Last 5 messages for context
-            conv_history += f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}\n"
-
-        # Combine all parts
-        prompt = f"{config.DEFAULT_SYSTEM_PROMPT}\n\nContext:\n{context}\n\nConversation History:\n{conv_history}\nUser: {user_input}\nAssistant:"
+            with self._init_lock:
+                if not self._data_initialized:
+                    self._initialize_data_loader(False)
+
+    def _create_prompt(self, user_input, session=None):
+        """Create the role-separated messages for the OpenAI API, fitted to the token budget"""
+        session = session or self.session
+        # Ensure data is loaded before creating prompt
+        self.ensure_data_loaded()
+
+        with metrics.timer("chatbot_context_retrieval_seconds"):
+            static_context, context = self.data_loader.get_context_parts(user_input) if self.data_loader else ("", "")
+        with metrics.timer("chatbot_prompt_build_seconds"):
+            prompt = self.prompt_builder.build(
+                config.DEFAULT_SYSTEM_PROMPT, static_context, context, session.conversation_history, user_input,
+                summary=session.summary
+            )
+        self.token_stats.record(prompt.usage)
         return prompt
 
     def initialize_data_loader(self, use_defaults=False):
         """Initialize or reinitialize the data loader"""
+        with self._init_lock:
+            self._initialize_data_loader(use_defaults)
+
+    def _initialize_data_loader(self, use_defaults):
         try:
-            data_path = os.path.join(os.path.dirname(__file__), '../data')
+            data_path = config.DATA_DIR
             self.data_loader = DataLoader(data_path, use_defaults=use_defaults)
             self._data_initialized = True
+            self._publish_knowledge()
         except Exception as e:
             print(f"Warning: Data loader initialization failed: {e}")
             if use_defaults:
@@ -52,49 +114,236 @@ class Chatbot:
                 raise
 
     def reload_training_data(self):
-        """Reload training data and FAQs"""
+        """Reload training data and FAQs
+
+        The new data is parsed and indexed into a fresh snapshot that is
+        swapped in atomically, so requests in flight keep using the old one.
+        """
         try:
             if not self.data_loader:
-                self.initialize_data_loader()
-            self.data_loader.load_training_data()
-            self.data_loader.load_faqs()
+                self.ensure_data_loaded()
+            if self.data_loader.reload():
+                self._publish_knowledge()
             return True
         except Exception as e:
             print(f"Warning: Failed to reload training data: {e}")
             return False
 
-    async def get_response(self, user_input):
+    def _publish_knowledge(self):
+        """Share freshly loaded data with the other workers"""
+        if self.knowledge_sync and self.data_loader:
+            try:
+                self.knowledge_sync.publish(self.data_loader)
+            except Exception as e:
+                print(f"Warning: Failed to publish knowledge data: {e}")
+
+    def refresh_knowledge(self):
+        """Pick up knowledge data published by another worker (called off the request path)"""
+        if self.knowledge_sync and self.data_loader:
+            try:
+                self.knowledge_sync.refresh(self.data_loader)
+            except Exception as e:
+                print(f"Warning: Failed to refresh knowledge data: {e}")
+
+    def _match_faq(self, user_input):
+        """Look up a stored FAQ answer confident enough to skip the LLM"""
+        if not config.FAQ_MATCH_ENABLED:
+            return None
+        self.ensure_data_loaded()
+        if not self.data_loader:
+            return None
+
+        start = time.perf_counter()
+        match = self.data_loader.get_faq_matcher().match(user_input)
+        self.faq_stats.record_lookup(match, time.perf_counter() - start)
+        return match
+
+    def _fall_back(self, session, user_input, asked):
+        """Answer with the closest FAQ after the completion failed; returns the answer or None
+
+        The match may be looser than _match_faq's, since the alternative is an apology.
+        """
+        if not config.FAQ_FALLBACK_ENABLED:
+            return None
+        try:
+            match = self.data_loader.get_faq_matcher().match(user_input, config.FAQ_FALLBACK_THRESHOLD)
+        except Exception as e:
+            print(f"Error matching fallback FAQ: {str(e)}")
+            return None
+        if match is None:
+            return None
+        metrics.inc("chatbot_fallbacks_total", kind="faq")
+        if not asked:
+            session.add_message("user", user_input)
+        session.add_message("assistant", match.answer)
+        session.conversation_steps += 1
+        return match.answer
+
+    def summarize_history(self, session, store=None):
+        """Fold messages that left the session's history into its summary, in the background
+
+        Call it after the session was saved, passing the store it lives in.
+        """
+        if self.summarizer is not None:
+            self.summarizer.schedule(session, store)
+
+    def _record_answer(self, session, user_input, answer):
+        """Store a question and its answer in the conversation"""
+        session.add_message("user", user_input)
+        session.add_message("assistant", answer)
+        session.conversation_steps += 1
+
+    def _completion_params(self, user_input, session):
+        """Build the completion request parameters for a user message, and the prompt's token usage"""
+        prompt = self._create_prompt(user_input, session)
+        params = dict(
+            model=self.completion_client.model,
+            messages=prompt.messages,
+            max_tokens=config.MAX_TOKENS,
+            temperature=config.TEMPERATURE
+        )
+        return params, prompt.usage
+
+    async def _blocking(self, func, *args):
+        """Run a blocking step on self.executor, or inline when there is none"""
+        if self.executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _prepare(self, user_input, session):
+        """The blocking first steps of an answer: (FAQ match, request params, token usage, cached reply)
+
+        Common questions are answered straight from the FAQs. Otherwise the
+        request is built before the input is added to the history, so it's sent once.
+        """
+        match = self._match_faq(user_input)
+        if match is not None:
+            return match, None, None, None
+        params, usage = self._completion_params(user_input, session)
+        cached = self.response_cache.get(params) if self.response_cache else None
+        return None, params, usage, cached
+
+    async def get_response(self, user_input, session=None):
         """Get a response from the chatbot"""
-        if self.conversation_steps >= config.MAX_CONVERSATION_STEPS:
-            return "I apologize, but we've reached the maximum number of conversation steps. Please start a new conversation."
+        session = session or self.session
+        if session.conversation_steps >= config.MAX_CONVERSATION_STEPS:
+            return MAX_STEPS_MESSAGE
 
+        asked = False
         try:
-            # Add user input to history
-            self.conversation_history.append({"role": "user", "content": user_input})
-
-            # Create completion with OpenAI
-            response = openai.ChatCompletion.create(
-                model=config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": config.DEFAULT_SYSTEM_PROMPT},
-                    {"role": "user", "content": self._create_prompt(user_input)}
-                ],
-                max_tokens=config.MAX_TOKENS,
-                temperature=config.TEMPERATURE
-            )
+            match, params, usage, bot_response = await self._blocking(self._prepare, user_input, session)
+            if match is not None:
+                metrics.inc("chatbot_cache_hits_total", cache="faq")
+                self._record_answer(session, user_input, match.answer)
+                return match.answer
+
+            session.add_message("user", user_input)
+            asked = True
+
+            if bot_response is None:
+                # Create completion with OpenAI on the pooled, non-blocking client
+                start = time.perf_counter()
+                response, leader = await self._complete(params)
+                bot_response = response.choices[0].message.content.strip()
+                if leader:
+                    elapsed = time.perf_counter() - start
+                    self.faq_stats.record_llm_call(elapsed)
+                    metrics.observe("chatbot_llm_seconds", elapsed)
+                    metrics.inc("chatbot_cache_misses_total")
+                    metrics.inc("chatbot_tokens_total", usage["total"], direction="in")
+                    metrics.inc("chatbot_tokens_total", _completion_tokens(response, bot_response), direction="out")
+                    if self.response_cache:
+                        await self._blocking(self.response_cache.set, params, bot_response)
+                else:
+                    metrics.inc("chatbot_cache_hits_total", cache="coalesced")
+            else:
+                metrics.inc("chatbot_cache_hits_total", cache="response")
 
-            # Extract and store response
-            bot_response = response.choices[0].message.content.strip()
-            self.conversation_history.append({"role": "assistant", "content": bot_response})
-            self.conversation_steps += 1
+            # Store response
+            session.add_message("assistant", bot_response)
+            session.conversation_steps += 1
+            if session is self.session:
+                self.summarize_history(session)
 
             return bot_response
 
         except Exception as e:
             print(f"Error getting response: {str(e)}")
-            return "I apologize, but I encountered an error. Please try again."
+            metrics.inc("chatbot_errors_total", stage="completion")
+            answer = await self._blocking(self._fall_back, session, user_input, asked)
+            if answer is not None:
+                return answer
+            metrics.inc("chatbot_fallbacks_total", kind="apology")
+            return ERROR_MESSAGE
+
+    async def _complete(self, params):
+        """Run a completion, joining an identical one already in flight
+
+        Returns the response and whether this request made the upstream call.
+        """
+        if self.single_flight is None:
+            return await self.completion_client.create(**params), True
+        future, leader = self.single_flight.submit(
+            make_cache_key(params), lambda: self.completion_client.submit(**params)
+        )
+        # Shielded so a disconnecting visitor doesn't cancel the call for the others
+        return await asyncio.shield(asyncio.wrap_future(future)), leader
+
+    async def stream_response(self, user_input, session=None):
+        """Stream a response from the chatbot token by token"""
+        session = session or self.session
+        if session.conversation_steps >= config.MAX_CONVERSATION_STEPS:
+            yield MAX_STEPS_MESSAGE
+            return
+
+        parts = []
+        asked = False
+        try:
+            match, params, usage, cached = await self._blocking(self._prepare, user_input, session)
+            if match is not None:
+                metrics.inc("chatbot_cache_hits_total", cache="faq")
+                self._record_answer(session, user_input, match.answer)
+                yield match.answer
+                return
+
+            session.add_message("user", user_input)
+            asked = True
+            if cached is not None:
+                metrics.inc("chatbot_cache_hits_total", cache="response")
+                parts.append(cached)
+                yield cached
+            else:
+                metrics.inc("chatbot_cache_misses_total")
+                metrics.inc("chatbot_tokens_total", usage["total"], direction="in")
+                start = time.perf_counter()
+                async for token in self.completion_client.stream(**params):
+                    if not parts:
+                        metrics.observe("chatbot_time_to_first_token_seconds", time.perf_counter() - start)
+                    parts.append(token)
+                    yield token
+                elapsed = time.perf_counter() - start
+                self.faq_stats.record_llm_call(elapsed)
+                metrics.observe("chatbot_llm_seconds", elapsed)
+                # Each streamed delta is one token
+                metrics.inc("chatbot_tokens_total", len(parts), direction="out")
+                if self.response_cache:
+                    await self._blocking(self.response_cache.set, params, "".join(parts).strip())
+        except Exception as e:
+            print(f"Error streaming response: {str(e)}")
+            metrics.inc("chatbot_errors_total", stage="stream")
+            if not parts:
+                answer = await self._blocking(self._fall_back, session, user_input, asked)
+                if answer is None:
+                    metrics.inc("chatbot_fallbacks_total", kind="apology")
+                yield answer or ERROR_MESSAGE
+                return
+
+        # Store the response once the stream is complete
+        session.add_message("assistant", "".join(parts).strip())
+        session.conversation_steps += 1
+        if session is self.session:
+            self.summarize_history(session)
 
-    def reset_conversation(self):
+    def reset_conversation(self, session=None):
         """Reset the conversation"""
-        self.conversation_steps = 0
-        self.conversation_history = []
+        (session or self.session).reset()
@@ -0,0 +1,122 @@
+"""
+Coalescing of identical in-flight completions and micro-batching of requests
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key
+
+    Works with concurrent.futures.Future, so callers on any thread or event
+    loop can wait on the same upstream call. A key is forgotten as soon as its
+    call completes; later callers start a new one (the response cache covers
+    repeats after that).
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, start):
+        """Return (future, leader): the in-flight future for key, or a new one from start()"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = start()
+            self._in_flight[key] = future
+            self.calls += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future, True
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def stats(self):
+        """Return upstream calls made and calls saved by coalescing"""
+        with self._lock:
+            requests = self.calls + self.coalesced
+            return {
+                "upstream_calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+                "saved_ratio": self.coalesced / requests if requests else 0.0,
+            }
+
+
+class MicroBatcher:
+    """Group submissions arriving within a short window into one batched call
+
+    For backends that take several inputs per call (e.g. a local model
+    generating a batch at once). run_batch receives a list of items and must
+    return a list of results in the same order.
+    """
+
+    def __init__(self, run_batch, window_seconds=0.01, max_batch=16):
+        self.run_batch = run_batch
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        """Start the batching thread, restarting it in forked workers"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), name="micro-batcher", daemon=True).start()
+                self._pid = os.getpid()
+            return self._queue
+
+    def submit(self, item):
+        """Queue an item for the next batch and return a Future of its result"""
+        future = Future()
+        self._ensure_started().put((item, future))
+        return future
+
+    def _run(self, pending):
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._execute(batch)
+
+    def _execute(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            results = self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(batch)
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def stats(self):
+        """Return the number of batches run and their average size"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
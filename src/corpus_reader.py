@@ -0,0 +1,135 @@
+"""
+Streaming readers for FAQ and training data corpora
+"""
+import csv
+import json
+import mmap
+import os
+
+QUESTION_KEYS = ("question", "q")
+ANSWER_KEYS = ("answer", "a")
+
+# Pages already parsed are released from the mapping every this many bytes,
+# so the mapped file doesn't accumulate in the process RSS
+RELEASE_BYTES = 16 * 1024 * 1024
+
+
+def _open_mmap(path):
+    """Memory-map a file read-only (None for empty files, which can't be mapped)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_blocks(path):
+    """Yield the blank-line separated blocks of a text file, one at a time
+
+    The file is memory-mapped, so only the current block is ever copied into
+    Python objects, and parsed pages are dropped from the mapping as we go,
+    keeping memory flat regardless of the file size.
+    """
+    mm = _open_mmap(path)
+    if mm is None:
+        return
+    can_release = hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_DONTNEED')
+    if can_release and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    released = 0
+    try:
+        lines = []
+        for line in iter(mm.readline, b''):
+            if can_release and mm.tell() - released >= RELEASE_BYTES:
+                end = mm.tell() - mm.tell() % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_DONTNEED, released, end - released)
+                released = end
+            line = line.rstrip(b'\r\n')
+            if line:
+                lines.append(line)
+            elif lines:
+                yield b'\n'.join(lines).decode('utf-8')
+                lines = []
+        if lines:
+            yield b'\n'.join(lines).decode('utf-8')
+    finally:
+        mm.close()
+
+
+def _parse_text_faqs(path):
+    # Same format as before: question up to the first '?', answer after it
+    for block in iter_blocks(path):
+        if '?' in block:
+            q, a = block.split('?', 1)
+            yield q.strip() + '?', a.strip()
+
+
+def _pick(record, keys):
+    for key in keys:
+        if record.get(key):
+            return str(record[key]).strip()
+    return None
+
+
+def _parse_jsonl_faqs(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            question, answer = _pick(record, QUESTION_KEYS), _pick(record, ANSWER_KEYS)
+            if question and answer:
+                yield question, answer
+
+
+def _parse_csv_faqs(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [column.strip().lower() for column in header]
+        if any(key in columns for key in QUESTION_KEYS):
+            q_index = next(columns.index(key) for key in QUESTION_KEYS if key in columns)
+            a_index = next((columns.index(key) for key in ANSWER_KEYS if key in columns), 1)
+        else:
+            # No header row: the first two columns are question and answer
+            q_index, a_index = 0, 1
+            reader = _prepend(header, reader)
+        for row in reader:
+            if len(row) > max(q_index, a_index) and row[q_index].strip() and row[a_index].strip():
+                yield row[q_index].strip(), row[a_index].strip()
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+def iter_faq_records(path):
+    """Yield (question, answer) pairs from a .txt, .jsonl or .csv FAQ file"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return _parse_jsonl_faqs(path)
+    if extension == '.csv':
+        return _parse_csv_faqs(path)
+    return _parse_text_faqs(path)
+
+
+def read_training_data(path):
+    """Read training data with a single decoded copy of the file
+
+    Decoding straight from the memory map avoids holding the raw bytes and
+    the decoded text at the same time.
+    """
+    mm = _open_mmap(path)
+    if mm is None:
+        return ""
+    try:
+        with memoryview(mm) as view:
+            text = str(view, 'utf-8')
+    finally:
+        mm.close()
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+    return text.strip()
@@ -2,16 +2,167 @@
 Data loader for training data and FAQs
 """
 import os
+import threading
+from types import MappingProxyType
+from config import chatbot_config as config
+from src.corpus_reader import iter_faq_records, read_training_data
+from src.faq_matcher import FAQMatcher
+from src.retrieval import RetrievalIndex, chunk_text
+from src.snapshot import MappedFAQs, default_snapshot_path, load_snapshot, source_signature
+
+DEFAULT_FAQS = {
+    "What is this chatbot?": "I am an AI assistant ready to help you with your questions.",
+    "How can I help you?": "I can assist you with various tasks and answer your questions.",
+}
+DEFAULT_TRAINING_DATA = "I am a helpful AI assistant designed to provide clear and concise responses."
+CONTEXT_PREAMBLE = "I am a helpful AI assistant ready to help you."
+
+
+class KnowledgeSnapshot:
+    """Immutable FAQs and training data, plus the values derived from them
+
+    Readers grab the current snapshot once and use it for the whole request,
+    so a reload swapping in a new snapshot can never mix old and new data
+    within one prompt.
+    """
+
+    def __init__(self, faqs, training_data, faq_version=0, training_version=0, previous=None, index=None,
+                 faq_matcher=None, source=None):
+        # FAQs from a compiled snapshot are already immutable and stay in the mapped file
+        self.faqs = faqs if isinstance(faqs, MappedFAQs) else MappingProxyType(dict(faqs))
+        self.training_data = training_data
+        # The compiled snapshot file the data was mapped from ({"path", "sources"}), if any
+        self.source = source
+        # Bumped whenever the data actually changes; derived values such as
+        # the rendered context and the search index are cached per version
+        self.faq_version = faq_version
+        self.training_version = training_version
+        self._derived = {}
+        if index is not None:
+            self._derived['index'] = (self.version, index)
+        if faq_matcher is not None:
+            self._derived['faq_matcher'] = (self.faq_version, faq_matcher)
+        if previous is not None:
+            # Keep derived values whose source data did not change
+            for key, (version, value) in previous._derived.items():
+                if version == self._version_for(key):
+                    self._derived[key] = (version, value)
+
+    @property
+    def version(self):
+        """Version of the data as a whole"""
+        return (self.faq_version, self.training_version)
+
+    def _version_for(self, key):
+        if key in ('faq_matcher', 'faq_section'):
+            return self.faq_version
+        if key == 'training_section':
+            return self.training_version
+        return self.version
+
+    def _cached(self, key, build):
+        """Return a value derived from the data, building it on first use
+
+        The (version, value) pair is stored with a single assignment, so
+        concurrent readers get either nothing or the finished value, never a
+        partially built one.
+        """
+        version = self._version_for(key)
+        cached = self._derived.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, build())
+            self._derived[key] = cached
+        return cached[1]
+
+    def get_index(self):
+        """Get the retrieval index"""
+        def build():
+            passages = [f"Q: {q}\nA: {a}" for q, a in self.faqs.items()]
+            if self.training_data:
+                passages.extend(chunk_text(self.training_data, config.RETRIEVAL_CHUNK_WORDS))
+            return RetrievalIndex(passages)
+        return self._cached('index', build)
+
+    def get_faq_matcher(self):
+        """Get the FAQ matcher"""
+        return self._cached('faq_matcher', lambda: FAQMatcher(self.faqs, threshold=config.FAQ_MATCH_THRESHOLD))
+
+    def _render_training_section(self):
+        if not self.training_data:
+            return ""
+        return f"Additional Training Context:\n{self.training_data}\n\n"
+
+    def _render_faq_section(self):
+        if not self.faqs:
+            return ""
+        parts = ["Frequently Asked Questions:\n"]
+        parts.extend(f"Q: {q}\nA: {a}\n\n" for q, a in self.faqs.items())
+        return "".join(parts)
+
+    def _render_context(self):
+        """Render the full context, reusing the sections whose data is unchanged"""
+        training = self._cached('training_section', self._render_training_section)
+        faqs = self._cached('faq_section', self._render_faq_section)
+        return f"{CONTEXT_PREAMBLE}\n\n{training}{faqs}".strip()
+
+    def get_context(self, query=None):
+        """Get combined context for the chatbot
+
+        With a query, only the passages most relevant to it are included,
+        up to the configured token budget.
+        """
+        if query and config.RETRIEVAL_ENABLED:
+            return self.get_relevant_context(query)
+        return self._cached('context', self._render_context)
+
+    def get_relevant_passages(self, query):
+        """Get the passages most relevant to a query, within the context token budget"""
+        return self.get_index().select(
+            query,
+            top_k=config.RETRIEVAL_TOP_K,
+            token_budget=config.CONTEXT_TOKEN_BUDGET
+        )
+
+    def get_relevant_context(self, query):
+        """Get context built from the passages most relevant to a query"""
+        passages = self.get_relevant_passages(query)
+        context = CONTEXT_PREAMBLE
+        if passages:
+            context += "\n\nRelevant Information:\n" + "\n\n".join(passages)
+        return context
+
+    def get_context_parts(self, query):
+        """Split the context for a query into a static part and a per-query part
+
+        The static part only changes with the data, so it can sit in a stable
+        prompt prefix; with retrieval the per-query part holds the passages.
+        """
+        if query and config.RETRIEVAL_ENABLED:
+            return CONTEXT_PREAMBLE, "\n\n".join(self.get_relevant_passages(query))
+        return self.get_context(), ""
+
+    def warm(self):
+        """Build every derived value up front, e.g. before the snapshot goes live"""
+        if config.RETRIEVAL_ENABLED:
+            # Prompts only read the full context without retrieval; build it lazily if ever needed
+            self.get_index()
+        else:
+            self.get_context()
+        if config.FAQ_MATCH_ENABLED:
+            self.get_faq_matcher()
+        return self
+
 
 class DataLoader:
-    def __init__(self, data_dir):
+    def __init__(self, data_dir, use_defaults=False, use_snapshot=None):
         self.data_dir = data_dir
-        self.faqs = {
-            "What is this chatbot?": "I am an AI assistant ready to help you with your questions.",
-            "How can I help you?": "I can assist you with various tasks and answer your questions.",
-        }
-        self.training_data = "I am a helpful AI assistant designed to provide clear and concise responses."
-        
+        self.snapshot = KnowledgeSnapshot(DEFAULT_FAQS, DEFAULT_TRAINING_DATA)
+        self._swap_lock = threading.Lock()
+        # Version of the data shared with other workers, see shared_state.KnowledgeSync
+        self.shared_version = None
+        if use_defaults:
+            return
+
         # Create data directory if it doesn't exist
         try:
             os.makedirs(self.data_dir, exist_ok=True)
@@ -19,32 +170,135 @@ class DataLoader:
             print(f"Note: Using default configuration: {e}")
             return
 
+        if use_snapshot is None:
+            use_snapshot = config.KNOWLEDGE_SNAPSHOT_ENABLED
+        try:
+            if use_snapshot and self.load_compiled():
+                print("Successfully loaded compiled knowledge snapshot")
+                return
+        except Exception as e:
+            print(f"Note: Ignoring knowledge snapshot: {e}")
+
         # Try to load data, but use defaults if unavailable
         try:
             if self.load_training_data():
                 print("Successfully loaded training data")
         except Exception as e:
             print(f"Note: Using default training data: {e}")
-            
+
         try:
             if self.load_faqs():
                 print("Successfully loaded FAQs")
         except Exception as e:
             print(f"Note: Using default FAQs: {e}")
 
-    def load_faqs(self, filename="training_faqs.txt"):
-        """Load FAQs from a text file"""
+    @property
+    def faqs(self):
+        """FAQs of the current snapshot (read-only)"""
+        return self.snapshot.faqs
+
+    @property
+    def training_data(self):
+        """Training data of the current snapshot"""
+        return self.snapshot.training_data
+
+    @property
+    def faq_version(self):
+        return self.snapshot.faq_version
+
+    @property
+    def training_version(self):
+        return self.snapshot.training_version
+
+    @property
+    def version(self):
+        """Version of the loaded data as a whole"""
+        return self.snapshot.version
+
+    def _swap(self, faqs=None, training_data=None, warm=False):
+        """Atomically replace the current snapshot if the data changed
+
+        The new snapshot is fully built (and optionally warmed) before it is
+        published with a single assignment, so readers never wait on a reload.
+        """
+        with self._swap_lock:
+            current = self.snapshot
+            faq_changed = faqs is not None and faqs != current.faqs
+            training_changed = training_data is not None and training_data != current.training_data
+            if not faq_changed and not training_changed:
+                return False
+            snapshot = KnowledgeSnapshot(
+                faqs if faq_changed else current.faqs,
+                training_data if training_changed else current.training_data,
+                faq_version=current.faq_version + faq_changed,
+                training_version=current.training_version + training_changed,
+                previous=current
+            )
+            if warm:
+                snapshot.warm()
+            self.snapshot = snapshot
+            return True
+
+    def _read_faqs(self, filename):
+        """Parse a FAQ file (.txt, .jsonl or .csv) into a dict, one record at a time"""
+        loaded_faqs = {}
+        for question, answer in iter_faq_records(os.path.join(self.data_dir, filename)):
+            loaded_faqs[question] = answer
+        return loaded_faqs
+
+    def _read_all_faqs(self):
+        """Parse every configured FAQ file that exists, later files winning"""
+        loaded_faqs = {}
+        found = False
+        for filename in config.FAQ_FILES:
+            try:
+                loaded_faqs.update(self._read_faqs(filename))
+                found = True
+            except FileNotFoundError:
+                continue
+        return loaded_faqs if found else None
+
+    def _read_training_data(self, filename):
+        """Read the training data file"""
+        return read_training_data(os.path.join(self.data_dir, filename))
+
+    def load_compiled(self, path=None, warm=False):
+        """Load a compiled knowledge snapshot if it's up to date with the data files"""
+        path = path or default_snapshot_path(self.data_dir)
+        if not os.path.exists(path):
+            return False
+        compiled = load_snapshot(path)
+        if compiled.header["sources"] != source_signature(self.data_dir):
+            print(f"Note: {path} is out of date, recompile it with: python -m src.snapshot compile")
+            return False
+        with self._swap_lock:
+            current = self.snapshot
+            snapshot = KnowledgeSnapshot(
+                compiled.faqs,
+                compiled.training_data,
+                faq_version=current.faq_version + 1,
+                training_version=current.training_version + 1,
+                index=compiled.index if compiled.matches_config() else None,
+                faq_matcher=compiled.faq_matcher,
+                source={"path": os.path.abspath(path), "sources": compiled.header["sources"]}
+            )
+            if warm:
+                snapshot.warm()
+            self.snapshot = snapshot
+        return True
+
+    def load_faqs(self, filename=None):
+        """Load FAQs from a text, JSONL or CSV file (all configured FAQ files by default)"""
+        if filename is None:
+            loaded_faqs = self._read_all_faqs()
+            if loaded_faqs:
+                self._swap(faqs={**self.faqs, **loaded_faqs})
+            return loaded_faqs is not None
         try:
-            with open(os.path.join(self.data_dir, filename), 'r') as f:
-                content = f.read().strip().split('\n\n')
-                loaded_faqs = {}
-                for qa in content:
-                    if '?' in qa:
-                        q, a = qa.split('?', 1)
-                        loaded_faqs[q.strip() + '?'] = a.strip()
-                if loaded_faqs:  # Only update if we loaded something
-                    self.faqs.update(loaded_faqs)
-                return True
+            loaded_faqs = self._read_faqs(filename)
+            if loaded_faqs:  # Only update if we loaded something
+                self._swap(faqs={**self.faqs, **loaded_faqs})
+            return True
         except FileNotFoundError:
             # Just use default FAQs
             return False
@@ -52,13 +306,29 @@ class DataLoader:
     def load_training_data(self, filename="training_data.txt"):
         """Load general training data"""
         try:
-            with open(os.path.join(self.data_dir, filename), 'r') as f:
-                self.training_data = f.read().strip()
+            self._swap(training_data=self._read_training_data(filename))
             return True
         except FileNotFoundError:
             print(f"Warning: {filename} not found in {self.data_dir}")
             return False
 
+    def reload(self, training_filename="training_data.txt"):
+        """Re-read the data files and swap in one new, fully built snapshot"""
+        faqs = None
+        training_data = None
+        loaded_faqs = self._read_all_faqs()
+        if loaded_faqs:
+            faqs = {**self.faqs, **loaded_faqs}
+        try:
+            training_data = self._read_training_data(training_filename)
+        except FileNotFoundError:
+            pass
+        return self._swap(faqs=faqs, training_data=training_data, warm=True)
+
+    def replace_data(self, faqs, training_data):
+        """Replace the FAQs and training data, e.g. with data published by another worker"""
+        return self._swap(faqs=faqs, training_data=training_data, warm=True)
+
     def _init_default_data(self):
         """Initialize with default data if no files exist"""
         default_faqs = {
@@ -66,9 +336,9 @@ class DataLoader:
             "How can I help you?": "I can answer questions, provide information, and assist with various tasks.",
             "What can you do?": "I can understand and respond to your questions, help with basic tasks, and provide relevant information."
         }
-        
+
         default_training = "I am a helpful AI assistant. I aim to be friendly, informative, and concise."
-        
+
         # Save default data if files don't exist
         if not os.path.exists(os.path.join(self.data_dir, "training_faqs.txt")):
             faq_content = ""
@@ -77,32 +347,34 @@ class DataLoader:
             try:
                 with open(os.path.join(self.data_dir, "training_faqs.txt"), 'w') as f:
                     f.write(faq_content.strip())
-                self.faqs = default_faqs
             except Exception as e:
                 print(f"Warning: Could not write default FAQs: {str(e)}")
-                self.faqs = default_faqs
+            self._swap(faqs=default_faqs)
 
         if not os.path.exists(os.path.join(self.data_dir, "training_data.txt")):
             try:
                 with open(os.path.join(self.data_dir, "training_data.txt"), 'w') as f:
                     f.write(default_training)
-                self.training_data = default_training
             except Exception as e:
                 print(f"Warning: Could not write default training data: {str(e)}")
-                self.training_data = default_training
-
-    def get_context(self):
-        """Get combined context for the chatbot"""
-        context = "I am a helpful AI assistant ready to help you.\n\n"
-        
-        # Add training data if available
-        if self.training_data:
-            context += f"Additional Training Context:\n{self.training_data}\n\n"
-            
-        # Add FAQs if available
-        if self.faqs:
-            context += "Frequently Asked Questions:\n"
-            for q, a in self.faqs.items():
-                context += f"Q: {q}\nA: {a}\n\n"
-                
-        return context.strip()
+            self._swap(training_data=default_training)
+
+    def get_index(self):
+        """Get the retrieval index of the current snapshot"""
+        return self.snapshot.get_index()
+
+    def get_faq_matcher(self):
+        """Get the FAQ matcher of the current snapshot"""
+        return self.snapshot.get_faq_matcher()
+
+    def get_context(self, query=None):
+        """Get combined context for the chatbot from the current snapshot"""
+        return self.snapshot.get_context(query)
+
+    def get_relevant_context(self, query):
+        """Get context built from the passages most relevant to a query"""
+        return self.snapshot.get_relevant_context(query)
+
+    def get_context_parts(self, query):
+        """Get the static and per-query context from the current snapshot"""
+        return self.snapshot.get_context_parts(query)
@@ -0,0 +1,70 @@
+"""
+Background watcher that hot-reloads knowledge data when it changes
+"""
+import os
+import threading
+
+
+class DataWatcher:
+    """Poll the data directory and reload the chatbot's data off the request path
+
+    Every worker runs its own watcher. A change to the files is picked up by
+    each worker directly; a reload triggered through /reload-data on one
+    worker reaches the others through the chatbot's KnowledgeSync.
+    """
+
+    def __init__(self, chatbot, data_dir, interval=2.0):
+        self.chatbot = chatbot
+        self.data_dir = data_dir
+        self.interval = interval
+        self.reloads = 0
+        self._signature = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _scan(self):
+        """Return (name, mtime, size) for every regular file in the data directory"""
+        try:
+            entries = list(os.scandir(self.data_dir))
+        except FileNotFoundError:
+            return ()
+        signature = []
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(signature))
+
+    def start(self):
+        """Load the data (if needed) and start watching in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="data-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the watcher thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        # Load data up front so the first request doesn't pay for it
+        self._signature = self._scan()
+        self.chatbot.ensure_data_loaded()
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """Reload if the files changed, then adopt data published by other workers"""
+        try:
+            signature = self._scan()
+            if signature != self._signature:
+                self._signature = signature
+                if self.chatbot.reload_training_data():
+                    self.reloads += 1
+            self.chatbot.refresh_knowledge()
+        except Exception as e:
+            print(f"Warning: Data watcher check failed: {e}")
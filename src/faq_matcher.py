@@ -0,0 +1,223 @@
+"""
+Exact and fuzzy FAQ matching to answer common questions without the LLM
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+import numpy as np
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+# Candidates whose n-grams are this common carry little signal, so they're
+# skipped when gathering candidates (but still count towards the final score)
+MAX_GRAM_POSTINGS = 2000
+MAX_CANDIDATES = 20
+
+
+def normalize_question(text):
+    """Normalize a question for matching: case, accents, punctuation, spacing"""
+    text = unicodedata.normalize('NFKD', text)
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    return _NON_WORD_RE.sub(' ', text).strip()
+
+
+# Normalized text only holds these characters, so an n-gram is a number in base 37
+_ALPHABET = " abcdefghijklmnopqrstuvwxyz0123456789"
+_CODES = np.zeros(256, dtype=np.int64)
+_CODES[np.frombuffer(_ALPHABET.encode('ascii'), dtype=np.uint8)] = np.arange(len(_ALPHABET))
+
+
+def ngram_ids(texts, n=3):
+    """Return the distinct n-grams of normalized texts as (text position, n-gram id) arrays
+
+    Both arrays are sorted by text, then n-gram. Empty texts have no n-grams.
+    """
+    padded = [f" {text} " if text else "" for text in texts]
+    lengths = np.fromiter((len(p) for p in padded), dtype=np.int64, count=len(padded))
+    starts = np.zeros(len(padded), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    codes = _CODES[np.frombuffer("".join(padded).encode('ascii'), dtype=np.uint8)]
+    if len(codes) < n:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+    positions = len(codes) - n + 1
+    ids = np.zeros(positions, dtype=np.int64)
+    for k in range(n):
+        ids = ids * len(_ALPHABET) + codes[k:k + positions]
+    # Keep the n-grams that start and end within one text
+    owners = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)[:positions]
+    valid = np.arange(positions) - starts[owners] <= lengths[owners] - n
+    keys = np.unique(owners[valid] * len(_ALPHABET) ** n + ids[valid])
+    return (keys // len(_ALPHABET) ** n).astype(np.int32), (keys % len(_ALPHABET) ** n).astype(np.int32)
+
+
+def _question_hash(normalized):
+    return int.from_bytes(hashlib.blake2b(normalized.encode('ascii'), digest_size=8).digest(), 'little')
+
+
+def build_faq_tables(questions, n=3):
+    """Build the matcher's lookup tables for a list of questions as flat arrays
+
+    The arrays hold no Python objects, so they cost a few bytes per n-gram
+    and can be written to a compiled snapshot and mapped back as they are.
+    """
+    normalized = [normalize_question(q) for q in questions]
+    owners, grams = ngram_ids(normalized, n)
+    gram_offsets = np.zeros(len(questions) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners, minlength=len(questions)), out=gram_offsets[1:])
+    # Postings: the questions holding each n-gram, in question order
+    order = np.argsort(grams, kind='stable')
+    posting_offsets = np.zeros(len(_ALPHABET) ** n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(grams, minlength=len(_ALPHABET) ** n), out=posting_offsets[1:])
+    # Exact lookups by a hash of the normalized question; equal hashes keep question order
+    exact = [(i, _question_hash(text)) for i, text in enumerate(normalized) if text]
+    hashes = np.array([h for _, h in exact], dtype=np.uint64)
+    by_hash = np.argsort(hashes, kind='stable')
+    return {
+        "gram_offsets": gram_offsets,
+        "grams": grams,
+        "posting_offsets": posting_offsets,
+        "postings": owners[order],
+        "exact_hashes": hashes[by_hash],
+        "exact_ids": np.array([i for i, _ in exact], dtype=np.int32)[by_hash],
+    }
+
+
+class FAQMatch:
+    """A matched FAQ answer and how confident the match is"""
+    __slots__ = ('question', 'answer', 'score', 'kind')
+
+    def __init__(self, question, answer, score, kind):
+        self.question = question
+        self.answer = answer
+        self.score = score
+        self.kind = kind
+
+
+class FAQMatcher:
+    """Match user input against FAQ questions by hash lookup, then n-gram similarity"""
+
+    def __init__(self, faqs, threshold=0.85, ngram=3):
+        questions, answers = [], []
+        for question, answer in faqs.items():
+            questions.append(question)
+            answers.append(answer)
+        self._init(questions, answers, build_faq_tables(questions, ngram), threshold, ngram)
+
+    @classmethod
+    def from_arrays(cls, questions, answers, tables, threshold=0.85, ngram=3):
+        """Create a matcher from prebuilt tables, e.g. those of a compiled snapshot
+
+        questions and answers may be any sequences, so they can be backed by
+        a memory-mapped file instead of Python objects.
+        """
+        matcher = cls.__new__(cls)
+        matcher._init(questions, answers, tables, threshold, ngram)
+        return matcher
+
+    def _init(self, questions, answers, tables, threshold, ngram):
+        self.threshold = threshold
+        self.ngram = ngram
+        self._questions = questions
+        self._answers = answers
+        self._gram_offsets = tables["gram_offsets"]
+        self._grams = tables["grams"]
+        self._posting_offsets = tables["posting_offsets"]
+        self._postings = tables["postings"]
+        self._exact_hashes = tables["exact_hashes"]
+        self._exact_ids = tables["exact_ids"]
+
+    def __len__(self):
+        return len(self._exact_ids)
+
+    def _find_exact(self, normalized):
+        """Position of the first question normalizing to the text, or None"""
+        question_hash = np.uint64(_question_hash(normalized))
+        i = int(np.searchsorted(self._exact_hashes, question_hash))
+        while i < len(self._exact_hashes) and self._exact_hashes[i] == question_hash:
+            faq_id = int(self._exact_ids[i])
+            if normalize_question(self._questions[faq_id]) == normalized:
+                return faq_id
+            i += 1
+        return None
+
+    def match(self, text, threshold=None):
+        """Return the best FAQMatch at or above the threshold (self.threshold by default), or None"""
+        normalized = normalize_question(text)
+        if not normalized:
+            return None
+
+        faq_id = self._find_exact(normalized)
+        if faq_id is not None:
+            return FAQMatch(self._questions[faq_id], self._answers[faq_id], 1.0, 'exact')
+
+        _, grams = ngram_ids([normalized], self.ngram)
+        starts = self._posting_offsets[grams]
+        ends = self._posting_offsets[grams + 1]
+        postings = [self._postings[start:end] for start, end in zip(starts, ends)
+                    if 0 < end - start <= MAX_GRAM_POSTINGS]
+        if not postings:
+            return None
+        candidates, overlap = np.unique(np.concatenate(postings), return_counts=True)
+
+        best_id, best_score = None, 0.0
+        for candidate in candidates[np.argsort(-overlap, kind='stable')[:MAX_CANDIDATES]]:
+            candidate_grams = self._grams[self._gram_offsets[candidate]:self._gram_offsets[candidate + 1]]
+            # Dice coefficient over the full n-gram sets
+            common = len(np.intersect1d(grams, candidate_grams, assume_unique=True))
+            score = 2 * common / (len(grams) + len(candidate_grams))
+            if score > best_score:
+                best_id, best_score = int(candidate), score
+
+        if best_id is None or best_score < (self.threshold if threshold is None else threshold):
+            return None
+        return FAQMatch(self._questions[best_id], self._answers[best_id], best_score, 'fuzzy')
+
+
+class FAQMatchStats:
+    """Hit rate and latency saved by answering from the FAQ matcher"""
+
+    def __init__(self):
+        self.lookups = 0
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.match_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_lookup(self, match, elapsed):
+        """Record one matcher lookup and its result"""
+        with self._lock:
+            self.lookups += 1
+            self.match_seconds += elapsed
+            if match is not None:
+                if match.kind == 'exact':
+                    self.exact_hits += 1
+                else:
+                    self.fuzzy_hits += 1
+
+    def record_llm_call(self, elapsed):
+        """Record the latency of an LLM call the matcher could not avoid"""
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += elapsed
+
+    def snapshot(self):
+        """Return the counters and derived hit rate and latency saved"""
+        with self._lock:
+            hits = self.exact_hits + self.fuzzy_hits
+            avg_llm = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+            avg_match = self.match_seconds / self.lookups if self.lookups else 0.0
+            return {
+                "lookups": self.lookups,
+                "hits": hits,
+                "exact_hits": self.exact_hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+                "avg_match_ms": avg_match * 1000,
+                "avg_llm_ms": avg_llm * 1000,
+                "latency_saved_seconds": hits * max(0.0, avg_llm - avg_match),
+            }
+
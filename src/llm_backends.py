@@ -0,0 +1,289 @@
+"""
+Chat completion backends: the OpenAI API, a simulated stub and a local CPU model
+"""
+import asyncio
+import contextvars
+import json
+import math
+import random
+import threading
+import aiohttp
+import openai
+from openai.openai_object import OpenAIObject
+from config import chatbot_config as config
+from src.coalescing import MicroBatcher
+from src.retrieval import estimate_tokens
+
+try:
+    import transformers
+except ImportError:
+    transformers = None
+
+# Which upstream attempt of a request is running: 0 first, then retries and hedges
+current_attempt = contextvars.ContextVar("llm_attempt", default=0)
+
+STUB_VOCABULARY = ("you", "can", "find", "this", "in", "the", "settings", "page", "of", "your", "account",
+                   "and", "it", "usually", "takes", "a", "few", "minutes", "to", "apply", "changes", "for",
+                   "team", "support", "is", "happy", "help", "with", "anything", "else")
+
+
+def completion_response(text, model, prompt_tokens=0, completion_tokens=0):
+    """Wrap a reply in the same response object the OpenAI client returns"""
+    return OpenAIObject.construct_from({
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    })
+
+
+def _prompt_tokens(messages):
+    return sum(estimate_tokens(message["content"]) for message in messages)
+
+
+class LLMBackend:
+    """A chat completion provider, run on the completion client's event loop
+
+    create() returns an OpenAI-style response (response.choices[0].message.content)
+    and stream() yields the content deltas of a reply. session is the
+    client's pooled aiohttp session, for backends that make HTTP calls.
+    """
+
+    name = None
+    model = None
+
+    async def create(self, params, session):
+        raise NotImplementedError
+
+    async def stream(self, params, session):
+        raise NotImplementedError
+        yield
+
+    async def warm(self, session, connections, timeout):
+        """Prepare the backend before the first request; returns connections opened"""
+        return 0
+
+    def stats(self):
+        return {"backend": self.name, "model": self.model}
+
+
+class OpenAIBackend(LLMBackend):
+    """The OpenAI chat completions API"""
+
+    name = "openai"
+
+    def __init__(self, model=None):
+        self.model = model or config.OPENAI_MODEL
+
+    async def create(self, params, session):
+        token = openai.aiosession.set(session)
+        try:
+            return await openai.ChatCompletion.acreate(**params)
+        finally:
+            openai.aiosession.reset(token)
+
+    async def stream(self, params, session):
+        token = openai.aiosession.set(session)
+        try:
+            chunks = await openai.ChatCompletion.acreate(stream=True, **params)
+            async for chunk in chunks:
+                delta = chunk.choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            openai.aiosession.reset(token)
+
+    async def warm(self, session, connections, timeout):
+        async def connect():
+            try:
+                # Any response leaves a keep-alive connection (TLS included) in the pool
+                async with session.get(openai.api_base, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    await response.read()
+                return True
+            except Exception:
+                return False
+        results = await asyncio.gather(*(connect() for _ in range(connections)))
+        return sum(results)
+
+
+class StubBackend(LLMBackend):
+    """Simulated LLM for offline load tests, benchmarks and capacity planning
+
+    Each request waits a log-normally distributed time to first token, then
+    produces a normally distributed number of tokens at a normally distributed
+    token rate. Samples are drawn from a generator seeded with the seed,
+    the request's messages and the attempt number, so a replayed workload
+    behaves the same on every run whatever order requests arrive in, while
+    retries and hedged requests get their own samples. A share of requests
+    (error_rate) fails with a simulated upstream error.
+    """
+
+    name = "stub"
+
+    def __init__(self, first_token_ms=300, first_token_sigma=0.5, tokens_per_second=50,
+                 tokens_per_second_sd=10, output_tokens=60, seed=0, model="stub", error_rate=0.0):
+        self.first_token_ms = first_token_ms
+        self.first_token_sigma = first_token_sigma
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_second_sd = tokens_per_second_sd
+        self.output_tokens = output_tokens
+        self.seed = seed
+        self.model = model
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+
+    def sample(self, params):
+        """Return (seconds to first token, seconds per token, reply tokens, fails) for a request"""
+        seed = f"{self.seed}:{json.dumps(params['messages'], sort_keys=True)}"
+        attempt = current_attempt.get()
+        rng = random.Random(f"{seed}:{attempt}" if attempt else seed)
+        first_token = self.first_token_ms / 1000 * math.exp(rng.gauss(0, self.first_token_sigma))
+        rate = max(1.0, rng.gauss(self.tokens_per_second, self.tokens_per_second_sd))
+        count = max(1, round(rng.gauss(self.output_tokens, self.output_tokens / 4)))
+        if params.get("max_tokens"):
+            count = min(count, params["max_tokens"])
+        words = ["Simulated", "reply."] + [rng.choice(STUB_VOCABULARY) for _ in range(count)]
+        return first_token, 1 / rate, words[:count], rng.random() < self.error_rate
+
+    async def _fail(self, delay):
+        self.errors += 1
+        await asyncio.sleep(delay)
+        raise openai.error.ServiceUnavailableError("Simulated upstream error")
+
+    async def create(self, params, session):
+        self.requests += 1
+        first_token, per_token, words, fails = self.sample(params)
+        if fails:
+            await self._fail(first_token)
+        await asyncio.sleep(first_token + per_token * len(words))
+        return completion_response(" ".join(words), self.model, _prompt_tokens(params["messages"]), len(words))
+
+    async def stream(self, params, session):
+        self.requests += 1
+        first_token, per_token, words, fails = self.sample(params)
+        if fails:
+            await self._fail(first_token)
+        await asyncio.sleep(first_token)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(per_token)
+            yield word if i == 0 else f" {word}"
+
+    def stats(self):
+        stats = super().stats()
+        stats["requests"] = self.requests
+        stats["errors"] = self.errors
+        return stats
+
+
+class LocalModelBackend(LLMBackend):
+    """Small open model run on the CPU with Hugging Face transformers
+
+    Needs the optional transformers and torch packages. Generation runs in
+    executor threads, one batch at a time. With a batching window, requests
+    arriving within it are generated together as one batch. Streaming yields
+    the reply word by word once it has been generated.
+    """
+
+    name = "local"
+
+    def __init__(self, model_name, threads=0, batch_window_ms=0, max_batch=16):
+        if transformers is None:
+            raise RuntimeError("The local LLM backend needs the transformers and torch packages")
+        self.model = model_name
+        self.threads = threads
+        self.batcher = MicroBatcher(self._generate, batch_window_ms / 1000, max_batch) if batch_window_ms > 0 else None
+        self._pipeline = None
+        self._load_lock = threading.Lock()
+        self._generate_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._pipeline is None:
+                if self.threads:
+                    import torch
+                    torch.set_num_threads(self.threads)
+                pipeline = transformers.pipeline("text-generation", model=self.model, device=-1)
+                tokenizer = pipeline.tokenizer
+                # Batches of different lengths are padded on the left for decoder-only models
+                if tokenizer.pad_token is None:
+                    tokenizer.pad_token = tokenizer.eos_token
+                tokenizer.padding_side = "left"
+                self._pipeline = pipeline
+            return self._pipeline
+
+    def _prompt(self, tokenizer, messages):
+        if getattr(tokenizer, "chat_template", None):
+            return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        lines = [f"{message['role']}: {message['content']}" for message in messages]
+        return "\n".join(lines) + "\nassistant:"
+
+    def _generate(self, requests):
+        """Generate the replies to a batch of requests"""
+        pipeline = self._load()
+        prompts = [self._prompt(pipeline.tokenizer, params["messages"]) for params in requests]
+        temperature = requests[0].get("temperature") or 0
+        with self._generate_lock:
+            outputs = pipeline(
+                prompts,
+                max_new_tokens=max(params.get("max_tokens") or config.MAX_TOKENS for params in requests),
+                do_sample=temperature > 0,
+                temperature=temperature or None,
+                return_full_text=False,
+                batch_size=len(prompts)
+            )
+        return [output[0]["generated_text"].strip() for output in outputs]
+
+    async def create(self, params, session):
+        if self.batcher is not None:
+            text = await asyncio.wrap_future(self.batcher.submit(params))
+        else:
+            loop = asyncio.get_running_loop()
+            text = (await loop.run_in_executor(None, self._generate, [params]))[0]
+        return completion_response(text, self.model, _prompt_tokens(params["messages"]), estimate_tokens(text))
+
+    async def stream(self, params, session):
+        response = await self.create(params, session)
+        for i, word in enumerate(response.choices[0].message.content.split()):
+            yield word if i == 0 else f" {word}"
+
+    async def warm(self, session, connections, timeout):
+        # Loading the weights is the slow part of a cold start
+        await asyncio.get_running_loop().run_in_executor(None, self._load)
+        return 0
+
+    def stats(self):
+        stats = super().stats()
+        if self.batcher is not None:
+            stats["batching"] = self.batcher.stats()
+        return stats
+
+
+def create_llm_backend(name=None):
+    """Create the LLM backend configured in chatbot_config"""
+    name = name or config.LLM_BACKEND
+    if name == "openai":
+        return OpenAIBackend(config.OPENAI_MODEL)
+    if name == "stub":
+        return StubBackend(
+            first_token_ms=config.STUB_LLM_FIRST_TOKEN_MS,
+            first_token_sigma=config.STUB_LLM_FIRST_TOKEN_SIGMA,
+            tokens_per_second=config.STUB_LLM_TOKENS_PER_SECOND,
+            tokens_per_second_sd=config.STUB_LLM_TOKENS_PER_SECOND_SD,
+            output_tokens=config.STUB_LLM_OUTPUT_TOKENS,
+            seed=config.STUB_LLM_SEED,
+            error_rate=config.STUB_LLM_ERROR_RATE
+        )
+    if name == "local":
+        return LocalModelBackend(
+            config.LOCAL_MODEL_NAME,
+            threads=config.LOCAL_MODEL_THREADS,
+            batch_window_ms=config.LLM_BATCH_WINDOW_MS,
+            max_batch=config.LLM_MAX_BATCH_SIZE
+        )
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,194 @@
+"""
+Pooled, non-blocking client for chat completions
+"""
+import asyncio
+import atexit
+import os
+import threading
+import aiohttp
+from config import chatbot_config as config
+from src.llm_backends import OpenAIBackend, create_llm_backend
+from src.metrics import metrics
+from src.resilience import RetryPolicy, create_retry_policy
+
+
+class AsyncCompletionClient:
+    """Run completions on a shared event loop with a pooled HTTP session
+
+    Flask runs every async view on a fresh event loop, so a keep-alive
+    connection pool can't live on the request's loop. Instead the client owns
+    one background loop per process and callers on any loop await its results.
+    The completions themselves come from an LLMBackend (OpenAI by default),
+    with the deadlines, retries and circuit breaker of a RetryPolicy.
+    """
+
+    def __init__(self, backend=None, max_connections=100, max_concurrency=200, keepalive_seconds=30,
+                 request_timeout=60, policy=None):
+        self.backend = backend or OpenAIBackend()
+        self.policy = policy or RetryPolicy(attempt_timeout=request_timeout, max_attempts=1)
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.keepalive_seconds = keepalive_seconds
+        self.request_timeout = request_timeout
+        self.in_flight = 0
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._session = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Model name to request from the backend"""
+        return self.backend.model
+
+    def _ensure_started(self):
+        """Start the background loop, restarting it in forked workers"""
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return self._loop
+
+            # Threads don't survive fork, so a loop inherited from the parent is dead
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="llm-client", daemon=True)
+            thread.start()
+            asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+            self._loop = loop
+            self._thread = thread
+            self._pid = os.getpid()
+            return loop
+
+    async def _open(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            keepalive_timeout=self.keepalive_seconds
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _create(self, params):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                params.setdefault("request_timeout", self.request_timeout)
+                return await self.policy.call(lambda: self.backend.create(params, self._session))
+            finally:
+                self.in_flight -= 1
+
+    def submit(self, **params):
+        """Start a chat completion from any thread and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(self._create(params), self._ensure_started())
+
+    async def create(self, **params):
+        """Create a chat completion without blocking the caller's event loop"""
+        return await asyncio.wrap_future(self.submit(**params))
+
+    async def _stream(self, params, put):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                params.setdefault("request_timeout", self.request_timeout)
+                async for delta in self.policy.stream(lambda: self.backend.stream(params, self._session)):
+                    put((delta, None))
+                put((None, None))
+            except Exception as e:
+                put((None, e))
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, **params):
+        """Stream the content deltas of a chat completion as they arrive"""
+        loop = self._ensure_started()
+        caller_loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def put(item):
+            try:
+                caller_loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # The caller's loop has already closed
+
+        future = asyncio.run_coroutine_threadsafe(self._stream(params, put), loop)
+        try:
+            while True:
+                delta, error = await queue.get()
+                if error is not None:
+                    raise error
+                if delta is None:
+                    return
+                yield delta
+        finally:
+            future.cancel()
+
+    def iterate_sync(self, async_iterable):
+        """Drive an async iterator on the client loop from synchronous code"""
+        loop = self._ensure_started()
+        iterator = async_iterable.__aiter__()
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(iterator.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Runs when the consumer stops early, e.g. a client disconnect
+            if hasattr(iterator, "aclose"):
+                asyncio.run_coroutine_threadsafe(iterator.aclose(), loop).result()
+
+    def warm(self, connections=1, timeout=5):
+        """Start the background loop and open pooled connections before the first request
+
+        Returns the number of connections opened; failures (e.g. no network)
+        are ignored, the first completion then simply connects itself. Local
+        backends load their model here instead.
+        """
+        loop = self._ensure_started()
+        if connections <= 0:
+            return 0
+        future = asyncio.run_coroutine_threadsafe(self.backend.warm(self._session, connections, timeout), loop)
+        return future.result()
+
+    def close(self):
+        """Close the connection pool and stop the background loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None or self._pid != os.getpid():
+                return
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        """Return pool and concurrency settings with the current load"""
+        return {
+            "backend": self.backend.stats(),
+            "circuit": self.policy.breaker.stats() if self.policy.breaker else None,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "max_connections": self.max_connections,
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_completion_client():
+    """Get the process-wide completion client"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AsyncCompletionClient(
+                create_llm_backend(),
+                max_connections=config.OPENAI_MAX_CONNECTIONS,
+                max_concurrency=config.OPENAI_MAX_CONCURRENCY,
+                keepalive_seconds=config.OPENAI_KEEPALIVE_SECONDS,
+                request_timeout=config.OPENAI_REQUEST_TIMEOUT,
+                policy=create_retry_policy(config)
+            )
+            atexit.register(_client.close)
+            breaker = _client.policy.breaker
+            metrics.gauge("chatbot_llm_circuit_open", "1 while the circuit breaker fails completions fast",
+                          lambda: int(breaker.state == "open"), aggregate="max")
+        return _client
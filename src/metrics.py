@@ -0,0 +1,292 @@
+"""
+Low-overhead metrics with a Prometheus text exposition
+
+Every thread records into its own shard (plain dicts only that thread
+writes), so the hot path takes no locks. A scrape sums the shards of the
+worker; shards of threads that have exited (asgiref runs each async view on
+a new thread) are folded into one retired shard. Under gunicorn each worker also flushes its totals to a file in a
+shared directory, and a scrape on any worker merges every worker's file.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import chatbot_config as config
+
+# Latency buckets in seconds, from cache hits to slow completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Shard:
+    """The metrics recorded by one thread"""
+
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    """Counters, histograms and gauges for one process
+
+    Histograms are stored per label set as bucket counts (the last one for
+    values above every bound) followed by the sum of observed values. Gauges
+    are read from callbacks at scrape time; "sum" gauges are added up across
+    workers, "max" gauges (e.g. the size of a store the workers share) are not.
+    """
+
+    def __init__(self, directory=None, flush_seconds=5):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._metrics = {}
+        self._gauges = {}
+        self._shards = []
+        self._retired = _Shard()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        if hasattr(os, "register_at_fork"):
+            # A forked worker starts from zero instead of counting the master's metrics again
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._shards = []
+        self._retired = _Shard()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text):
+        self._metrics[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._metrics[name] = ("histogram", help_text, tuple(buckets))
+
+    def gauge(self, name, help_text, callback, aggregate="sum"):
+        """Register a gauge read from callback() at scrape time"""
+        self._metrics[name] = ("gauge", help_text, aggregate)
+        self._gauges[name] = callback
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard()
+            with self._lock:
+                live = []
+                for thread, other in self._shards:
+                    if thread.is_alive():
+                        live.append((thread, other))
+                    else:
+                        _merge(self._retired, other.counters, other.histograms)
+                live.append((threading.current_thread(), shard))
+                self._shards = live
+            self._local.shard = shard
+        return shard
+
+    def inc(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        counters = self._shard().counters
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record a value in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        histograms = self._shard().histograms
+        values = histograms.get(key)
+        buckets = self._metrics[name][2]
+        if values is None:
+            values = histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        values[bisect.bisect_left(buckets, value)] += 1
+        values[-1] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the time spent in a with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """Totals of this process, summed over its threads"""
+        total = _Shard()
+        with self._lock:
+            _merge(total, self._retired.counters, self._retired.histograms)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _merge(total, list(shard.counters.items()), list(shard.histograms.items()))
+        counters, histograms = total.counters, total.histograms
+        gauges = {}
+        for name, callback in self._gauges.items():
+            try:
+                gauges[(name, ())] = callback()
+            except Exception as e:
+                print(f"Warning: Failed to read gauge {name}: {e}")
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self):
+        """Write this worker's totals to the shared directory"""
+        if not self.directory:
+            return
+        snapshot = self.snapshot()
+        data = {
+            kind: [[name, list(map(list, labels)), value] for (name, labels), value in values.items()]
+            for kind, values in snapshot.items()
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+    def start_flusher(self):
+        """Flush periodically from a background thread, once per worker process"""
+        with self._lock:
+            if not self.directory or self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(self.flush_seconds)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Warning: Failed to flush metrics: {e}")
+
+        threading.Thread(target=run, name="metrics-flusher", daemon=True).start()
+
+    def collect(self):
+        """Merge the totals of every worker (or just this process without a directory)"""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        merged = {"counters": {}, "histograms": {}, "gauges": {}}
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith("metrics-") and filename.endswith(".json")):
+                continue
+            try:
+                pid = int(filename[len("metrics-"):-len(".json")])
+                with open(os.path.join(self.directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                merged["counters"][key] = merged["counters"].get(key, 0) + value
+            for name, labels, values in data["histograms"]:
+                total = merged["histograms"].setdefault((name, tuple(map(tuple, labels))), [0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+            # Counters of exited workers still count; their gauges don't
+            if not _alive(pid):
+                continue
+            for name, labels, value in data["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                aggregate = self._metrics.get(name, ("gauge", "", "sum"))[2]
+                if key not in merged["gauges"]:
+                    merged["gauges"][key] = value
+                elif aggregate == "max":
+                    merged["gauges"][key] = max(merged["gauges"][key], value)
+                else:
+                    merged["gauges"][key] += value
+        return merged
+
+    def clear_directory(self):
+        """Remove the files of a previous run (called by the gunicorn master at startup)"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename.startswith("metrics-"):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def render(self):
+        """Format the merged metrics in the Prometheus text exposition format"""
+        collected = self.collect()
+        by_name = {}
+        for kind in ("counters", "histograms", "gauges"):
+            for (name, labels), value in collected[kind].items():
+                by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help_text, buckets) in self._metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name.get(name, [])):
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ["+Inf"], value[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(total, counters, histograms):
+    """Add counters and histograms (dicts or lists of items) into a shard"""
+    for key, value in dict(counters).items():
+        total.counters[key] = total.counters.get(key, 0) + value
+    for key, values in dict(histograms).items():
+        merged = total.histograms.setdefault(key, [0] * len(values))
+        for i, value in enumerate(list(values)):
+            merged[i] += value
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def create_metrics_registry():
+    """Create the registry with the application's metrics"""
+    registry = MetricsRegistry(config.METRICS_DIR, config.METRICS_FLUSH_SECONDS)
+    registry.histogram("chatbot_request_seconds", "Total time to answer a /chat request")
+    registry.histogram("chatbot_context_retrieval_seconds", "Time to retrieve the context for a question")
+    registry.histogram("chatbot_prompt_build_seconds", "Time to fit the prompt into the token budget")
+    registry.histogram("chatbot_llm_seconds", "Upstream completion latency")
+    registry.histogram("chatbot_time_to_first_token_seconds", "Time to the first streamed token")
+    registry.counter("chatbot_cache_hits_total", "Questions answered without a completion, by cache")
+    registry.counter("chatbot_cache_misses_total", "Questions that needed a completion")
+    registry.counter("chatbot_errors_total", "Failed requests, by stage")
+    registry.counter("chatbot_tokens_total", "Prompt (in) and completion (out) tokens")
+    registry.counter("chatbot_rejected_total", "Chat requests turned away by admission control, by reason")
+    registry.counter("chatbot_llm_retries_total", "Upstream calls retried after a transient error")
+    registry.counter("chatbot_llm_timeouts_total", "Upstream attempts that missed their deadline")
+    registry.counter("chatbot_llm_hedges_total", "Hedged requests sent because the first was slow")
+    registry.counter("chatbot_llm_hedge_wins_total", "Hedged requests that answered first")
+    registry.counter("chatbot_llm_circuit_rejected_total", "Upstream calls failed fast by the open circuit")
+    registry.counter("chatbot_fallbacks_total", "Answers given without the upstream after it failed, by kind")
+    return registry
+
+
+metrics = create_metrics_registry()
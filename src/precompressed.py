@@ -0,0 +1,51 @@
+"""
+Pages rendered once and kept pre-compressed for every request
+"""
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class PrecompressedPage:
+    """A rendered page with its gzip and brotli encodings and their ETags
+
+    Each encoding is a different representation of the page, so each gets
+    its own strong ETag derived from the content hash.
+    """
+
+    def __init__(self, body, mimetype='text/html', gzip_level=9, brotli_quality=11):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:20]
+        self.bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=gzip_level, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=brotli_quality)
+
+    def etag(self, encoding):
+        return self.digest if encoding == "identity" else f"{self.digest}-{encoding}"
+
+    def choose_encoding(self, accept_encoding):
+        """Pick the smallest encoding the client accepts"""
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            coding, _, params = part.strip().partition(";")
+            q = params.strip()
+            if q.startswith("q="):
+                try:
+                    if float(q[2:]) == 0:
+                        continue
+                except ValueError:
+                    continue
+            accepted.add(coding.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+    def sizes(self):
+        return {encoding: len(body) for encoding, body in self.bodies.items()}
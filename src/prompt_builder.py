@@ -0,0 +1,244 @@
+"""
+Token-budgeted prompt assembly
+"""
+import threading
+from functools import lru_cache
+from config import chatbot_config as config
+from src.retrieval import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens the chat format adds around every message, and to prime the reply
+MESSAGE_OVERHEAD = 3
+REPLY_OVERHEAD = 3
+
+# Labels around the context in the system and user messages
+CONTEXT_LABEL = "\n\nContext:\n"
+QUESTION_LABELS = ("Relevant information:\n", "\n\nQuestion: ")
+SUMMARY_LABEL = "Summary of the earlier conversation:\n"
+
+
+class TokenCounter:
+    """Count tokens with the model's tokenizer, estimating them if it's unavailable
+
+    Counts are memoized, since the system prompt, context and history lines
+    are counted again on every turn.
+    """
+
+    def __init__(self, model=None, cache_size=10000):
+        self.model = model
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # tiktoken downloads its encodings on first use
+                print(f"Note: Estimating token counts, tokenizer unavailable: {e}")
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @property
+    def exact(self):
+        """Whether counts come from the real tokenizer"""
+        return self._encoding is not None
+
+    def _count(self, text):
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def truncate(self, text, max_tokens):
+        """Cut a text down to at most max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max_tokens])
+        cut = text[:max_tokens * 4]
+        space = cut.rfind(' ')
+        return cut[:space] if space > 0 else cut
+
+    def count_messages(self, messages):
+        """Count the input tokens of a list of chat messages"""
+        return sum(self.count(message["content"]) + MESSAGE_OVERHEAD for message in messages) + REPLY_OVERHEAD
+
+
+class Prompt:
+    """Chat messages for one request and how their tokens were spent"""
+
+    def __init__(self, messages, usage):
+        self.messages = messages
+        self.usage = usage
+
+
+class PromptBuilder:
+    """Fit the system prompt, context, history and user input into the model's window
+
+    Messages are role-separated: a system message holding the system prompt
+    and the static context, a running summary of older turns (if any), the
+    history as user/assistant messages, then a user message with the context
+    retrieved for this question. The system
+    message only changes when the knowledge data does, so it forms a stable
+    prefix that provider-side prompt caching can reuse across requests.
+
+    The budget is the context window minus the tokens reserved for the reply.
+    It is allocated in priority order: the system prompt is always kept, then
+    the user input, then up to context_budget tokens of context (static
+    first), then the conversation summary, and the rest goes to the most
+    recent history messages. Whatever doesn't fit is truncated (user input,
+    context, summary) or dropped (oldest history first).
+    """
+
+    def __init__(self, counter, context_window=4096, max_output_tokens=150,
+                 context_budget=1000, history_messages=6):
+        self.counter = counter
+        self.context_window = context_window
+        self.max_output_tokens = max_output_tokens
+        self.context_budget = context_budget
+        self.history_messages = history_messages
+
+    @property
+    def input_budget(self):
+        """Tokens available for the request messages"""
+        return self.context_window - self.max_output_tokens
+
+    def _fit(self, text, allowance, part, truncated):
+        """Truncate a part to its allowance, noting it if it was cut"""
+        if self.counter.count(text) > allowance:
+            text = self.counter.truncate(text, max(0, allowance))
+            truncated.append(part)
+        return text, self.counter.count(text)
+
+    def build(self, system_prompt, static_context, context, history, user_input, summary=""):
+        """Assemble the messages for a request within the token budget
+
+        static_context goes into the system message and should only depend on
+        the knowledge data; context is the part retrieved for this question.
+        history must not include the current user input.
+        """
+        count = self.counter.count
+        truncated = []
+        labels = count(CONTEXT_LABEL) + sum(count(label) for label in QUESTION_LABELS)
+        remaining = self.input_budget - count(system_prompt) - labels - 2 * MESSAGE_OVERHEAD - REPLY_OVERHEAD
+
+        user_input, user_tokens = self._fit(user_input, remaining, "user", truncated)
+        remaining -= user_tokens
+
+        allowance = max(0, min(self.context_budget, remaining))
+        static_context, static_tokens = self._fit(static_context, allowance, "context", truncated)
+        context, context_tokens = self._fit(context, allowance - static_tokens, "context", truncated)
+        remaining -= static_tokens + context_tokens
+
+        summary_tokens = 0
+        if summary:
+            summary, summary_tokens = self._fit(
+                summary, remaining - count(SUMMARY_LABEL) - MESSAGE_OVERHEAD, "summary", truncated
+            )
+            if summary:
+                summary_tokens += count(SUMMARY_LABEL) + MESSAGE_OVERHEAD
+            remaining -= summary_tokens
+
+        # Newest messages first, stopping at the first one that doesn't fit
+        recent = list(history)[-self.history_messages:] if self.history_messages else []
+        history_messages = []
+        history_tokens = 0
+        for role, content in reversed(recent):
+            tokens = count(content) + MESSAGE_OVERHEAD
+            if tokens > remaining:
+                break
+            history_messages.append({"role": role, "content": content})
+            history_tokens += tokens
+            remaining -= tokens
+        history_messages.reverse()
+        dropped = len(recent) - len(history_messages)
+        if dropped:
+            truncated.append("history")
+
+        system = f"{system_prompt}{CONTEXT_LABEL}{static_context}" if static_context else system_prompt
+        question = f"{QUESTION_LABELS[0]}{context}{QUESTION_LABELS[1]}{user_input}" if context else user_input
+        messages = [{"role": "system", "content": system}]
+        if summary:
+            messages.append({"role": "system", "content": f"{SUMMARY_LABEL}{summary}"})
+        messages += history_messages + [{"role": "user", "content": question}]
+        usage = {
+            "system": count(system_prompt),
+            "context": static_tokens + context_tokens,
+            "summary": summary_tokens,
+            "history": history_tokens,
+            "user": user_tokens,
+            "prefix": count(system) + MESSAGE_OVERHEAD,
+            "total": self.counter.count_messages(messages),
+            "budget": self.input_budget,
+            "history_dropped": dropped,
+            "truncated": sorted(set(truncated)),
+            "exact": self.counter.exact,
+        }
+        return Prompt(messages, usage)
+
+
+class PromptTokenStats:
+    """Aggregate per-request token accounting for /stats"""
+
+    PARTS = ("system", "context", "summary", "history", "user", "prefix", "total")
+
+    def __init__(self):
+        self.requests = 0
+        self.tokens = dict.fromkeys(self.PARTS, 0)
+        self.truncated = {"user": 0, "context": 0, "summary": 0, "history": 0}
+        self.last = None
+        self._lock = threading.Lock()
+
+    def record(self, usage):
+        """Record the token usage of one prompt"""
+        with self._lock:
+            self.requests += 1
+            for part in self.PARTS:
+                self.tokens[part] += usage[part]
+            for part in usage["truncated"]:
+                self.truncated[part] += 1
+            self.last = usage
+
+    def snapshot(self):
+        """Return average tokens per part, truncation counts and the last request's usage"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "avg_tokens": {
+                    part: self.tokens[part] / self.requests if self.requests else 0.0
+                    for part in self.PARTS
+                },
+                "truncated": dict(self.truncated),
+                "last": self.last,
+            }
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model=None):
+    """Get the shared token counter for a model"""
+    model = model or config.OPENAI_MODEL
+    with _counters_lock:
+        if model not in _counters:
+            _counters[model] = TokenCounter(model, cache_size=config.TOKEN_COUNT_CACHE_SIZE)
+        return _counters[model]
+
+
+def create_prompt_builder():
+    """Create a prompt builder with the limits configured in chatbot_config"""
+    return PromptBuilder(
+        get_token_counter(),
+        context_window=config.MODEL_CONTEXT_WINDOW,
+        max_output_tokens=config.MAX_TOKENS,
+        context_budget=config.CONTEXT_TOKEN_BUDGET,
+        history_messages=config.PROMPT_HISTORY_MESSAGES
+    )
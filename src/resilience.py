@@ -0,0 +1,264 @@
+"""
+Deadlines, retries, hedging and circuit breaking for upstream completions
+
+A RetryPolicy wraps every call the completion client makes. Each attempt
+has a deadline, and errors that a second try can fix (timeouts, dropped
+connections, 429s and 5xx) are retried with jittered exponential backoff
+while the total deadline allows. Optionally a second, hedged request is
+sent when the first is slower than usual, and whichever answers first
+wins. A CircuitBreaker counts consecutive upstream failures; once it opens,
+calls fail at once with CircuitOpenError instead of waiting on a degraded
+upstream, until a single probe request gets through again.
+"""
+import asyncio
+import random
+import time
+import aiohttp
+import openai
+from src.llm_backends import current_attempt
+from src.metrics import metrics
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    aiohttp.ClientError,
+    ConnectionError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+
+def is_retryable(error):
+    """Whether an error is the upstream's transient fault, which another attempt may not hit"""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    if isinstance(error, openai.error.APIError):
+        # Errors in a stream carry no status; anything else below 500 is the request's fault
+        return error.http_status is None or error.http_status >= 500
+    return False
+
+
+class CircuitOpenError(Exception):
+    """The upstream is failing, so the call wasn't attempted"""
+
+
+class CircuitBreaker:
+    """Fail fast after consecutive upstream failures
+
+    Closed, calls go through. After failure_threshold consecutive failures
+    it opens and rejects calls for reset_timeout seconds, then lets a single
+    probe through (half open): its success closes the circuit, its failure
+    opens it again. Only used from the completion client's event loop.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self.times_opened = 0
+        self._probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def acquire(self):
+        """Raise CircuitOpenError unless a call may go ahead"""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return
+        self.rejected += 1
+        metrics.inc("chatbot_llm_circuit_rejected_total")
+        raise CircuitOpenError("Upstream unavailable, circuit open")
+
+    def record(self, success):
+        """Record the outcome of a call let through by acquire"""
+        self._probing = False
+        if success:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.state == "half_open":
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+
+    def cancel(self):
+        """Forget a call that was cancelled before it had an outcome"""
+        self._probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryPolicy:
+    """Run upstream calls with deadlines, retries, hedging and a circuit breaker
+
+    attempt_timeout bounds each attempt (for streams, the wait for each
+    token). No retry starts after total_timeout seconds. Retries wait a
+    random time up to backoff_base * 2^retry, capped at backoff_max ("full
+    jitter", so clients that failed together don't retry together). With
+    hedge_after set, a second request is sent if the first hasn't answered
+    within that many seconds.
+    """
+
+    def __init__(self, attempt_timeout=20, total_timeout=45, max_attempts=3, backoff_base=0.25, backoff_max=4,
+                 hedge_after=0, breaker=None):
+        self.attempt_timeout = attempt_timeout
+        self.total_timeout = total_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.breaker = breaker
+
+    def _backoff(self, retry, deadline):
+        """Seconds to wait before a retry, or None if no retry fits before the deadline"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _acquire(self):
+        if self.breaker:
+            self.breaker.acquire()
+
+    def _record(self, success):
+        if self.breaker:
+            self.breaker.record(success)
+
+    async def _attempt(self, make_call, number, timeout):
+        """Make one upstream call under a deadline, recording its outcome"""
+        self._acquire()
+        token = current_attempt.set(number)
+        try:
+            result = await asyncio.wait_for(make_call(), timeout)
+        except asyncio.CancelledError:
+            if self.breaker:
+                self.breaker.cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.inc("chatbot_llm_timeouts_total")
+            self._record(not is_retryable(e))
+            raise
+        finally:
+            current_attempt.reset(token)
+        self._record(True)
+        return result
+
+    async def _hedged(self, make_call, number, timeout):
+        """Make an attempt, sending a second request if the first is slow; the first success wins"""
+        first = asyncio.ensure_future(self._attempt(make_call, number, timeout))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            # No hedging against a failing upstream
+            if done or timeout <= self.hedge_after or (self.breaker and self.breaker.state != "closed"):
+                return await first
+            metrics.inc("chatbot_llm_hedges_total")
+            second = asyncio.ensure_future(self._attempt(make_call, number + self.max_attempts,
+                                                         timeout - self.hedge_after))
+            tasks.append(second)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            metrics.inc("chatbot_llm_hedge_wins_total")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser, or both if the caller gave up
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, make_call):
+        """Await make_call() until it succeeds, retrying transient errors"""
+        deadline = time.monotonic() + self.total_timeout
+        for retry in range(self.max_attempts):
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            try:
+                if self.hedge_after > 0:
+                    return await self._hedged(make_call, retry, timeout)
+                return await self._attempt(make_call, retry, timeout)
+            except Exception as e:
+                delay = self._backoff(retry, deadline) if is_retryable(e) else None
+                if delay is None or retry + 1 == self.max_attempts:
+                    raise
+                metrics.inc("chatbot_llm_retries_total")
+                await asyncio.sleep(delay)
+
+    async def stream(self, open_stream):
+        """Yield the items of open_stream(), retrying transient errors until the first item
+
+        Once an item was yielded the reply can't be restarted without
+        repeating it, so later errors are raised. Each item must arrive
+        within attempt_timeout of the previous one. Streams aren't hedged.
+        """
+        deadline = time.monotonic() + self.total_timeout
+        for retry in range(self.max_attempts):
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            stream = open_stream()
+            try:
+                first = await self._attempt(stream.__anext__, retry, timeout)
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await stream.aclose()
+                delay = self._backoff(retry, deadline) if is_retryable(e) else None
+                if delay is None or retry + 1 == self.max_attempts:
+                    raise
+                metrics.inc("chatbot_llm_retries_total")
+                await asyncio.sleep(delay)
+                continue
+
+            try:
+                yield first
+                while True:
+                    try:
+                        item = await asyncio.wait_for(stream.__anext__(), self.attempt_timeout)
+                    except StopAsyncIteration:
+                        return
+                    except Exception as e:
+                        if isinstance(e, asyncio.TimeoutError):
+                            metrics.inc("chatbot_llm_timeouts_total")
+                        if is_retryable(e):
+                            self._record(False)
+                        raise
+                    yield item
+            finally:
+                await stream.aclose()
+
+
+def create_retry_policy(config):
+    """Create the retry policy and circuit breaker configured in chatbot_config"""
+    breaker = CircuitBreaker(config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_SECONDS)
+    return RetryPolicy(
+        attempt_timeout=config.LLM_ATTEMPT_TIMEOUT,
+        total_timeout=config.LLM_TOTAL_TIMEOUT,
+        max_attempts=config.LLM_MAX_ATTEMPTS,
+        backoff_base=config.LLM_BACKOFF_BASE,
+        backoff_max=config.LLM_BACKOFF_MAX,
+        hedge_after=config.LLM_HEDGE_AFTER_MS / 1000,
+        breaker=breaker
+    )
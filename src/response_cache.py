@@ -0,0 +1,206 @@
+"""
+Cache for LLM completions with TTL and LRU eviction
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import chatbot_config as config
+
+
+def _normalize_text(text):
+    return " ".join(text.split())
+
+
+def make_cache_key(params):
+    """Hash the model, sampling parameters and normalized messages of a request"""
+    normalized = dict(params)
+    normalized["messages"] = [
+        {"role": message["role"], "content": _normalize_text(message["content"])}
+        for message in params.get("messages", [])
+    ]
+    normalized.pop("request_timeout", None)
+    payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process cache for a single worker"""
+
+    def __init__(self, ttl_seconds=3600, max_entries=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk cache that every gunicorn worker on the host can share"""
+
+    # Trimming to max_entries needs a COUNT, so only do it every few writes
+    EVICT_EVERY = 100
+
+    def __init__(self, path, ttl_seconds=3600, max_entries=10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_last_access ON completions (last_access)")
+
+    def _connect(self):
+        """Get this thread's connection, reopening it in forked workers"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl_seconds, now)
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM completions WHERE expires_at < ?", (now,))
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+
+class ResponseCache:
+    """Completion cache with hit/miss counters over a pluggable backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, params):
+        """Return the cached completion text for request params, or None"""
+        try:
+            value = self.backend.get(make_cache_key(params))
+        except Exception as e:
+            print(f"Warning: Response cache lookup failed: {e}")
+            self._count("errors")
+            return None
+        self._count("misses" if value is None else "hits")
+        return value
+
+    def set(self, params, value):
+        """Store the completion text for request params"""
+        try:
+            self.backend.set(make_cache_key(params), value)
+        except Exception as e:
+            print(f"Warning: Response cache store failed: {e}")
+            self._count("errors")
+
+    def stats(self):
+        """Return hit/miss counters and the hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_response_cache():
+    """Create the response cache configured in chatbot_config, or None"""
+    backend = config.RESPONSE_CACHE_BACKEND
+    if not backend or backend == "none":
+        return None
+    if backend == "memory":
+        return ResponseCache(MemoryCacheBackend(
+            ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+            max_entries=config.RESPONSE_CACHE_MAX_ENTRIES
+        ))
+    if backend == "sqlite":
+        return ResponseCache(SQLiteCacheBackend(
+            config.RESPONSE_CACHE_PATH,
+            ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+            max_entries=config.RESPONSE_CACHE_MAX_ENTRIES
+        ))
+    raise ValueError(f"Unknown response cache backend: {backend}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Get the process-wide response cache (None when disabled)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = create_response_cache()
+        return _cache
@@ -0,0 +1,152 @@
+"""
+In-process BM25 retrieval over FAQs and training data
+"""
+import re
+from array import array
+from collections import Counter
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from had has have how i if in is it its me my
+of on or our so that the their them then there these they this to was we were what when where
+which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase a text and split it into indexable terms"""
+    return [term for term in _TOKEN_RE.findall(text.lower()) if term not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about 4 characters per token for English)"""
+    return max(1, len(text) // 4)
+
+
+def chunk_text(text, max_words=120):
+    """Split text into passages of at most max_words, keeping paragraphs together"""
+    chunks = []
+    current = []
+    for paragraph in text.split('\n\n'):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and len(current) + len(words) > max_words:
+            chunks.append(' '.join(current))
+            current = []
+        while len(words) > max_words:
+            chunks.append(' '.join(words[:max_words]))
+            words = words[max_words:]
+        current.extend(words)
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+class RetrievalIndex:
+    """BM25 index with postings held in flat NumPy arrays
+
+    Postings are stored term-major (CSR style): the postings of term t are
+    docs[offsets[t]:offsets[t + 1]], with their precomputed BM25 weights in
+    the matching slice of weights, so a query only touches the postings of
+    its own terms.
+    """
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = list(passages)
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+
+        term_ids = array('i')
+        doc_ids = array('i')
+        freqs = array('f')
+        doc_lengths = np.zeros(len(self.passages), dtype=np.float32)
+        for doc_id, passage in enumerate(self.passages):
+            terms = tokenize(passage)
+            doc_lengths[doc_id] = len(terms)
+            for term, count in Counter(terms).items():
+                term_id = self.vocab.setdefault(term, len(self.vocab))
+                term_ids.append(term_id)
+                doc_ids.append(doc_id)
+                freqs.append(count)
+
+        term_ids = np.frombuffer(term_ids, dtype=np.int32)
+        doc_ids = np.frombuffer(doc_ids, dtype=np.int32)
+        freqs = np.frombuffer(freqs, dtype=np.float32)
+
+        order = np.argsort(term_ids, kind='stable')
+        doc_freq = np.bincount(term_ids, minlength=len(self.vocab))
+        self.offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(doc_freq, out=self.offsets[1:])
+        self.docs = doc_ids[order]
+
+        num_docs = max(1, len(self.passages))
+        avg_length = float(doc_lengths.mean()) if len(self.passages) else 1.0
+        idf = np.log1p((num_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        tf = freqs[order]
+        norm = k1 * (1 - b + b * doc_lengths[self.docs] / max(avg_length, 1.0))
+        self.weights = (idf[term_ids[order]] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        self.token_counts = np.fromiter(
+            (estimate_tokens(passage) for passage in self.passages), dtype=np.int32, count=len(self.passages)
+        )
+
+    @classmethod
+    def from_arrays(cls, passages, vocab, offsets, docs, weights, token_counts, k1=1.5, b=0.75):
+        """Create an index from prebuilt arrays, e.g. those of a compiled snapshot
+
+        passages and vocab may be any sequence and mapping-like objects, so
+        they can be backed by a memory-mapped file instead of Python objects.
+        """
+        index = cls.__new__(cls)
+        index.passages = passages
+        index.k1 = k1
+        index.b = b
+        index.vocab = vocab
+        index.offsets = offsets
+        index.docs = docs
+        index.weights = weights
+        index.token_counts = token_counts
+        return index
+
+    def __len__(self):
+        return len(self.passages)
+
+    def search(self, query, top_k=5):
+        """Return (passage index, score) pairs for the best matches"""
+        term_ids = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+        if not term_ids:
+            return []
+
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.docs[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        if len(docs) * 8 < len(self.passages):
+            # Few postings: score only the candidate documents
+            candidates, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+        else:
+            # Many postings: a dense accumulator is cheaper than sorting them
+            scores = np.bincount(docs, weights=weights, minlength=len(self.passages))
+            candidates = np.arange(len(self.passages))
+
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(candidates[i]), float(scores[i])) for i in best if scores[i] > 0]
+
+    def select(self, query, top_k=5, token_budget=1000):
+        """Return the top passages for a query that fit within a token budget"""
+        selected = []
+        used = 0
+        for doc_id, _ in self.search(query, top_k):
+            cost = int(self.token_counts[doc_id])
+            if used + cost > token_budget:
+                continue
+            selected.append(self.passages[doc_id])
+            used += cost
+        return selected
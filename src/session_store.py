@@ -0,0 +1,178 @@
+"""
+Per-session conversation store for the web chat endpoints
+"""
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Session ids come from cookies/headers, so only accept a conservative charset
+_SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+# Rough fixed cost of a session object (including its history ring buffer) plus one history entry, in bytes
+SESSION_OVERHEAD_BYTES = 1000
+MESSAGE_OVERHEAD_BYTES = 120
+
+# Messages kept verbatim per session (and sent with the prompt); older ones are folded into the summary
+HISTORY_MAX_MESSAGES = 6
+
+
+class ConversationSession:
+    """Compact conversation state for a single visitor
+
+    The history is a ring buffer of the most recent messages. Messages pushed
+    out of it wait in `pending` until the summarizer folds them into
+    `summary`, so memory per session stays bounded however long the
+    conversation runs.
+    """
+    __slots__ = ('session_id', 'conversation_steps', 'conversation_history', 'summary', 'pending',
+                 'last_seen', 'nbytes')
+
+    def __init__(self, session_id, max_messages=HISTORY_MAX_MESSAGES):
+        self.session_id = session_id
+        self.conversation_steps = 0
+        # (role, content) tuples - much smaller than one dict per message
+        self.conversation_history = deque(maxlen=max_messages)
+        self.summary = ""
+        # Created on first overflow, so short conversations don't pay for it
+        self.pending = None
+        self.last_seen = time.monotonic()
+        self.nbytes = SESSION_OVERHEAD_BYTES
+
+    def add_message(self, role, content):
+        """Append a message to the conversation history"""
+        history = self.conversation_history
+        if len(history) == history.maxlen:
+            if self.pending is None:
+                # Bounded too: if summarizing falls behind, the oldest messages are dropped
+                self.pending = deque(maxlen=history.maxlen)
+            self.pending.append(history[0])
+        history.append((role, content))
+
+    def reset(self):
+        """Clear the conversation"""
+        self.conversation_steps = 0
+        self.conversation_history.clear()
+        self.summary = ""
+        self.pending = None
+
+    def estimate_size(self):
+        """Approximate memory held by this session, in bytes"""
+        size = SESSION_OVERHEAD_BYTES + len(self.summary)
+        for _, content in self.conversation_history:
+            size += MESSAGE_OVERHEAD_BYTES + len(content)
+        for _, content in self.pending or ():
+            size += MESSAGE_OVERHEAD_BYTES + len(content)
+        return size
+
+
+class SessionStore:
+    """Thread-safe session store with LRU/TTL eviction and a memory bound"""
+
+    def __init__(self, max_sessions=10000, ttl_seconds=1800, max_bytes=64 * 1024 * 1024,
+                 history_messages=HISTORY_MAX_MESSAGES):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.history_messages = history_messages
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def new_session_id():
+        """Generate a random, URL-safe session id"""
+        return secrets.token_urlsafe(16)
+
+    @staticmethod
+    def is_valid_session_id(session_id):
+        """Check that a client-supplied session id is well formed"""
+        return bool(session_id) and _SESSION_ID_RE.match(session_id) is not None
+
+    def get(self, session_id):
+        """Return the live session for an id, or None"""
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if now - session.last_seen > self.ttl_seconds:
+                self._remove(session_id)
+                self.expirations += 1
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def get_or_create(self, session_id=None):
+        """Return the session for an id, creating a new one if needed"""
+        session = self.get(session_id)
+        if session is not None:
+            return session
+
+        if not self.is_valid_session_id(session_id):
+            session_id = self.new_session_id()
+        session = ConversationSession(session_id, self.history_messages)
+        with self._lock:
+            self._sessions[session_id] = session
+            self._bytes += session.nbytes
+            self._enforce_limits()
+        return session
+
+    def save(self, session):
+        """Record the new size of a session after it was modified"""
+        size = session.estimate_size()
+        with self._lock:
+            if self._sessions.get(session.session_id) is not session:
+                return
+            self._bytes += size - session.nbytes
+            session.nbytes = size
+            session.last_seen = time.monotonic()
+            self._sessions.move_to_end(session.session_id)
+            self._enforce_limits()
+
+    def delete(self, session_id):
+        """Drop a session"""
+        with self._lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.nbytes
+
+    def _enforce_limits(self):
+        """Evict expired and least recently used sessions (caller holds the lock)"""
+        now = time.monotonic()
+        # The dict is ordered by last access, so expired sessions sit at the front
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_seen <= self.ttl_seconds:
+                break
+            self._remove(oldest_id)
+            self.expirations += 1
+
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            oldest_id = next(iter(self._sessions))
+            self._remove(oldest_id)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """Return store size and eviction counters"""
+        with self._lock:
+            return {
+                "active_sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,271 @@
+"""
+Shared state for sessions and knowledge data across gunicorn workers
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from config import chatbot_config as config
+from src.session_store import HISTORY_MAX_MESSAGES, ConversationSession, SessionStore
+
+
+class StateBackend:
+    """Key/value interface for state shared between worker processes
+
+    Values are strings grouped into namespaces. Implementations must be safe
+    to use from several threads and several processes at once.
+    """
+
+    def get(self, namespace, key):
+        """Return the value stored for a key, or None"""
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl_seconds=None):
+        """Store a value, optionally expiring after ttl_seconds"""
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        """Remove a key"""
+        raise NotImplementedError
+
+    def count(self, namespace):
+        """Return the number of live keys in a namespace"""
+        raise NotImplementedError
+
+    def trim(self, namespace, max_entries=None, max_bytes=None):
+        """Drop expired keys, then the least recently written ones over the limits"""
+        raise NotImplementedError
+
+
+class SQLiteStateBackend(StateBackend):
+    """State backend in a local SQLite file, shared by every worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS state_updated ON state (namespace, updated_at)")
+
+    def _connect(self):
+        """Get this thread's connection, reopening it in forked workers"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, key):
+        row = self._connect().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? "
+            "AND (expires_at IS NULL OR expires_at >= ?)",
+            (namespace, key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, namespace, key, value, ttl_seconds=None):
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        self._connect().execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, value, expires_at, now)
+        )
+
+    def delete(self, namespace, key):
+        self._connect().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def count(self, namespace):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (namespace, time.time())
+        ).fetchone()[0]
+
+    def trim(self, namespace, max_entries=None, max_bytes=None):
+        conn = self._connect()
+        conn.execute(
+            "DELETE FROM state WHERE namespace = ? AND expires_at < ?", (namespace, time.time())
+        )
+        if max_entries is not None:
+            conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key IN ("
+                "SELECT key FROM state WHERE namespace = ? ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (namespace, namespace, max_entries)
+            )
+        if max_bytes is not None:
+            # Keep the most recently written keys whose running size fits
+            conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key IN ("
+                "SELECT key FROM (SELECT key, SUM(LENGTH(value)) OVER (ORDER BY updated_at DESC) AS total "
+                "FROM state WHERE namespace = ?) WHERE total > ?)",
+                (namespace, namespace, max_bytes)
+            )
+
+
+class SharedSessionStore:
+    """Session store kept in a StateBackend so any worker can serve any visitor"""
+
+    NAMESPACE = "session"
+    # Trimming scans the namespace, so only do it every few saves
+    TRIM_EVERY = 200
+
+    def __init__(self, backend, max_sessions=10000, ttl_seconds=1800, max_bytes=64 * 1024 * 1024,
+                 history_messages=HISTORY_MAX_MESSAGES):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.history_messages = history_messages
+        self._saves = 0
+
+    def get(self, session_id):
+        """Return the live session for an id, or None"""
+        if not SessionStore.is_valid_session_id(session_id):
+            return None
+        raw = self.backend.get(self.NAMESPACE, session_id)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        session = ConversationSession(session_id, self.history_messages)
+        session.conversation_steps = data["steps"]
+        session.summary = data.get("summary", "")
+        if data.get("pending"):
+            session.pending = deque((tuple(message) for message in data["pending"]), maxlen=self.history_messages)
+        # Sessions saved with a longer history (an older setting) overflow into pending, not away
+        for message in data["history"]:
+            session.add_message(*message)
+        session.nbytes = len(raw)
+        return session
+
+    def get_or_create(self, session_id=None):
+        """Return the session for an id, creating a new one if needed"""
+        session = self.get(session_id)
+        if session is not None:
+            return session
+        if not SessionStore.is_valid_session_id(session_id):
+            session_id = SessionStore.new_session_id()
+        return ConversationSession(session_id, self.history_messages)
+
+    def save(self, session):
+        """Write a session back so the next request can land on any worker"""
+        raw = json.dumps({
+            "steps": session.conversation_steps,
+            "history": list(session.conversation_history),
+            "summary": session.summary,
+            "pending": list(session.pending or ()),
+        })
+        session.nbytes = len(raw)
+        self.backend.set(self.NAMESPACE, session.session_id, raw, ttl_seconds=self.ttl_seconds)
+        self._saves += 1
+        if self._saves % self.TRIM_EVERY == 0:
+            self.backend.trim(self.NAMESPACE, max_entries=self.max_sessions, max_bytes=self.max_bytes)
+
+    def delete(self, session_id):
+        """Drop a session"""
+        self.backend.delete(self.NAMESPACE, session_id)
+
+    def __len__(self):
+        return self.backend.count(self.NAMESPACE)
+
+    def stats(self):
+        """Return store size and limits"""
+        return {
+            "backend": type(self.backend).__name__,
+            "active_sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class KnowledgeSync:
+    """Keep every worker's FAQs and training data on the same published version
+
+    A worker that (re)loads the data files publishes what it loaded; the
+    others notice the new version from their data watcher thread and adopt
+    the published data instead of re-reading files that may have changed again.
+    Data mapped from a compiled snapshot is published as the snapshot's path
+    and source signature, so the others map the same file rather than
+    copying the corpus through the store.
+    """
+
+    NAMESPACE = "knowledge"
+
+    def __init__(self, backend, check_interval=1.0):
+        self.backend = backend
+        self.check_interval = check_interval
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def publish(self, data_loader):
+        """Publish a data loader's current data as the shared version"""
+        snapshot = data_loader.snapshot
+        if snapshot.source is not None:
+            payload = json.dumps({"snapshot": snapshot.source})
+        else:
+            payload = json.dumps({"faqs": dict(snapshot.faqs), "training_data": snapshot.training_data})
+        version = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        self.backend.set(self.NAMESPACE, "data", payload)
+        self.backend.set(self.NAMESPACE, "version", version)
+        data_loader.shared_version = version
+        return version
+
+    def refresh(self, data_loader, force=False):
+        """Adopt the shared data if another worker published a newer version"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        with self._lock:
+            self._last_check = now
+            version = self.backend.get(self.NAMESPACE, "version")
+            if version is None or version == data_loader.shared_version:
+                return False
+            payload = self.backend.get(self.NAMESPACE, "data")
+            if payload is None:
+                return False
+            data = json.loads(payload)
+            if "snapshot" in data:
+                if not data_loader.load_compiled(data["snapshot"]["path"], warm=True):
+                    print(f"Note: Published snapshot {data['snapshot']['path']} doesn't match this worker's data")
+            else:
+                data_loader.replace_data(data["faqs"], data["training_data"])
+            data_loader.shared_version = version
+            return True
+
+
+def create_state_backend():
+    """Create the shared state backend configured in chatbot_config, or None"""
+    backend = config.STATE_BACKEND
+    if not backend or backend == "memory":
+        return None
+    if backend == "sqlite":
+        return SQLiteStateBackend(config.STATE_PATH)
+    raise ValueError(f"Unknown state backend: {backend}")
+
+
+def create_session_store(backend=None):
+    """Create a session store: shared when a backend is given, else per worker"""
+    if backend is None:
+        return SessionStore(
+            max_sessions=config.SESSION_MAX_COUNT,
+            ttl_seconds=config.SESSION_TTL_SECONDS,
+            max_bytes=config.SESSION_MAX_BYTES,
+            history_messages=config.HISTORY_MAX_MESSAGES
+        )
+    return SharedSessionStore(
+        backend,
+        max_sessions=config.SESSION_MAX_COUNT,
+        ttl_seconds=config.SESSION_TTL_SECONDS,
+        max_bytes=config.SESSION_MAX_BYTES,
+        history_messages=config.HISTORY_MAX_MESSAGES
+    )
@@ -0,0 +1,349 @@
+"""
+Compiled binary knowledge snapshots for fast worker startup
+
+A snapshot holds the parsed FAQs, the training data and its passages, a
+prebuilt retrieval index with per-passage token counts, and the FAQ
+matcher's lookup tables. Workers memory-map
+it read-only, so loading it costs no parsing or index building and its pages
+are shared by every worker through the page cache.
+
+Layout: an 8-byte magic, the header length (uint64 LE), a JSON header, then
+8-byte aligned sections whose offsets, sizes and dtypes the header lists.
+
+Usage:
+    python -m src.snapshot compile [--data-dir data] [--output data/knowledge.snapshot]
+    python -m src.snapshot info [path]
+"""
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from collections.abc import Mapping, Sequence
+import numpy as np
+from config import chatbot_config as config
+from src.faq_matcher import FAQMatcher, build_faq_tables
+from src.retrieval import RetrievalIndex, chunk_text
+
+MAGIC = b"CBKSNAP1"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+# String tables: each is a uint8 blob plus int64 offsets into it
+STRING_TABLES = ("questions", "answers", "chunks", "training", "vocab")
+# FAQ matcher tables (faq_matcher.build_faq_tables), stored as "faq.<name>"
+FAQ_TABLES = ("gram_offsets", "grams", "posting_offsets", "postings", "exact_hashes", "exact_ids")
+FAQ_NGRAM = 3
+
+
+class SnapshotError(Exception):
+    """A snapshot file is missing, corrupt or of an unknown format"""
+
+
+def source_signature(data_dir, training_filename="training_data.txt"):
+    """Describe the data files a snapshot is compiled from (name, size, mtime)"""
+    signature = []
+    for filename in list(config.FAQ_FILES) + [training_filename]:
+        try:
+            stat = os.stat(os.path.join(data_dir, filename))
+        except FileNotFoundError:
+            continue
+        signature.append([filename, stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+def default_snapshot_path(data_dir):
+    return os.path.join(data_dir, config.KNOWLEDGE_SNAPSHOT_FILE)
+
+
+class MappedStrings(Sequence):
+    """Read-only sequence of strings decoded on access from a string table"""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+
+class MappedVocab:
+    """Term to term-id lookup over the sorted vocabulary of a snapshot"""
+
+    def __init__(self, terms):
+        self._terms = terms
+
+    def __len__(self):
+        return len(self._terms)
+
+    def get(self, term, default=None):
+        i = bisect.bisect_left(self._terms, term)
+        if i < len(self._terms) and self._terms[i] == term:
+            return i
+        return default
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __getitem__(self, term):
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+
+
+class MappedPassages(Sequence):
+    """Retrieval passages: the FAQ pairs followed by the training data chunks"""
+
+    def __init__(self, questions, answers, chunks):
+        self._questions = questions
+        self._answers = answers
+        self._chunks = chunks
+
+    def __len__(self):
+        return len(self._questions) + len(self._chunks)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        faq_count = len(self._questions)
+        if i < faq_count:
+            return f"Q: {self._questions[i]}\nA: {self._answers[i]}"
+        return self._chunks[i - faq_count]
+
+
+class MappedFAQs(Mapping):
+    """Immutable FAQ mapping backed by a snapshot, in the original order
+
+    Iteration reads straight from the file; the question to position table
+    needed for lookups by key is only built on first use.
+    """
+
+    def __init__(self, questions, answers):
+        self._questions = questions
+        self._answers = answers
+        self._positions = None
+
+    def __len__(self):
+        return len(self._questions)
+
+    def __iter__(self):
+        return iter(self._questions)
+
+    def items(self):
+        return zip(self._questions, self._answers)
+
+    def values(self):
+        return iter(self._answers)
+
+    def __getitem__(self, question):
+        if self._positions is None:
+            self._positions = {q: i for i, q in enumerate(self._questions)}
+        return self._answers[self._positions[question]]
+
+
+class CompiledKnowledge:
+    """The contents of a loaded snapshot"""
+
+    def __init__(self, path, header, faqs, training_data, index, faq_matcher=None):
+        self.path = path
+        self.header = header
+        self.faqs = faqs
+        self.training_data = training_data
+        self.index = index
+        self.faq_matcher = faq_matcher
+
+    def matches_config(self):
+        """Whether the prebuilt index was built with the current retrieval settings"""
+        return self.header["chunk_words"] == config.RETRIEVAL_CHUNK_WORDS
+
+
+def _align(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def _data_start(header_length):
+    return _align(len(MAGIC) + 8 + header_length)
+
+
+def _pack_strings(strings):
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _sorted_index_arrays(index):
+    """Renumber an index's terms in sorted order so lookups can use bisect"""
+    terms = sorted(index.vocab)
+    old_ids = np.array([index.vocab[term] for term in terms], dtype=np.int64)
+    starts = index.offsets[old_ids]
+    lengths = index.offsets[old_ids + 1] - starts
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    # Position of each new posting in the old term-major arrays
+    gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype=np.int64)
+    return terms, offsets, index.docs[gather], index.weights[gather]
+
+
+def compile_snapshot(faqs, training_data, output_path, sources=None, k1=1.5, b=0.75):
+    """Parse and index knowledge data and write it to a snapshot file"""
+    questions = list(faqs)
+    answers = [faqs[q] for q in questions]
+    chunks = chunk_text(training_data, config.RETRIEVAL_CHUNK_WORDS) if training_data else []
+    passages = [f"Q: {q}\nA: {a}" for q, a in zip(questions, answers)] + chunks
+    index = RetrievalIndex(passages, k1=k1, b=b)
+    terms, offsets, docs, weights = _sorted_index_arrays(index)
+
+    sections = {}
+    for name, strings in (("questions", questions), ("answers", answers), ("chunks", chunks),
+                          ("training", [training_data or ""]), ("vocab", terms)):
+        blob, string_offsets = _pack_strings(strings)
+        sections[f"{name}.data"] = blob
+        sections[f"{name}.offsets"] = string_offsets
+    sections["index.offsets"] = offsets.astype(np.int64)
+    sections["index.docs"] = docs.astype(np.int32)
+    sections["index.weights"] = weights.astype(np.float32)
+    sections["index.token_counts"] = index.token_counts.astype(np.int32)
+    for name, array in build_faq_tables(questions, FAQ_NGRAM).items():
+        sections[f"faq.{name}"] = array
+
+    header = {
+        "format": FORMAT_VERSION,
+        "created_at": time.time(),
+        "sources": sources or [],
+        "faq_count": len(questions),
+        "passage_count": len(passages),
+        "vocab_size": len(terms),
+        "chunk_words": config.RETRIEVAL_CHUNK_WORDS,
+        "k1": k1,
+        "b": b,
+        "faq_ngram": FAQ_NGRAM,
+        "sections": {},
+    }
+    # Section offsets are relative to the aligned end of the header
+    position = 0
+    for name, array in sections.items():
+        header["sections"][name] = {"offset": position, "size": array.nbytes, "dtype": array.dtype.str}
+        position += _align(array.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _data_start(len(header_bytes))
+
+    # Write to a temporary file and rename, so running workers never see a partial snapshot
+    tmp_path = f"{output_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, array in sections.items():
+            f.write(array.tobytes())
+            f.write(b"\0" * (-array.nbytes % ALIGNMENT))
+    os.replace(tmp_path, output_path)
+    return header
+
+
+def read_header(buffer):
+    """Parse and validate the header of a snapshot held in a buffer"""
+    if len(buffer) < len(MAGIC) + 8 or bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise SnapshotError("not a knowledge snapshot")
+    header_length, = struct.unpack_from('<Q', buffer, len(MAGIC))
+    start = len(MAGIC) + 8
+    try:
+        header = json.loads(bytes(buffer[start:start + header_length]))
+    except ValueError as e:
+        raise SnapshotError(f"corrupt snapshot header: {e}")
+    if header.get("format") != FORMAT_VERSION:
+        raise SnapshotError(f"unsupported snapshot format: {header.get('format')}")
+    header["data_start"] = _data_start(header_length)
+    return header
+
+
+def load_snapshot(path):
+    """Memory-map a snapshot file and wrap its contents without copying them"""
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = read_header(mm)
+
+    def section(name):
+        info = header["sections"][name]
+        dtype = np.dtype(info["dtype"])
+        offset = header["data_start"] + info["offset"]
+        if offset + info["size"] > len(mm):
+            raise SnapshotError(f"truncated snapshot section: {name}")
+        return np.frombuffer(mm, dtype=dtype, count=info["size"] // dtype.itemsize, offset=offset)
+
+    # The arrays keep the mapping alive for as long as anything uses them
+    tables = {
+        name: MappedStrings(memoryview(section(f"{name}.data")), section(f"{name}.offsets"))
+        for name in STRING_TABLES
+    }
+    faqs = MappedFAQs(tables["questions"], tables["answers"])
+    index = RetrievalIndex.from_arrays(
+        MappedPassages(tables["questions"], tables["answers"], tables["chunks"]),
+        MappedVocab(tables["vocab"]),
+        section("index.offsets"),
+        section("index.docs"),
+        section("index.weights"),
+        section("index.token_counts"),
+        k1=header["k1"],
+        b=header["b"]
+    )
+    faq_matcher = None
+    # Snapshots compiled before the matcher tables were added build the matcher on first use
+    if all(f"faq.{name}" in header["sections"] for name in FAQ_TABLES):
+        faq_matcher = FAQMatcher.from_arrays(
+            tables["questions"],
+            tables["answers"],
+            {name: section(f"faq.{name}") for name in FAQ_TABLES},
+            threshold=config.FAQ_MATCH_THRESHOLD,
+            ngram=header["faq_ngram"]
+        )
+    return CompiledKnowledge(path, header, faqs, tables["training"][0], index, faq_matcher)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile or inspect knowledge snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="compile the data files into a snapshot")
+    compile_parser.add_argument("--data-dir", default=config.DATA_DIR)
+    compile_parser.add_argument("--output", help="snapshot path (default: <data-dir>/%s)" % config.KNOWLEDGE_SNAPSHOT_FILE)
+    info_parser = commands.add_parser("info", help="print the header of a snapshot")
+    info_parser.add_argument("path", nargs="?")
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        # Imported here because the data loader itself loads snapshots
+        from src.data_loader import DataLoader
+        sources = source_signature(args.data_dir)
+        loader = DataLoader(args.data_dir, use_snapshot=False)
+        output = args.output or default_snapshot_path(args.data_dir)
+        start = time.perf_counter()
+        header = compile_snapshot(loader.faqs, loader.training_data, output, sources=sources)
+        print(f"Compiled {header['faq_count']} FAQs and {header['passage_count']} passages "
+              f"into {output} ({os.path.getsize(output)} bytes) in {time.perf_counter() - start:.2f}s")
+    else:
+        path = args.path or default_snapshot_path(config.DATA_DIR)
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                header = read_header(mm)
+        print(json.dumps(header, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Background summarization of conversation history
+"""
+import threading
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Keep the facts, names, preferences and open questions needed to continue it; drop small talk."
+)
+
+
+class ConversationSummarizer:
+    """Fold messages that left a session's history ring buffer into its running summary
+
+    Summaries are produced by the LLM on the completion client's background
+    loop, so requests never wait for them. The session is re-read from the
+    store when the summary arrives, and written back with the summarized
+    messages removed from its pending queue.
+    """
+
+    def __init__(self, completion_client, max_tokens=200, min_pending=2, model=None):
+        self.completion_client = completion_client
+        self.max_tokens = max_tokens
+        self.min_pending = min_pending
+        self.model = model or completion_client.model
+        self.summaries = 0
+        self.errors = 0
+        # Sessions with a summary in progress in this worker
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def _params(self, summary, messages):
+        transcript = "\n".join(f"{'User' if role == 'user' else 'Assistant'}: {content}" for role, content in messages)
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": (
+                    f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}\n\n"
+                    f"Write the updated summary in at most {self.max_tokens * 3 // 4} words."
+                )}
+            ],
+            max_tokens=self.max_tokens,
+            temperature=0
+        )
+
+    def schedule(self, session, store=None):
+        """Start summarizing a session's pending messages if there are enough of them
+
+        Returns the future of the summary request, or None if nothing was started.
+        """
+        with self._lock:
+            if session.session_id in self._in_flight or len(session.pending or ()) < self.min_pending:
+                return None
+            self._in_flight.add(session.session_id)
+        batch = list(session.pending)
+        try:
+            future = self.completion_client.submit(**self._params(session.summary, batch))
+        except Exception as e:
+            print(f"Warning: Could not start conversation summary: {e}")
+            with self._lock:
+                self._in_flight.discard(session.session_id)
+            return None
+        future.add_done_callback(lambda done: self._apply(done, session, store, batch))
+        return future
+
+    def _apply(self, future, session, store, batch):
+        try:
+            summary = future.result().choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Warning: Conversation summary failed: {e}")
+            with self._lock:
+                self.errors += 1
+                self._in_flight.discard(session.session_id)
+            return
+
+        # A shared store hands out a fresh copy per request, so update the stored one
+        current = store.get(session.session_id) if store is not None else session
+        with self._lock:
+            self._in_flight.discard(session.session_id)
+        if current is None:
+            return
+        pending = current.pending
+        # Drop exactly the messages that were summarized (newer ones may have arrived)
+        for message in batch:
+            if pending and pending[0] == message:
+                pending.popleft()
+        current.summary = summary
+        if store is not None:
+            store.save(current)
+        with self._lock:
+            self.summaries += 1
+
+    def stats(self):
+        """Return counters of completed and failed summaries"""
+        return {"summaries": self.summaries, "errors": self.errors}
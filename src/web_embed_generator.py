@@ -1,9 +1,12 @@
 """
 Web integration and JavaScript widget generator
 """
-from flask import Flask, request, jsonify, send_from_directory, render_template
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template
+import json
 import os
 import sys
+import threading
+import time
 from pathlib import Path
 
 # Add src directory to Python path
@@ -13,6 +16,12 @@ if str(current_dir) not in sys.path:
 
 from chatbot_logic import Chatbot
 from config import chatbot_config as config
+from src.admission import AdmissionDenied, client_key, create_admission_controller
+from src.data_watcher import DataWatcher
+from src.metrics import metrics
+from src.precompressed import PrecompressedPage
+from src.widget_build import BUNDLE_PATTERN, ensure_built as ensure_widget_built
+from src.shared_state import KnowledgeSync, create_session_store, create_state_backend
 
 # Set up template and static paths
 template_dir = os.path.join(current_dir, 'templates')
@@ -33,730 +42,178 @@ if os.environ.get('FLASK_ENV') == 'development':
 
 print("Starting Flask application...")
 
-# Global chatbot instance - lazy initialization
+# Global chatbot instance - lazy initialization. It only holds the shared
+# knowledge data; conversation state lives in the per-visitor session store.
+# With a shared state backend, sessions and knowledge data are kept
+# consistent across all gunicorn workers, so no sticky sessions are needed.
 chatbot = None
+data_watcher = None
+state_backend = create_state_backend()
+session_store = create_session_store(state_backend)
+# A shared store reports the same sessions from every worker
+metrics.gauge("chatbot_active_sessions", "Conversation sessions held in the session store",
+              lambda: session_store.stats()["active_sessions"], aggregate="max" if state_backend else "sum")
+knowledge_sync = KnowledgeSync(state_backend, config.KNOWLEDGE_SYNC_INTERVAL) if state_backend else None
+# Rate limits per client and load shedding for /chat
+admission = create_admission_controller()
+if admission:
+    metrics.gauge("chatbot_active_requests", "Chat requests holding an admission slot",
+                  lambda: admission.limiter.active)
+    metrics.gauge("chatbot_queued_requests", "Chat requests waiting for an admission slot",
+                  lambda: admission.limiter.queued)
+
+# Warm-up state. warm_up() builds what can be shared by fork (gunicorn's
+# preload_app runs it in the master); start_worker() starts what can't
+# survive a fork (threads, the connection pool) in each worker process.
+_warm_lock = threading.Lock()
+_start_lock = threading.Lock()
+_warmed_up = False
+_worker_pid = None  # Set once this process has fully started
+_background_start_pid = None
+_landing_page = None
+_page_lock = threading.Lock()
+
+def _create_chatbot():
+    try:
+        return Chatbot(lazy_load=True, knowledge_sync=knowledge_sync)
+    except Exception as e:
+        print(f"Warning: Chatbot initialization with error: {e}")
+        return Chatbot(lazy_load=True, use_defaults=True, knowledge_sync=knowledge_sync)
 
 def get_chatbot():
-    """Get or create chatbot instance"""
-    global chatbot
-    if not chatbot:
+    """Get the chatbot instance, starting this worker first if no server hook did"""
+    if _worker_pid != os.getpid():
+        # Served without a warm-up hook (e.g. flask run): start the worker on first use
+        start_worker()
+    return chatbot
+
+def warm_up():
+    """Load and index the knowledge data, compile the templates and render the landing page
+
+    Safe to run before forking: it starts no threads, so with gunicorn's
+    preload_app every worker inherits the warmed state copy-on-write.
+    """
+    global chatbot, _warmed_up
+    with _warm_lock:
+        if _warmed_up:
+            return
+        start = time.perf_counter()
+        if not chatbot:
+            chatbot = _create_chatbot()
+        chatbot.ensure_data_loaded()
+        if chatbot.data_loader:
+            chatbot.data_loader.snapshot.warm()
+        for name in app.jinja_env.list_templates():
+            try:
+                app.jinja_env.get_template(name)
+            except Exception as e:
+                print(f"Warning: Could not compile template {name}: {e}")
         try:
-            chatbot = Chatbot(lazy_load=True)
+            get_landing_page()
         except Exception as e:
-            print(f"Warning: Chatbot initialization with error: {e}")
-            chatbot = Chatbot(lazy_load=True, use_defaults=True)
-    return chatbot
+            print(f"Warning: Could not render the landing page: {e}")
+        try:
+            ensure_widget_built()
+        except Exception as e:
+            print(f"Warning: Could not build the chat widget: {e}")
+        _warmed_up = True
+        print(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+def start_worker():
+    """Warm up (if not done before the fork) and start this worker's background work
+
+    Starts the data watcher and opens the OpenAI connection pool, then marks
+    the worker ready so /health reports healthy.
+    """
+    global data_watcher, _worker_pid
+    warm_up()
+    # Concurrent callers wait here until the worker has fully started
+    with _start_lock:
+        if _worker_pid == os.getpid():
+            return
+        if config.DATA_WATCH_ENABLED:
+            data_watcher = DataWatcher(chatbot, config.DATA_DIR, config.DATA_WATCH_INTERVAL).start()
+        metrics.start_flusher()
+        try:
+            chatbot.completion_client.warm(config.OPENAI_WARM_CONNECTIONS)
+        except Exception as e:
+            print(f"Warning: Could not warm the OpenAI connection pool: {e}")
+        _worker_pid = os.getpid()
+
+def start_worker_in_background():
+    """Start this worker from a background thread, once per process"""
+    global _background_start_pid
+    with _warm_lock:
+        if _background_start_pid == os.getpid():
+            return
+        _background_start_pid = os.getpid()
+    threading.Thread(target=start_worker, name="warm-up", daemon=True).start()
+
+def is_ready():
+    """Whether this worker process has finished warming up"""
+    return _worker_pid == os.getpid()
+
+def get_landing_page():
+    """Render and compress the landing page once per process (normally during warm-up)"""
+    global _landing_page
+    if _landing_page is None:
+        with _page_lock:
+            if _landing_page is None:
+                with app.test_request_context('/'):
+                    html = render_template('index.html')
+                _landing_page = PrecompressedPage(html)
+    return _landing_page
+
+def get_session():
+    """Get or create the conversation session for the current visitor"""
+    session_id = (request.headers.get(config.SESSION_HEADER_NAME)
+                  or request.cookies.get(config.SESSION_COOKIE_NAME))
+    return session_store.get_or_create(session_id)
+
+def request_client_key():
+    """The rate limit bucket of the current request"""
+    return client_key(request.headers.get(config.RATE_LIMIT_API_KEY_HEADER), request.remote_addr,
+                      request.headers.get('X-Forwarded-For'))
+
+def denied_response(denied):
+    """A fast 429 or 503 for a request turned away by admission control"""
+    response = jsonify({"error": str(denied), "retry_after": denied.retry_after})
+    response.status_code = denied.status
+    response.headers['Retry-After'] = str(denied.retry_after)
+    return response
+
+def attach_session(response, session):
+    """Set the session cookie on a response"""
+    response.set_cookie(
+        config.SESSION_COOKIE_NAME,
+        session.session_id,
+        max_age=config.SESSION_TTL_SECONDS,
+        httponly=True,
+        samesite='Lax'
+    )
+    return response
 
 @app.route('/', methods=['GET'])
 def index():
-    """Serve the landing page"""
-    try:
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>AI Assistant - Next Generation Conversational AI</title>
-            <script src="https://cdn.tailwindcss.com"></script>
-            <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-            <script>
-                tailwind.config = {
-                    theme: {
-                        extend: {
-                            colors: {
-                                primary: {
-                                    50: '#f0f9ff',
-                                    100: '#e0f2fe',
-                                    500: '#0ea5e9',
-                                    600: '#0284c7',
-                                    700: '#0369a1',
-                                }
-                            }
-                        }
-                    }
-                }
-            </script>
-            <style>
-                .gradient-text {
-                    background: linear-gradient(45deg, #0ea5e9, #6366f1);
-                    -webkit-background-clip: text;
-                    -webkit-text-fill-color: transparent;
-                }
-                .gradient-bg {
-                    background: linear-gradient(135deg, #0ea5e9, #6366f1);
-                }
-            </style>
-        </head>
-        <body class="bg-gray-50">
-            <!-- Sticky Navigation -->
-            <nav class="fixed w-full z-50 bg-white/80 backdrop-blur-md shadow-sm">
-                <div class="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8">
-                    <div class="flex justify-between h-16">
-                        <div class="flex items-center">
-                            <span class="text-2xl font-bold gradient-text">AI Assistant</span>
-                        </div>
-                        <div class="hidden md:flex items-center space-x-8">
-                            <a href="#features" class="text-gray-600 hover:text-gray-900">Features</a>
-                            <a href="#how-it-works" class="text-gray-600 hover:text-gray-900">How It Works</a>
-                            <a href="#pricing" class="text-gray-600 hover:text-gray-900">Pricing</a>
-                            <a href="#testimonials" class="text-gray-600 hover:text-gray-900">Testimonials</a>
-                            <button onclick="toggleChat()" class="gradient-bg text-white px-4 py-2 rounded-lg hover:opacity-90 transition-all">
-                                Start Chat
-                            </button>
-                        </div>
-                        <button class="md:hidden gradient-bg text-white px-4 rounded-lg">
-                            <i class="fas fa-bars"></i>
-                        </button>
-                    </div>
-                </div>
-            </nav>
-
-            <!-- Hero Section -->
-            <div class="pt-24 pb-16 md:pt-32 md:pb-24">
-                <div class="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8">
-                    <div class="lg:grid lg:grid-cols-12 lg:gap-8">
-                        <div class="sm:text-center md:max-w-2xl md:mx-auto lg:col-span-6 lg:text-left lg:flex lg:flex-col lg:justify-center">
-                            <div class="mb-8">
-                                <span class="inline-block gradient-bg text-white text-sm font-semibold px-4 py-1 rounded-full">
-                                    AI-Powered Communication
-                                </span>
-                            </div>
-                            <h1 class="text-4xl tracking-tight font-extrabold text-gray-900 sm:text-5xl md:text-6xl lg:text-5xl xl:text-6xl">
-                                Next Generation
-                                <span class="gradient-text block">Conversational AI</span>
-                            </h1>
-                            <p class="mt-6 text-base text-gray-500 sm:mt-8 sm:text-xl lg:text-lg xl:text-xl">
-                                Transform your business communication with our advanced AI assistant. Get instant responses, 24/7 support, and human-like conversations powered by cutting-edge machine learning.
-                            </p>
-                            <div class="mt-8 sm:mt-12 flex flex-col sm:flex-row gap-4 sm:items-center lg:justify-start">
-                                <button onclick="toggleChat()" class="gradient-bg text-white px-8 py-4 rounded-xl hover:opacity-90 transition-all text-lg font-medium flex items-center justify-center">
-                                    Try AI Chat Now
-                                    <i class="fas fa-arrow-right ml-2"></i>
-                                </button>
-                                <a href="#how-it-works" class="text-gray-600 hover:text-gray-900 flex items-center justify-center">
-                                    <i class="fas fa-play-circle text-primary-500 mr-2"></i>
-                                    See how it works
-                                </a>
-                            </div>
-                        </div>
-                        <div class="mt-12 relative sm:max-w-lg sm:mx-auto lg:mt-0 lg:max-w-none lg:mx-0 lg:col-span-6 lg:flex lg:items-center">
-                            <div class="relative mx-auto w-full rounded-2xl shadow-xl lg:max-w-md overflow-hidden">
-                                <img class="w-full" src="https://images.unsplash.com/photo-1583508915901-b5f84c1dcde1?ixlib=rb-1.2.1&auto=format&fit=crop&w=1950&q=80" alt="AI Chat Interface">
-                                <!-- Floating Features -->
-                                <div class="absolute -right-4 top-1/4 bg-white rounded-lg shadow-lg p-4 flex items-center space-x-3">
-                                    <div class="w-8 h-8 gradient-bg rounded-full flex items-center justify-center">
-                                        <i class="fas fa-robot text-white"></i>
-                                    </div>
-                                    <div>
-                                        <div class="text-sm font-semibold">AI Powered</div>
-                                        <div class="text-xs text-gray-500">24/7 Available</div>
-                                    </div>
-                                </div>
-                                <div class="absolute -left-4 top-2/3 bg-white rounded-lg shadow-lg p-4 flex items-center space-x-3">
-                                    <div class="w-8 h-8 gradient-bg rounded-full flex items-center justify-center">
-                                        <i class="fas fa-bolt text-white"></i>
-                                    </div>
-                                    <div>
-                                        <div class="text-sm font-semibold">Fast Responses</div>
-                                        <div class="text-xs text-gray-500">Under 1 second</div>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
+    """Serve the landing page, rendered once and pre-compressed
 
-            <!-- Stats Section -->
-            <div class="gradient-bg">
-                <div class="max-w-7xl mx-auto py-12 px-4 sm:py-16 sm:px-6 lg:px-8">
-                    <div class="grid grid-cols-2 gap-4 md:grid-cols-4">
-                        <div class="text-center">
-                            <div class="text-4xl font-bold text-white">99%</div>
-                            <div class="text-primary-100 mt-1">Response Rate</div>
-                        </div>
-                        <div class="text-center">
-                            <div class="text-4xl font-bold text-white">24/7</div>
-                            <div class="text-primary-100 mt-1">Availability</div>
-                        </div>
-                        <div class="text-center">
-                            <div class="text-4xl font-bold text-white">1s</div>
-                            <div class="text-primary-100 mt-1">Response Time</div>
-                        </div>
-                        <div class="text-center">
-                            <div class="text-4xl font-bold text-white">10k+</div>
-                            <div class="text-primary-100 mt-1">Happy Users</div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <!-- Features Section -->
-            <div id="features" class="py-16 bg-white">
-                <div class="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8">
-                    <div class="text-center">
-                        <h2 class="text-3xl font-bold gradient-text mb-2">Powerful Features</h2>
-                        <p class="text-gray-500 text-xl">Everything you need for perfect communication</p>
-                    </div>
-                    <div class="mt-12 grid gap-8 md:grid-cols-2 lg:grid-cols-3">
-                        <div class="p-6 rounded-xl border border-gray-200 hover:shadow-lg transition-all">
-                            <div class="w-12 h-12 gradient-bg rounded-lg flex items-center justify-center mb-4">
-                                <i class="fas fa-brain text-white text-xl"></i>
-                            </div>
-                            <h3 class="text-xl font-semibold mb-2">Advanced AI</h3>
-                            <p class="text-gray-600">State-of-the-art language models for human-like conversations.</p>
-                        </div>
-                        <div class="p-6 rounded-xl border border-gray-200 hover:shadow-lg transition-all">
-                            <div class="w-12 h-12 gradient-bg rounded-lg flex items-center justify-center mb-4">
-                                <i class="fas fa-bolt text-white text-xl"></i>
-                            </div>
-                            <h3 class="text-xl font-semibold mb-2">Real-time Responses</h3>
-                            <p class="text-gray-600">Get instant answers to your questions, available 24/7.</p>
-                        </div>
-                        <div class="p-6 rounded-xl border border-gray-200 hover:shadow-lg transition-all">
-                            <div class="w-12 h-12 gradient-bg rounded-lg flex items-center justify-center mb-4">
-                                <i class="fas fa-lock text-white text-xl"></i>
-                            </div>
-                            <h3 class="text-xl font-semibold mb-2">Secure & Private</h3>
-                            <p class="text-gray-600">Enterprise-grade security for your sensitive conversations.</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <!-- Integration Section -->
-            <div id="integrations" class="py-16 bg-gray-50">
-                <div class="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8">
-                    <div class="text-center mb-16">
-                        <h2 class="text-3xl font-bold gradient-text mb-2">Powerful Integration Capabilities</h2>
-                        <p class="text-gray-500 text-xl">Connect with your data and favorite platforms</p>
-                    </div>
-
-                    <!-- RAG Section -->
-                    <div class="mb-20">
-                        <div class="lg:grid lg:grid-cols-2 lg:gap-8 items-center">
-                            <div class="relative">
-                                <div class="relative lg:ml-10">
-                                    <div class="gradient-bg rounded-2xl shadow-xl p-8 text-white">
-                                        <h3 class="text-2xl font-bold mb-4">Retrieval-Augmented Generation (RAG)</h3>
-                                        <p class="mb-6">Enhance your AI responses with your own knowledge base:</p>
-                                        <ul class="space-y-4">
-                                            <li class="flex items-start">
-                                                <i class="fas fa-check-circle mt-1 mr-3"></i>
-                                                <span>Connect to your documents, wikis, and knowledge bases</span>
-                                            </li>
-                                            <li class="flex items-start">
-                                                <i class="fas fa-check-circle mt-1 mr-3"></i>
-                                                <span>Automatic content indexing and semantic search</span>
-                                            </li>
-                                            <li class="flex items-start">
-                                                <i class="fas fa-check-circle mt-1 mr-3"></i>
-                                                <span>Real-time data synchronization</span>
-                                            </li>
-                                        </ul>
-                                    </div>
-                                </div>
-                            </div>
-                            <div class="mt-10 lg:mt-0 lg:ml-10">
-                                <h4 class="text-xl font-semibold mb-4">Supported Data Sources</h4>
-                                <div class="grid grid-cols-2 gap-4">
-                                    <div class="flex items-center p-4 bg-white rounded-lg shadow-sm">
-                                        <i class="fas fa-file-pdf text-red-500 text-xl mr-3"></i>
-                                        <span>PDF Documents</span>
-                                    </div>
-                                    <div class="flex items-center p-4 bg-white rounded-lg shadow-sm">
-                                        <i class="fab fa-wikipedia-w text-gray-700 text-xl mr-3"></i>
-                                        <span>Wiki Pages</span>
-                                    </div>
-                                    <div class="flex items-center p-4 bg-white rounded-lg shadow-sm">
-                                        <i class="fas fa-database text-blue-500 text-xl mr-3"></i>
-                                        <span>SQL Databases</span>
-                                    </div>
-                                    <div class="flex items-center p-4 bg-white rounded-lg shadow-sm">
-                                        <i class="fas fa-code-branch text-purple-500 text-xl mr-3"></i>
-                                        <span>API Endpoints</span>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-
-                    <!-- MCP Section -->
-                    <div class="mb-20">
-                        <div class="text-center mb-10">
-                            <h3 class="text-2xl font-bold mb-4">Model Context Protocol (MCP) Integration</h3>
-                            <p class="text-gray-600">Standardized communication between AI models and context sources</p>
-                        </div>
-                        <div class="grid md:grid-cols-3 gap-8">
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <div class="w-12 h-12 gradient-bg rounded-lg flex items-center justify-center mb-4">
-                                    <i class="fas fa-plug text-white text-xl"></i>
-                                </div>
-                                <h4 class="text-lg font-semibold mb-2">Easy Integration</h4>
-                                <p class="text-gray-600">Connect to any MCP-compatible service with minimal setup</p>
-                            </div>
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <div class="w-12 h-12 gradient-bg rounded-lg flex items-center justify-center mb-4">
-                                    <i class="fas fa-shield-alt text-white text-xl"></i>
-                                </div>
-                                <h4 class="text-lg font-semibold mb-2">Secure Protocol</h4>
-                                <p class="text-gray-600">Enterprise-grade security for all model interactions</p>
-                            </div>
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <div class="w-12 h-12 gradient-bg rounded-lg flex items-center justify-center mb-4">
-                                    <i class="fas fa-expand-arrows-alt text-white text-xl"></i>
-                                </div>
-                                <h4 class="text-lg font-semibold mb-2">Extensible</h4>
-                                <p class="text-gray-600">Add custom context providers and handlers</p>
-                            </div>
-                        </div>
-                    </div>
-
-                    <!-- Chat Agents Section -->
-                    <div>
-                        <div class="text-center mb-10">
-                            <h3 class="text-2xl font-bold mb-4">Multi-Channel Communication</h3>
-                            <p class="text-gray-600">Connect with your users across all major platforms</p>
-                        </div>
-                        
-                        <div class="grid grid-cols-1 md:grid-cols-3 gap-8 mb-12">
-                            <!-- Messaging Apps -->
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <h4 class="text-lg font-semibold mb-4 flex items-center">
-                                    <i class="fas fa-mobile-alt text-blue-500 mr-2"></i>
-                                    Messaging Apps
-                                </h4>
-                                <div class="space-y-4">
-                                    <div class="flex items-center gap-3">
-                                        <i class="fab fa-whatsapp text-2xl text-green-500"></i>
-                                        <div>
-                                            <div class="font-medium">WhatsApp</div>
-                                            <div class="text-sm text-gray-500">Business API integration</div>
-                                        </div>
-                                    </div>
-                                    <div class="flex items-center gap-3">
-                                        <i class="fab fa-telegram text-2xl text-blue-500"></i>
-                                        <div>
-                                            <div class="font-medium">Telegram</div>
-                                            <div class="text-sm text-gray-500">Bot API with webhooks</div>
-                                        </div>
-                                    </div>
-                                    <div class="flex items-center gap-3">
-                                        <i class="fab fa-facebook-messenger text-2xl text-blue-400"></i>
-                                        <div>
-                                            <div class="font-medium">Messenger</div>
-                                            <div class="text-sm text-gray-500">Facebook Graph API</div>
-                                        </div>
-                                    </div>
-                                    <div class="flex items-center gap-3">
-                                        <i class="fab fa-discord text-2xl text-indigo-500"></i>
-                                        <div>
-                                            <div class="font-medium">Discord</div>
-                                            <div class="text-sm text-gray-500">Bot & Webhook support</div>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-
-                            <!-- Business Tools -->
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <h4 class="text-lg font-semibold mb-4 flex items-center">
-                                    <i class="fas fa-briefcase text-purple-500 mr-2"></i>
-                                    Business Tools
-                                </h4>
-                                <div class="space-y-4">
-                                    <div class="flex items-center gap-3">
-                                        <i class="fab fa-slack text-2xl text-purple-500"></i>
-                                        <div>
-                                            <div class="font-medium">Slack</div>
-                                            <div class="text-sm text-gray-500">App & Bot integration</div>
-                                        </div>
-                                    </div>
-                                    <div class="flex items-center gap-3">
-                                        <i class="fas fa-envelope text-2xl text-red-500"></i>
-                                        <div>
-                                            <div class="font-medium">Email</div>
-                                            <div class="text-sm text-gray-500">SMTP & API support</div>
-                                        </div>
-                                    </div>
-                                    <div class="flex items-center gap-3">
-                                        <i class="fas fa-globe text-2xl text-blue-600"></i>
-                                        <div>
-                                            <div class="font-medium">Web Widget</div>
-                                            <div class="text-sm text-gray-500">Custom embeddable chat</div>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-
-                            <!-- SMS & Voice -->
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <h4 class="text-lg font-semibold mb-4 flex items-center">
-                                    <i class="fas fa-comments text-yellow-500 mr-2"></i>
-                                    SMS & Voice
-                                </h4>
-                                <div class="space-y-4">
-                                    <div class="flex items-center gap-3">
-                                        <i class="fas fa-sms text-2xl text-yellow-500"></i>
-                                        <div>
-                                            <div class="font-medium">SMS</div>
-                                            <div class="text-sm text-gray-500">Two-way messaging</div>
-                                        </div>
-                                    </div>
-                                    <div class="flex items-center gap-3">
-                                        <i class="fas fa-phone text-2xl text-green-600"></i>
-                                        <div>
-                                            <div class="font-medium">Twilio</div>
-                                            <div class="text-sm text-gray-500">Voice & SMS gateway</div>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-
-                        <!-- Integration Features -->
-                        <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <i class="fas fa-sync text-2xl text-blue-500 mb-3"></i>
-                                <h4 class="font-semibold mb-2">Real-time Sync</h4>
-                                <p class="text-sm text-gray-600">Instant message delivery across all platforms</p>
-                            </div>
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <i class="fas fa-user-circle text-2xl text-green-500 mb-3"></i>
-                                <h4 class="font-semibold mb-2">Unified Profiles</h4>
-                                <p class="text-sm text-gray-600">Consistent user experience across channels</p>
-                            </div>
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <i class="fas fa-chart-line text-2xl text-purple-500 mb-3"></i>
-                                <h4 class="font-semibold mb-2">Analytics</h4>
-                                <p class="text-sm text-gray-600">Track engagement across all platforms</p>
-                            </div>
-                            <div class="bg-white p-6 rounded-xl shadow-sm">
-                                <i class="fas fa-shield-alt text-2xl text-red-500 mb-3"></i>
-                                <h4 class="font-semibold mb-2">Secure</h4>
-                                <p class="text-sm text-gray-600">End-to-end encryption where supported</p>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <!-- Testimonials Section -->
-            <div id="testimonials" class="py-16 bg-gray-50">
-                <div class="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8">
-                    <div class="text-center mb-12">
-                        <h2 class="text-3xl font-bold gradient-text mb-2">What Our Users Say</h2>
-                        <p class="text-gray-500 text-xl">Trusted by thousands of companies worldwide</p>
-                    </div>
-                    <div class="grid gap-8 md:grid-cols-2 lg:grid-cols-3">
-                        <div class="bg-white p-6 rounded-xl shadow-md">
-                            <div class="flex items-center mb-4">
-                                <img class="w-12 h-12 rounded-full" src="https://images.unsplash.com/photo-1472099645785-5658abf4ff4e?ixlib=rb-1.2.1&auto=format&fit=facearea&facepad=2&w=256&h=256&q=80" alt="User">
-                                <div class="ml-4">
-                                    <div class="font-semibold">John Doe</div>
-                                    <div class="text-gray-500 text-sm">CEO, TechCorp</div>
-                                </div>
-                            </div>
-                            <p class="text-gray-600">"This AI assistant has transformed how we handle customer support. Response times are down 90% and customer satisfaction is up!"</p>
-                            <div class="mt-4 flex text-primary-500">
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                            </div>
-                        </div>
-                        <div class="bg-white p-6 rounded-xl shadow-md">
-                            <div class="flex items-center mb-4">
-                                <img class="w-12 h-12 rounded-full" src="https://images.unsplash.com/photo-1438761681033-6461ffad8d80?ixlib=rb-1.2.1&auto=format&fit=facearea&facepad=2&w=256&h=256&q=80" alt="User">
-                                <div class="ml-4">
-                                    <div class="font-semibold">Sarah Smith</div>
-                                    <div class="text-gray-500 text-sm">Product Manager</div>
-                                </div>
-                            </div>
-                            <p class="text-gray-600">"The natural language understanding is impressive. It feels like chatting with a human expert who knows everything about our products."</p>
-                            <div class="mt-4 flex text-primary-500">
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                            </div>
-                        </div>
-                        <div class="bg-white p-6 rounded-xl shadow-md">
-                            <div class="flex items-center mb-4">
-                                <img class="w-12 h-12 rounded-full" src="https://images.unsplash.com/photo-1472099645785-5658abf4ff4e?ixlib=rb-1.2.1&auto=format&fit=facearea&facepad=2&w=256&h=256&q=80" alt="User">
-                                <div class="ml-4">
-                                    <div class="font-semibold">Mike Johnson</div>
-                                    <div class="text-gray-500 text-sm">Support Lead</div>
-                                </div>
-                            </div>
-                            <p class="text-gray-600">"We've seen a 70% reduction in support tickets since implementing this AI assistant. The ROI has been incredible."</p>
-                            <div class="mt-4 flex text-primary-500">
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star"></i>
-                                <i class="fas fa-star-half-alt"></i>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <!-- Pricing Section -->
-            <div id="pricing" class="py-16 bg-white">
-                <div class="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8">
-                    <div class="text-center mb-12">
-                        <h2 class="text-3xl font-bold gradient-text mb-2">Simple, Transparent Pricing</h2>
-                        <p class="text-gray-500 text-xl">Choose the plan that works best for you</p>
-                    </div>
-                    <div class="grid gap-8 md:grid-cols-3">
-                        <div class="border border-gray-200 rounded-xl p-8 hover:shadow-lg transition-all">
-                            <div class="text-center mb-6">
-                                <h3 class="text-xl font-semibold mb-2">Starter</h3>
-                                <div class="text-4xl font-bold mb-2">$29<span class="text-gray-500 text-base font-normal">/mo</span></div>
-                                <p class="text-gray-500">Perfect for small businesses</p>
-                            </div>
-                            <ul class="space-y-4 mb-8">
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>1,000 messages/month</span>
-                                </li>
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>Basic AI features</span>
-                                </li>
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>Email support</span>
-                                </li>
-                            </ul>
-                            <button onclick="toggleChat()" class="w-full py-2 px-4 border border-primary-500 text-primary-500 rounded-lg hover:bg-primary-50 transition-colors">
-                                Start Free Trial
-                            </button>
-                        </div>
-                        <div class="border-2 border-primary-500 rounded-xl p-8 shadow-lg relative">
-                            <div class="absolute top-0 right-4 transform -translate-y-1/2 bg-primary-500 text-white px-4 py-1 rounded-full text-sm">
-                                Popular
-                            </div>
-                            <div class="text-center mb-6">
-                                <h3 class="text-xl font-semibold mb-2">Professional</h3>
-                                <div class="text-4xl font-bold mb-2">$99<span class="text-gray-500 text-base font-normal">/mo</span></div>
-                                <p class="text-gray-500">For growing teams</p>
-                            </div>
-                            <ul class="space-y-4 mb-8">
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>10,000 messages/month</span>
-                                </li>
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>Advanced AI features</span>
-                                </li>
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>Priority support</span>
-                                </li>
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>Custom integrations</span>
-                                </li>
-                            </ul>
-                            <button onclick="toggleChat()" class="w-full py-2 px-4 gradient-bg text-white rounded-lg hover:opacity-90 transition-opacity">
-                                Start Free Trial
-                            </button>
-                        </div>
-                        <div class="border border-gray-200 rounded-xl p-8 hover:shadow-lg transition-all">
-                            <div class="text-center mb-6">
-                                <h3 class="text-xl font-semibold mb-2">Enterprise</h3>
-                                <div class="text-4xl font-bold mb-2">Custom</div>
-                                <p class="text-gray-500">For large organizations</p>
-                            </div>
-                            <ul class="space-y-4 mb-8">
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>Unlimited messages</span>
-                                </li>
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>Custom AI training</span>
-                                </li>
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>24/7 phone support</span>
-                                </li>
-                                <li class="flex items-center">
-                                    <i class="fas fa-check text-green-500 mr-2"></i>
-                                    <span>SLA guarantee</span>
-                                </li>
-                            </ul>
-                            <button onclick="toggleChat()" class="w-full py-2 px-4 border border-primary-500 text-primary-500 rounded-lg hover:bg-primary-50 transition-colors">
-                                Contact Sales
-                            </button>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <!-- Footer -->
-            <footer class="bg-gray-900 text-white py-12">
-                <div class="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8">
-                    <div class="grid grid-cols-2 md:grid-cols-4 gap-8">
-                        <div>
-                            <h3 class="text-lg font-semibold mb-4">Product</h3>
-                            <ul class="space-y-2">
-                                <li><a href="#features" class="text-gray-400 hover:text-white">Features</a></li>
-                                <li><a href="#pricing" class="text-gray-400 hover:text-white">Pricing</a></li>
-                                <li><a href="#testimonials" class="text-gray-400 hover:text-white">Testimonials</a></li>
-                            </ul>
-                        </div>
-                        <div>
-                            <h3 class="text-lg font-semibold mb-4">Company</h3>
-                            <ul class="space-y-2">
-                                <li><a href="#about" class="text-gray-400 hover:text-white">About</a></li>
-                                <li><a href="#careers" class="text-gray-400 hover:text-white">Careers</a></li>
-                                <li><a href="#contact" class="text-gray-400 hover:text-white">Contact</a></li>
-                            </ul>
-                        </div>
-                        <div>
-                            <h3 class="text-lg font-semibold mb-4">Resources</h3>
-                            <ul class="space-y-2">
-                                <li><a href="#docs" class="text-gray-400 hover:text-white">Documentation</a></li>
-                                <li><a href="#api" class="text-gray-400 hover:text-white">API</a></li>
-                                <li><a href="#blog" class="text-gray-400 hover:text-white">Blog</a></li>
-                            </ul>
-                        </div>
-                        <div>
-                            <h3 class="text-lg font-semibold mb-4">Legal</h3>
-                            <ul class="space-y-2">
-                                <li><a href="#privacy" class="text-gray-400 hover:text-white">Privacy Policy</a></li>
-                                <li><a href="#terms" class="text-gray-400 hover:text-white">Terms of Service</a></li>
-                                <li><a href="#cookies" class="text-gray-400 hover:text-white">Cookie Policy</a></li>
-                            </ul>
-                        </div>
-                    </div>
-                    <div class="mt-8 pt-8 border-t border-gray-800 text-center text-gray-400">
-                        <p>&copy; 2025 AI Assistant. All rights reserved.</p>
-                    </div>
-                </div>
-            </footer>
-
-            <!-- Chat Widget (Hidden by default) -->
-            <div id="chat-widget" class="fixed bottom-4 right-4 w-96 bg-white rounded-lg shadow-xl transition-all duration-300 transform translate-y-full opacity-0">
-                <div class="bg-blue-600 text-white px-4 py-3 rounded-t-lg flex justify-between items-center">
-                    <h2 class="text-lg font-semibold">Chat with AI</h2>
-                    <button onclick="toggleChat()" class="text-white hover:text-gray-200">
-                        <i class="fas fa-times"></i>
-                    </button>
-                </div>
-                <div id="chat-messages" class="h-96 p-4 overflow-y-auto space-y-4"></div>
-                <div class="border-t p-4">
-                    <div class="flex gap-2">
-                        <input type="text" id="message-input" 
-                            class="flex-1 rounded-lg border-gray-300 shadow-sm focus:border-blue-500 focus:ring-blue-500"
-                            placeholder="Type your message...">
-                        <button onclick="sendMessage()" 
-                            class="px-4 py-2 bg-blue-600 text-white rounded-lg hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-blue-500 focus:ring-offset-2">
-                            <i class="fas fa-paper-plane"></i>
-                        </button>
-                    </div>
-                </div>
-            </div>
-
-            <!-- Chat Toggle Button (Fixed) -->
-            <button id="chat-toggle-btn" onclick="toggleChat()" 
-                class="fixed bottom-4 right-4 w-14 h-14 bg-blue-600 text-white rounded-full shadow-lg hover:bg-blue-700 flex items-center justify-center">
-                <i class="fas fa-comments text-xl"></i>
-            </button>
-
-            <script>
-                function checkLLMConnection() {
-                    return fetch('/check-llm-connection', {
-                        method: 'GET'
-                    })
-                    .then(response => response.json())
-                    .catch(() => ({ connected: false }));
-                }
-
-                function toggleChat() {
-                    const chatWidget = document.getElementById('chat-widget');
-                    const chatToggleBtn = document.getElementById('chat-toggle-btn');
-                    
-                    if (chatWidget.classList.contains('translate-y-full')) {
-                        // Show chat and check LLM connection
-                        chatWidget.classList.remove('translate-y-full', 'opacity-0');
-                        chatToggleBtn.classList.add('hidden');
-                        
-                        checkLLMConnection().then(data => {
-                            if (!data.connected) {
-                                appendMessage("AI service is not available. Please check your connection or contact support to ensure proper API configuration.", false);
-                            }
-                        });
-                    } else {
-                        // Hide chat
-                        chatWidget.classList.add('translate-y-full', 'opacity-0');
-                        chatToggleBtn.classList.remove('hidden');
-                    }
-                }
-
-                function appendMessage(message, isUser) {
-                    const div = document.createElement('div');
-                    div.className = `p-3 rounded-lg ${isUser ? 'bg-blue-50 ml-auto text-blue-900' : 'bg-gray-50'} max-w-[80%] shadow-sm`;
-                    
-                    const textDiv = document.createElement('div');
-                    textDiv.className = 'flex items-start gap-2';
-                    
-                    const icon = document.createElement('i');
-                    icon.className = isUser ? 'fas fa-user text-blue-600 mt-1' : 'fas fa-robot text-gray-600 mt-1';
-                    
-                    const messageText = document.createElement('div');
-                    messageText.textContent = message;
-                    
-                    textDiv.appendChild(icon);
-                    textDiv.appendChild(messageText);
-                    div.appendChild(textDiv);
-                    
-                    document.getElementById('chat-messages').appendChild(div);
-                    div.scrollIntoView({ behavior: 'smooth' });
-                }
-
-                function sendMessage() {
-                    const input = document.getElementById('message-input');
-                    const message = input.value.trim();
-                    if (!message) return;
-                    
-                    appendMessage(message, true);
-                    input.value = '';
-
-                    fetch('/chat', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ message })
-                    })
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.error) {
-                            appendMessage('Error: ' + data.error, false);
-                        } else {
-                            appendMessage(data.response, false);
-                        }
-                    })
-                    .catch(() => {
-                        appendMessage('Could not connect to AI Agent. Please try again later.', false);
-                    });
-                }
-
-                document.getElementById('message-input').addEventListener('keypress', function(e) {
-                    if (e.key === 'Enter' && !e.shiftKey) {
-                        e.preventDefault();
-                        sendMessage();
-                    }
-                });
-            </script>
-        </body>
-        </html>
-        """
-        return html
+    Responses carry an ETag per encoding, so revalidating browsers get a
+    304 without a body.
+    """
+    try:
+        page = get_landing_page()
+        encoding = page.choose_encoding(request.headers.get('Accept-Encoding'))
+        etag = page.etag(encoding)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(page.bodies[encoding], mimetype=page.mimetype)
+            if encoding != "identity":
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'public, max-age={config.LANDING_PAGE_MAX_AGE}'
+        response.vary.add('Accept-Encoding')
+        return response
     except Exception as e:
         print(f"Error rendering template: {str(e)}")
         # Return a basic HTML page for debugging
@@ -781,6 +238,24 @@ Static path: {app.static_folder}
         </html>
         """
 
+@app.route('/widget', methods=['GET'])
+def widget():
+    """The embed snippet for this server's chat widget"""
+    response = Response(generate_widget_code(request.host_url.rstrip('/')), mimetype='text/plain')
+    response.headers['Cache-Control'] = f'public, max-age={config.WIDGET_LOADER_MAX_AGE}'
+    return response
+
+@app.after_request
+def widget_cache_headers(response):
+    """Cache content-hashed widget bundles forever and the loader briefly"""
+    if request.path.startswith('/static/widget/') and response.status_code in (200, 304):
+        filename = request.path.rsplit('/', 1)[-1]
+        if BUNDLE_PATTERN.match(filename):
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        elif filename == 'loader.js':
+            response.headers['Cache-Control'] = f'public, max-age={config.WIDGET_LOADER_MAX_AGE}'
+    return response
+
 @app.route('/test')
 def test_page():
     """Test template rendering"""
@@ -791,9 +266,32 @@ def test_page():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint for Docker"""
+    """Health check endpoint for Docker, unhealthy until this worker has warmed up"""
+    if not is_ready():
+        start_worker_in_background()
+        return jsonify({"status": "starting"}), 503
     return jsonify({"status": "healthy"}), 200
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Report session, FAQ short-circuit, prompt token and response cache statistics for this worker"""
+    bot = get_chatbot()
+    return jsonify({
+        "sessions": session_store.stats(),
+        "faq_matcher": bot.faq_stats.snapshot(),
+        "prompt_tokens": bot.token_stats.snapshot(),
+        "llm": bot.completion_client.stats(),
+        "summarizer": bot.summarizer.stats() if bot.summarizer else None,
+        "coalescing": bot.single_flight.stats() if bot.single_flight else None,
+        "admission": admission.stats() if admission else None,
+        "response_cache": bot.response_cache.stats() if bot.response_cache else None
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics, merged across all workers"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/.well-known/appspecific/com.chrome.devtools.json')
 def handle_chrome_devtools():
     """Handle Chrome DevTools requests to prevent 404 logs"""
@@ -801,7 +299,11 @@ def handle_chrome_devtools():
 
 @app.route('/reload-data', methods=['POST'])
 def reload_data():
-    """Endpoint to reload training data without restarting server"""
+    """Endpoint to reload training data without restarting server
+
+    The reload swaps in a new snapshot atomically and is published to the
+    other workers, which pick it up from their data watchers.
+    """
     try:
         bot = get_chatbot()
         bot.reload_training_data()
@@ -812,6 +314,8 @@ def reload_data():
 @app.route('/chat', methods=['POST'])
 async def chat():
     """Handle chat requests"""
+    start = time.perf_counter()
+    ticket = None
     try:
         data = request.get_json()
         user_message = data.get('message', '')
@@ -819,80 +323,62 @@ async def chat():
         if not user_message:
             return jsonify({"error": "No message provided"}), 400
 
+        if admission:
+            try:
+                ticket = await admission.admit(request_client_key())
+            except AdmissionDenied as denied:
+                return denied_response(denied)
+
         bot = get_chatbot()
-        response = await bot.get_response(user_message)
-        return jsonify({"response": response})
+        session = get_session()
+        if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+            response = stream_chat(bot, session, user_message, start)
+            if ticket:
+                # The slot is held until the stream is finished or abandoned
+                response.call_on_close(ticket.release)
+                ticket = None
+            return attach_session(response, session)
+
+        response = await bot.get_response(user_message, session=session)
+        session_store.save(session)
+        bot.summarize_history(session, session_store)
+        metrics.observe("chatbot_request_seconds", time.perf_counter() - start, mode="json")
+        return attach_session(jsonify({"response": response, "session_id": session.session_id}), session)
 
     except Exception as e:
+        metrics.inc("chatbot_errors_total", stage="request")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if ticket:
+            ticket.release()
+
+def stream_chat(bot, session, user_message, start):
+    """Build a server-sent events response that forwards tokens as they arrive"""
+    def events():
+        tokens = bot.completion_client.iterate_sync(bot.stream_response(user_message, session=session))
+        for token in tokens:
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        session_store.save(session)
+        bot.summarize_history(session, session_store)
+        metrics.observe("chatbot_request_seconds", time.perf_counter() - start, mode="stream")
+        yield f"data: {json.dumps({'done': True, 'session_id': session.session_id})}\n\n"
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+    return response
 
 def generate_widget_code(server_url):
-    """Generate the JavaScript code for the chat widget"""
-    return f"""
-<!-- ChatBot Widget -->
-<div id="chatbot-widget" style="position: fixed; bottom: 20px; right: 20px; width: 300px; height: 400px; background: white; border: 1px solid #ccc; border-radius: 8px; overflow: hidden; display: flex; flex-direction: column;">
-    <div style="padding: 10px; background: #007bff; color: white;">Chat with AI</div>
-    <div id="chat-messages" style="flex: 1; overflow-y: auto; padding: 10px;"></div>
-    <div style="padding: 10px; border-top: 1px solid #ccc;">
-        <input type="text" id="user-input" placeholder="Type your message..." style="width: 80%; padding: 5px;">
-        <button onclick="sendMessage()" style="width: 18%; padding: 5px;">Send</button>
-    </div>
-</div>
-
-<script>
-const serverUrl = '{server_url}';
-
-function appendMessage(message, isUser) {{
-    const messagesDiv = document.getElementById('chat-messages');
-    const messageDiv = document.createElement('div');
-    messageDiv.style.margin = '5px';
-    messageDiv.style.padding = '5px';
-    messageDiv.style.borderRadius = '5px';
-    messageDiv.style.backgroundColor = isUser ? '#e9ecef' : '#f8f9fa';
-    messageDiv.textContent = message;
-    messagesDiv.appendChild(messageDiv);
-    messagesDiv.scrollTop = messagesDiv.scrollHeight;
-}}
-
-async function sendMessage() {{
-    const input = document.getElementById('user-input');
-    const message = input.value.trim();
-    
-    if (!message) return;
-    
-    appendMessage(message, true);
-    input.value = '';
-
-    try {{
-        const response = await fetch(`${{serverUrl}}/chat`, {{
-            method: 'POST',
-            headers: {{
-                'Content-Type': 'application/json'
-            }},
-            body: JSON.stringify({{ message }})
-        }});
-
-        const data = await response.json();
-        if (data.error) {{
-            appendMessage('Error: ' + data.error, false);
-        }} else {{
-            appendMessage(data.response, false);
-        }}
-    }} catch (error) {{
-        appendMessage('Error: Could not connect to server', false);
-    }}
-}}
-
-document.getElementById('user-input').addEventListener('keypress', function(e) {{
-    if (e.key === 'Enter') {{
-        sendMessage();
-    }}
-}});
-</script>
-"""
+    """Generate the snippet host pages add to embed the chat widget
+
+    The loader is tiny and loads the content-hashed widget bundle
+    asynchronously, so it never blocks rendering of the host page.
+    """
+    return f'<script async src="{server_url}/static/widget/loader.js" data-server="{server_url}"></script>\n'
 
 def run_server():
     """Run the Flask server"""
+    start_worker()
     app.run(
         host=config.FLASK_HOST,
         port=config.FLASK_PORT,
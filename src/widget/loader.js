@@ -0,0 +1,15 @@
+/*
+ * Embed loader. Host pages include it with
+ *     <script async src="https://chat.example.com/static/widget/loader.js"></script>
+ * and it adds the content-hashed widget bundle as another async script.
+ * The bundle name (__WIDGET_BUNDLE__) is filled in by the build step.
+ */
+(function () {
+    var script = document.currentScript;
+    var base = script.getAttribute('data-server') || script.src.split('/static/widget/')[0];
+    var bundle = document.createElement('script');
+    bundle.async = true;
+    bundle.src = base + '/static/widget/__WIDGET_BUNDLE__';
+    bundle.setAttribute('data-server', base);
+    document.head.appendChild(bundle);
+})();
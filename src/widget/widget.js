@@ -0,0 +1,209 @@
+/*
+ * Chat widget, loaded asynchronously by loader.js.
+ *
+ * Everything lives in this closure: no globals, no inline handlers. The
+ * build step replaces __WIDGET_CSS__ with the minified stylesheet, so the
+ * whole widget is a single cacheable request.
+ *
+ * Messages go over one WebSocket per conversation (see src/ws_transport.py).
+ * If the server doesn't offer one, e.g. when it's served by gunicorn sync
+ * workers, the widget falls back to streaming POSTs to /chat.
+ */
+(function () {
+    'use strict';
+
+    if (document.getElementById('chatbot-widget')) {
+        return;
+    }
+
+    var script = document.currentScript;
+    var serverUrl = (script && script.getAttribute('data-server')) || '';
+    var sessionId = null;
+    var socket = null;
+    var socketFailed = false;
+    var nextReplyId = 0;
+    var pending = {};
+
+    function element(tag, className, text) {
+        var node = document.createElement(tag);
+        if (className) {
+            node.className = className;
+        }
+        if (text) {
+            node.textContent = text;
+        }
+        return node;
+    }
+
+    function appendMessage(messages, text, isUser) {
+        var node = element('div', isUser ? 'cbw-message cbw-user' : 'cbw-message', text);
+        messages.appendChild(node);
+        messages.scrollTop = messages.scrollHeight;
+        return node;
+    }
+
+    async function readEvents(response, onEvent) {
+        var reader = response.body.getReader();
+        var decoder = new TextDecoder();
+        var buffer = '';
+        while (true) {
+            var chunk = await reader.read();
+            if (chunk.done) {
+                break;
+            }
+            buffer += decoder.decode(chunk.value, { stream: true });
+            var boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                var event = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                if (event.indexOf('data: ') === 0) {
+                    onEvent(JSON.parse(event.slice(6)));
+                }
+            }
+        }
+    }
+
+    function socketUrl() {
+        var base = serverUrl || (location.protocol + '//' + location.host);
+        var url = base.replace('http', 'ws') + '/ws';  // http(s):// becomes ws(s)://
+        return sessionId ? url + '?session_id=' + encodeURIComponent(sessionId) : url;
+    }
+
+    function onFrame(ws, frame) {
+        var reply = pending[frame.id];
+        if (frame.type === 'ping') {
+            ws.send(JSON.stringify({ type: 'pong' }));
+        } else if (frame.type === 'session') {
+            sessionId = frame.session_id;
+        } else if (frame.type === 'token' && reply) {
+            reply.node.textContent += frame.token;
+            reply.messages.scrollTop = reply.messages.scrollHeight;
+        } else if (frame.type === 'done' && reply) {
+            delete pending[frame.id];
+        } else if (frame.type === 'error' && reply) {
+            reply.node.textContent = 'Error: ' + frame.error;
+            delete pending[frame.id];
+        }
+    }
+
+    // Resolves with an open socket, reconnecting after the server closed an idle one
+    function openSocket() {
+        if (socket) {
+            return socket;
+        }
+        socket = new Promise(function (resolve, reject) {
+            var ws = new WebSocket(socketUrl());
+            var opened = false;
+            ws.onopen = function () {
+                opened = true;
+                resolve(ws);
+            };
+            ws.onmessage = function (event) {
+                onFrame(ws, JSON.parse(event.data));
+            };
+            ws.onclose = function () {
+                socket = null;
+                if (!opened) {
+                    reject(new Error('WebSocket unavailable'));
+                }
+                Object.keys(pending).forEach(function (id) {
+                    pending[id].node.textContent += ' [connection lost]';
+                    delete pending[id];
+                });
+            };
+        });
+        return socket;
+    }
+
+    async function sendOverSocket(message, node, messages) {
+        var ws = await openSocket();
+        var id = String(++nextReplyId);
+        pending[id] = { node: node, messages: messages };
+        ws.send(JSON.stringify({ type: 'message', id: id, message: message }));
+    }
+
+    async function sendOverHttp(message, node, messages) {
+        var headers = { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' };
+        if (sessionId) {
+            headers['X-Session-ID'] = sessionId;
+        }
+        var response = await fetch(serverUrl + '/chat', {
+            method: 'POST',
+            headers: headers,
+            body: JSON.stringify({ message: message, stream: true })
+        });
+        if (!response.ok) {
+            var data = await response.json();
+            node.textContent = 'Error: ' + data.error;
+            return;
+        }
+        await readEvents(response, function (data) {
+            if (data.token) {
+                node.textContent += data.token;
+                messages.scrollTop = messages.scrollHeight;
+            }
+            if (data.session_id) {
+                sessionId = data.session_id;
+            }
+        });
+    }
+
+    async function sendMessage(input, messages) {
+        var message = input.value.trim();
+        if (!message) {
+            return;
+        }
+        appendMessage(messages, message, true);
+        input.value = '';
+
+        var node = appendMessage(messages, '', false);
+        if (!socketFailed && window.WebSocket) {
+            try {
+                await sendOverSocket(message, node, messages);
+                return;
+            } catch (error) {
+                // No WebSocket endpoint on this server: use HTTP from now on
+                socketFailed = true;
+            }
+        }
+        try {
+            await sendOverHttp(message, node, messages);
+        } catch (error) {
+            node.textContent = 'Error: Could not connect to server';
+        }
+    }
+
+    function mount() {
+        var style = element('style');
+        style.textContent = '__WIDGET_CSS__';
+        document.head.appendChild(style);
+
+        var root = element('div');
+        root.id = 'chatbot-widget';
+        var messages = element('div', 'cbw-messages');
+        var form = element('form', 'cbw-form');
+        var input = element('input', 'cbw-input');
+        input.type = 'text';
+        input.placeholder = 'Type your message...';
+        input.setAttribute('aria-label', 'Message');
+        var send = element('button', 'cbw-send', 'Send');
+        send.type = 'submit';
+
+        form.addEventListener('submit', function (e) {
+            e.preventDefault();
+            sendMessage(input, messages);
+        });
+        form.appendChild(input);
+        form.appendChild(send);
+        root.appendChild(element('div', 'cbw-header', 'Chat with AI'));
+        root.appendChild(messages);
+        root.appendChild(form);
+        document.body.appendChild(root);
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', mount);
+    } else {
+        mount();
+    }
+})();
@@ -0,0 +1,161 @@
+"""
+Build the embeddable chat widget into minified, content-hashed static files
+
+The sources in src/widget are bundled into src/static/widget:
+widget.<hash>.js (script and stylesheet in one file, served as immutable)
+and loader.js, the small stable-URL script host pages include, which
+points at the current bundle. Bundles from the previous build are kept so
+pages with a cached loader keep working.
+
+Usage:
+    python -m src.widget_build [--output src/static/widget]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+SOURCE_DIR = os.path.join(os.path.dirname(__file__), 'widget')
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'static', 'widget')
+MANIFEST = "manifest.json"
+HASH_LENGTH = 12
+BUNDLE_PATTERN = re.compile(r"^widget\.[0-9a-f]{%d}\.js$" % HASH_LENGTH)
+
+
+def minify_css(css):
+    """Strip comments and whitespace from a stylesheet"""
+    if rcssmin is not None:
+        return rcssmin.cssmin(css)
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js):
+    """Strip comments and whitespace from a script
+
+    A conservative fallback for when rjsmin isn't installed: string
+    literals are kept untouched, and line breaks are only dropped after
+    "{", ";" or "," and before "}", where automatic semicolon insertion
+    can't apply. Sources must not use regular expression literals.
+    """
+    if rjsmin is not None:
+        return rjsmin.jsmin(js)
+    code, strings = [], []
+    i, n = 0, len(js)
+    while i < n:
+        c = js[i]
+        if c in "'\"`":
+            end = i + 1
+            while end < n and js[end] != c:
+                end += 2 if js[end] == "\\" else 1
+            # Set aside so the whitespace rules below can't touch it
+            code.append(f"\0{len(strings)}\0")
+            strings.append(js[i:end + 1])
+            i = end + 1
+        elif js.startswith("//", i):
+            while i < n and js[i] != "\n":
+                i += 1
+        elif js.startswith("/*", i):
+            end = js.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        else:
+            code.append(c)
+            i += 1
+    lines = (re.sub(r"[ \t]+", " ", line).strip() for line in "".join(code).splitlines())
+    text = "\n".join(line for line in lines if line)
+    text = re.sub(r" ?([{}()\[\];,=:<>!&|?*]) ?", r"\1", text)
+    text = re.sub(r"([{;,])\n|\n(?=})", r"\1", text)
+    return re.sub(r"\0(\d+)\0", lambda m: strings[int(m.group(1))], text)
+
+
+def _read(name):
+    with open(os.path.join(SOURCE_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def _write(path, text):
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)
+
+
+def source_hash():
+    """Hash of the widget sources, to tell whether a build is current"""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(SOURCE_DIR)):
+        digest.update(name.encode('utf-8'))
+        digest.update(_read(name).encode('utf-8'))
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def read_manifest(output_dir=OUTPUT_DIR):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build(output_dir=OUTPUT_DIR):
+    """Write the hashed bundle, the loader and the manifest; returns the manifest"""
+    css = minify_css(_read("widget.css"))
+    # A double-quoted JSON string is a valid JavaScript string literal
+    js = minify_js(_read("widget.js").replace("'__WIDGET_CSS__'", json.dumps(css)))
+    bundle = f"widget.{hashlib.sha256(js.encode('utf-8')).hexdigest()[:HASH_LENGTH]}.js"
+    loader = minify_js(_read("loader.js").replace("__WIDGET_BUNDLE__", bundle))
+
+    os.makedirs(output_dir, exist_ok=True)
+    previous = read_manifest(output_dir)
+    _write(os.path.join(output_dir, bundle), js)
+    _write(os.path.join(output_dir, "loader.js"), loader)
+    manifest = {
+        "bundle": bundle,
+        "previous": previous["bundle"] if previous and previous["bundle"] != bundle else None,
+        "source_hash": source_hash(),
+        "bytes": {"bundle": len(js.encode('utf-8')), "loader": len(loader.encode('utf-8'))},
+    }
+    _write(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2))
+
+    keep = {manifest["bundle"], manifest["previous"]}
+    for name in os.listdir(output_dir):
+        if BUNDLE_PATTERN.match(name) and name not in keep:
+            os.remove(os.path.join(output_dir, name))
+    return manifest
+
+
+def ensure_built(output_dir=OUTPUT_DIR):
+    """Build the widget unless the current sources were built already"""
+    manifest = read_manifest(output_dir)
+    if (manifest and manifest.get("source_hash") == source_hash()
+            and os.path.exists(os.path.join(output_dir, manifest["bundle"]))):
+        return manifest
+    return build(output_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the chat widget bundle")
+    parser.add_argument("--output", default=OUTPUT_DIR)
+    args = parser.parse_args(argv)
+    manifest = build(args.output)
+    source_bytes = sum(len(_read(name).encode('utf-8')) for name in ("widget.js", "widget.css"))
+    print(f"Built {manifest['bundle']} ({manifest['bytes']['bundle']} bytes from {source_bytes}) "
+          f"and loader.js ({manifest['bytes']['loader']} bytes) in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+WebSocket transport for the chat widget
+
+One connection per widget conversation: the session is settled once at the
+handshake, then every question and its streamed reply travel over the
+same socket as JSON text frames. Each question loads the session from the
+store afresh, like an HTTP request would.
+
+Client to server:
+    {"type": "message", "id": "<reply id>", "message": "..."}
+    {"type": "cancel", "id": "<reply id>"}
+    {"type": "ping"} / {"type": "pong"}
+
+Server to client:
+    {"type": "session", "session_id": "..."}             once, after the handshake
+    {"type": "token", "id": "...", "token": "..."}       any number per reply
+    {"type": "done", "id": "...", "session_id": "..."}
+    {"type": "error", "id": "...", "error": "...", "retry_after": 2}   retry_after only when turned away
+    {"type": "ping"} / {"type": "pong"}
+
+Replies are tagged with the id the client chose, so several can stream at
+once. The transport is a plain ASGI application: an idle connection costs a
+few small objects and no thread, so one event-loop worker holds thousands.
+"""
+import asyncio
+import json
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+from config import chatbot_config as config
+from src.admission import AdmissionDenied, client_key
+from src.metrics import metrics
+
+CLOSE_GOING_AWAY = 1001
+CLOSE_MESSAGE_TOO_BIG = 1009
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class WebSocketTransport:
+    """ASGI application serving chat conversations over WebSockets
+
+    get_bot returns the chatbot and session_store holds the conversations,
+    as for the HTTP /chat route; messages pass the same admission control. Outgoing frames go through a bounded queue
+    per connection: when a client reads slowly the queue fills up and its
+    replies wait instead of buffering without limit. With an executor, the
+    session store and rate limiter (which may wait on SQLite) run on it
+    instead of the event loop.
+    """
+
+    def __init__(self, get_bot, session_store, admission=None, heartbeat_seconds=20, idle_timeout=60,
+                 send_queue_size=64, max_in_flight=4, max_message_bytes=16 * 1024, max_connections=10000,
+                 executor=None):
+        self.get_bot = get_bot
+        self.session_store = session_store
+        self.admission = admission
+        self.executor = executor
+        self.heartbeat_seconds = heartbeat_seconds
+        self.idle_timeout = idle_timeout
+        self.send_queue_size = send_queue_size
+        self.max_in_flight = max_in_flight
+        self.max_message_bytes = max_message_bytes
+        self.max_connections = max_connections
+        self.connections = 0
+        self.total_connections = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            raise ValueError("WebSocketTransport only serves websocket connections")
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        if self.connections >= self.max_connections:
+            # Closing before accepting rejects the handshake (HTTP 403)
+            self.rejected += 1
+            await send({"type": "websocket.close", "code": CLOSE_TRY_AGAIN_LATER})
+            return
+
+        session = await self._blocking(self.session_store.get_or_create, _session_id(scope))
+        await send({"type": "websocket.accept"})
+        self.connections += 1
+        self.total_connections += 1
+        try:
+            await _Connection(self, session.session_id, send, _client_key(scope)).run(receive)
+        finally:
+            self.connections -= 1
+
+    async def _blocking(self, func, *args):
+        """Run a blocking call on the executor, or inline when there is none"""
+        if self.executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def stats(self):
+        """Return open, total and rejected connections of this worker"""
+        return {
+            "connections": self.connections,
+            "total_connections": self.total_connections,
+            "rejected": self.rejected,
+            "max_connections": self.max_connections,
+        }
+
+
+class _Connection:
+    """One open WebSocket: a reader, a writer, a heartbeat and the replies in flight"""
+
+    def __init__(self, transport, session_id, send, client_key):
+        self.transport = transport
+        # The session is re-read for every message: a shared store hands out copies,
+        # and the summarizer writes its summary to the stored one
+        self.session_id = session_id
+        self.send = send
+        self.client_key = client_key
+        self.outbox = asyncio.Queue(transport.send_queue_size)
+        self.replies = {}
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self.close_code = CLOSE_GOING_AWAY
+
+    async def run(self, receive):
+        self.outbox.put_nowait({"type": "session", "session_id": self.session_id})
+        tasks = [
+            asyncio.ensure_future(self._read(receive)),
+            asyncio.ensure_future(self._write()),
+            asyncio.ensure_future(self._heartbeat()),
+        ]
+        try:
+            # Whichever ends first (disconnect, close or idle timeout) ends the connection
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks + list(self.replies.values()):
+                task.cancel()
+            if not self.closed:
+                try:
+                    await asyncio.wait_for(self.send({"type": "websocket.close", "code": self.close_code}), 1)
+                except Exception:
+                    pass  # The connection is already gone
+
+    async def _read(self, receive):
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                self.closed = True
+                return
+            self.last_seen = time.monotonic()
+            text = message.get("text")
+            if text is None:
+                text = (message.get("bytes") or b"").decode("utf-8", "replace")
+            if len(text) > self.transport.max_message_bytes:
+                self.close_code = CLOSE_MESSAGE_TOO_BIG
+                return
+            self._handle(text)
+
+    def _handle(self, text):
+        try:
+            frame = json.loads(text)
+            kind = frame.get("type")
+        except (ValueError, AttributeError):
+            self._reply_error(None, "Invalid frame")
+            return
+
+        if kind == "ping":
+            self._post({"type": "pong"})
+        elif kind == "message":
+            reply_id = frame.get("id")
+            user_message = frame.get("message")
+            if not isinstance(reply_id, (str, int)):
+                self._reply_error(None, "Missing reply id")
+            elif not user_message or not isinstance(user_message, str):
+                self._reply_error(reply_id, "No message provided")
+            elif reply_id in self.replies:
+                self._reply_error(reply_id, "Duplicate reply id")
+            elif len(self.replies) >= self.transport.max_in_flight:
+                self._reply_error(reply_id, "Too many replies in flight")
+            else:
+                self._start_reply(reply_id, user_message)
+        elif kind == "cancel":
+            task = self.replies.get(frame.get("id"))
+            if task is not None:
+                task.cancel()
+        elif kind != "pong":
+            self._reply_error(frame.get("id"), f"Unknown frame type: {kind}")
+
+    def _post(self, frame):
+        """Queue a control frame, dropping it if the client isn't reading"""
+        try:
+            self.outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            pass
+
+    def _reply_error(self, reply_id, error):
+        self._post({"type": "error", "id": reply_id, "error": error})
+
+    def _start_reply(self, reply_id, user_message):
+        self.replies[reply_id] = asyncio.ensure_future(self._reply(reply_id, user_message))
+
+    async def _reply(self, reply_id, user_message):
+        start = time.perf_counter()
+        transport = self.transport
+        store = transport.session_store
+        ticket = None
+        try:
+            if transport.admission:
+                await transport._blocking(transport.admission.check_rate, self.client_key)
+                ticket = await transport.admission.enter()
+            bot = transport.get_bot()
+            session = await transport._blocking(store.get_or_create, self.session_id)
+            self.session_id = session.session_id
+            tokens = bot.stream_response(user_message, session=session)
+            try:
+                async for token in tokens:
+                    # Waits while the client is behind, which pauses this reply
+                    await self.outbox.put({"type": "token", "id": reply_id, "token": token})
+            finally:
+                await tokens.aclose()
+            await transport._blocking(store.save, session)
+            bot.summarize_history(session, store)
+            metrics.observe("chatbot_request_seconds", time.perf_counter() - start, mode="websocket")
+            await self.outbox.put({"type": "done", "id": reply_id, "session_id": session.session_id})
+        except asyncio.CancelledError:
+            raise
+        except AdmissionDenied as denied:
+            await self.outbox.put({"type": "error", "id": reply_id, "error": str(denied),
+                                   "retry_after": denied.retry_after})
+        except Exception as e:
+            metrics.inc("chatbot_errors_total", stage="websocket")
+            await self.outbox.put({"type": "error", "id": reply_id, "error": str(e)})
+        finally:
+            if ticket:
+                ticket.release()
+            self.replies.pop(reply_id, None)
+
+    async def _write(self):
+        while True:
+            frame = await self.outbox.get()
+            await self.send({"type": "websocket.send", "text": json.dumps(frame)})
+
+    async def _heartbeat(self):
+        """Ping the client regularly and give up on one that stopped answering"""
+        while True:
+            await asyncio.sleep(self.transport.heartbeat_seconds)
+            if time.monotonic() - self.last_seen > self.transport.idle_timeout:
+                return
+            self._post({"type": "ping"})
+
+
+def _session_id(scope):
+    """Session id from the query string (cross-origin widgets) or the session cookie"""
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    if query.get("session_id"):
+        return query["session_id"][0]
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookie = SimpleCookie()
+            try:
+                cookie.load(value.decode("latin-1"))
+            except Exception:
+                continue
+            if config.SESSION_COOKIE_NAME in cookie:
+                return cookie[config.SESSION_COOKIE_NAME].value
+    return None
+
+
+def _client_key(scope):
+    """The rate limit bucket of a connection, keyed like HTTP requests"""
+    headers = {name: value.decode("latin-1") for name, value in scope.get("headers", [])}
+    client = scope.get("client")
+    return client_key(headers.get(config.RATE_LIMIT_API_KEY_HEADER.lower().encode()), client[0] if client else None,
+                      headers.get(b"x-forwarded-for"))
+
+
+def create_websocket_transport(get_bot, session_store, admission=None, executor=None):
+    """Create the WebSocket transport from the configuration"""
+    return WebSocketTransport(
+        get_bot,
+        session_store,
+        admission=admission,
+        executor=executor,
+        heartbeat_seconds=config.WEBSOCKET_HEARTBEAT_SECONDS,
+        idle_timeout=config.WEBSOCKET_IDLE_TIMEOUT,
+        send_queue_size=config.WEBSOCKET_SEND_QUEUE_SIZE,
+        max_in_flight=config.WEBSOCKET_MAX_IN_FLIGHT,
+        max_message_bytes=config.WEBSOCKET_MAX_MESSAGE_BYTES,
+        max_connections=config.WEBSOCKET_MAX_CONNECTIONS
+    )
@@ -0,0 +1,70 @@
+"""
+Tests for per-client rate limiting and load shedding in front of /chat
+"""
+import asyncio
+import pytest
+from config import chatbot_config as config
+from src.admission import (AdmissionController, AdmissionDenied, ConcurrencyLimiter, MemoryRateLimiter,
+                           SQLiteRateLimiter)
+
+
+def test_token_buckets_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    # Two limiters on one file stand for two workers
+    first, second = SQLiteRateLimiter(path, rate=1, burst=3), SQLiteRateLimiter(path, rate=1, burst=3)
+    assert [first.acquire("a")[0], second.acquire("a")[0], first.acquire("a")[0]] == [True, True, True]
+    allowed, retry_after = second.acquire("a")
+    assert not allowed and 0 < retry_after <= 1
+    # Other clients have their own buckets
+    assert first.acquire("b")[0]
+
+    memory = MemoryRateLimiter(rate=1, burst=1)
+    assert memory.acquire("a")[0] and not memory.acquire("a")[0]
+
+
+def test_requests_beyond_the_queue_are_shed():
+    async def scenario():
+        admission = AdmissionController(None, ConcurrencyLimiter(max_concurrent=1, max_queue=1, queue_timeout=0.2))
+        running = await admission.enter()
+        queued = asyncio.ensure_future(admission.enter())
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionDenied) as shed:
+            await admission.enter()
+        assert shed.value.status == 503 and shed.value.retry_after >= 1
+
+        # A released slot goes to the queued request
+        running.release()
+        (await queued).release()
+        assert admission.limiter.active == 0
+
+        # A queued request that waits too long is shed, and gives its place back
+        running = await admission.enter()
+        with pytest.raises(AdmissionDenied):
+            await admission.enter()
+        running.release()
+        assert admission.limiter.active == 0 and admission.limiter.queued == 0
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["admitted"] == 3 and stats["shed"] == 2
+
+
+def test_chat_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(config, "STATE_BACKEND", "memory")
+    monkeypatch.setattr(config, "DATA_WATCH_ENABLED", False)
+    from src import web_embed_generator as web
+    admission = AdmissionController(MemoryRateLimiter(rate=0.1, burst=1), ConcurrencyLimiter(4, 4, 1))
+    monkeypatch.setattr(web, "admission", admission)
+    client = web.app.test_client()
+
+    # The first request spends the bucket whatever the outcome
+    streamed = client.post('/chat', json={"message": "Hello", "stream": True})
+    streamed.get_data()
+    assert admission.limiter.active == 1
+    # Servers close the response once it's sent, which gives the slot back
+    streamed.close()
+    response = client.post('/chat', json={"message": "Hello again"})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()["retry_after"] == int(response.headers['Retry-After'])
+    assert admission.limiter.active == 0
@@ -0,0 +1,109 @@
+"""
+Tests for the ASGI serving mode: native chat routes and the bridged Flask app
+"""
+import asyncio
+import json
+import time
+from config import chatbot_config as config
+
+
+class FakeBot:
+    """Chatbot answering every question with the same tokens"""
+
+    tokens = ["Hello", " there"]
+
+    async def get_response(self, user_input, session=None):
+        session.add_message("user", user_input)
+        return "".join(self.tokens)
+
+    async def stream_response(self, user_input, session=None):
+        session.add_message("user", user_input)
+        for token in self.tokens:
+            yield token
+
+    def summarize_history(self, session, store=None):
+        pass
+
+
+def request(app, method, path, body=b"", headers=()):
+    """Run one HTTP request through an ASGI app; returns (status, headers, body)"""
+    return asyncio.run(call(app, method, path, body, headers))
+
+
+async def call(app, method, path, body=b"", headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": b"", "root_path": "",
+        "http_version": "1.1", "scheme": "http", "server": ("testserver", 80),
+        "headers": [(b"host", b"testserver")] + [(k.lower().encode(), v.encode()) for k, v in headers],
+    }
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def setup_app(monkeypatch):
+    monkeypatch.setattr(config, "STATE_BACKEND", "memory")
+    monkeypatch.setattr(config, "DATA_WATCH_ENABLED", False)
+    from src import asgi
+    monkeypatch.setattr(asgi.web, "get_chatbot", FakeBot)
+    return asgi
+
+
+def test_chat_is_served_natively_with_json_and_events(monkeypatch):
+    asgi = setup_app(monkeypatch)
+
+    status, headers, body = request(asgi.app, "POST", "/chat", json.dumps({"message": "Hi"}).encode())
+    data = json.loads(body)
+    assert status == 200 and data["response"] == "Hello there"
+    assert f"{config.SESSION_COOKIE_NAME}={data['session_id']}" in headers[b"set-cookie"].decode()
+
+    status, headers, body = request(asgi.app, "POST", "/chat", json.dumps({"message": "Again", "stream": True}).encode(),
+                                    [(config.SESSION_HEADER_NAME, data["session_id"])])
+    events = [json.loads(line[6:]) for line in body.decode().split("\n\n") if line]
+    assert headers[b"content-type"].startswith(b"text/event-stream")
+    assert [e["token"] for e in events if "token" in e] == ["Hello", " there"]
+    assert events[-1] == {"done": True, "session_id": data["session_id"]}
+    # Both turns landed in the same session
+    assert len(asgi.web.session_store.get(data["session_id"]).conversation_history) == 2
+
+    assert request(asgi.app, "POST", "/chat", b"{}")[0] == 400
+
+
+def test_other_routes_are_served_by_flask(monkeypatch):
+    asgi = setup_app(monkeypatch)
+
+    status, headers, body = request(asgi.app, "GET", "/widget")
+    assert status == 200 and b"loader.js" in body
+    assert request(asgi.app, "GET", "/chat")[0] == 405
+
+
+def test_blocking_steps_dont_stall_the_event_loop(monkeypatch):
+    asgi = setup_app(monkeypatch)
+    monkeypatch.setattr(asgi.web, "is_ready", lambda: True)
+    get_or_create = asgi.web.session_store.get_or_create
+
+    def slow_get_or_create(session_id=None):
+        time.sleep(0.3)  # e.g. waiting on another worker's SQLite write lock
+        return get_or_create(session_id)
+
+    monkeypatch.setattr(asgi.web.session_store, "get_or_create", slow_get_or_create)
+    finished = []
+
+    async def timed(name, *args):
+        await call(asgi.app, *args)
+        finished.append(name)
+
+    async def scenario():
+        await asyncio.gather(timed("chat", "POST", "/chat", json.dumps({"message": "Hi"}).encode()),
+                             timed("health", "GET", "/health"))
+
+    asyncio.run(scenario())
+    assert finished == ["health", "chat"]
@@ -0,0 +1,90 @@
+"""
+Tests for single-flight coalescing of completions and micro-batching
+"""
+import asyncio
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+from src.chatbot_logic import Chatbot
+from src.coalescing import MicroBatcher, SingleFlight
+from src.session_store import ConversationSession
+
+
+class FakeClient:
+    """Completion client whose requests are resolved by the test"""
+
+    model = "fake"
+
+    def __init__(self):
+        self.requests = []
+
+    def submit(self, **params):
+        future = Future()
+        self.requests.append(future)
+        return future
+
+
+def reply(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def test_single_flight_shares_calls_until_they_complete():
+    flight = SingleFlight()
+    started = []
+
+    def start():
+        started.append(Future())
+        return started[-1]
+
+    first, leader = flight.submit("key", start)
+    second, follower = flight.submit("key", start)
+    other, _ = flight.submit("other", start)
+    assert second is first and leader and not follower
+    assert other is not first
+
+    first.set_result("done")
+    third, leader = flight.submit("key", start)
+    assert third is not first and leader
+    assert flight.stats()["upstream_calls"] == 3
+    assert flight.stats()["coalesced"] == 1
+
+
+def test_identical_concurrent_questions_make_one_upstream_call():
+    bot = Chatbot(use_defaults=True)
+    bot.completion_client = FakeClient()
+    bot.response_cache = None
+    question = "What is the capital of the moon base?"
+
+    async def burst():
+        tasks = [asyncio.ensure_future(bot.get_response(question, ConversationSession(f"visitor-{i}")))
+                 for i in range(5)]
+        while not bot.completion_client.requests:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        bot.completion_client.requests[0].set_result(reply("Tranquility."))
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(burst()) == ["Tranquility."] * 5
+    assert len(bot.completion_client.requests) == 1
+    assert bot.single_flight.stats()["coalesced"] == 4
+
+
+def test_micro_batcher_groups_requests_within_the_window():
+    batches = []
+
+    def run_batch(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(run_batch, window_seconds=0.2, max_batch=3)
+    futures = [batcher.submit(i) for i in range(4)]
+    assert [f.result(timeout=2) for f in futures] == [0, 2, 4, 6]
+    assert batches == [[0, 1, 2], [3]]
+
+    def fail(items):
+        raise RuntimeError("backend down")
+
+    failing = MicroBatcher(fail, window_seconds=0.01)
+    future = failing.submit(1)
+    time.sleep(0.05)
+    assert isinstance(future.exception(timeout=2), RuntimeError)
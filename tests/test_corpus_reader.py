@@ -0,0 +1,46 @@
+"""
+Tests for the streaming FAQ and training data readers
+"""
+import json
+import os
+from src.corpus_reader import iter_blocks, iter_faq_records, read_training_data
+from src.data_loader import DataLoader
+
+
+def write(tmp_path, name, content, newline=None):
+    path = os.path.join(tmp_path, name)
+    with open(path, 'w', encoding='utf-8', newline=newline) as f:
+        f.write(content)
+    return path
+
+
+def test_text_faqs_match_the_original_format(tmp_path):
+    path = write(tmp_path, "faqs.txt", "What is it?\nA bot.\n\n\n\nHow?\r\nLike\r\nthis.\r\n\r\nno question here\n")
+    assert list(iter_faq_records(path)) == [("What is it?", "A bot."), ("How?", "Like\nthis.")]
+
+
+def test_jsonl_and_csv_faqs(tmp_path):
+    lines = [json.dumps({"question": "Q1?", "answer": "A1"}), "", json.dumps({"q": "Q2?", "a": "A2"})]
+    jsonl = write(tmp_path, "faqs.jsonl", "\n".join(lines))
+    assert list(iter_faq_records(jsonl)) == [("Q1?", "A1"), ("Q2?", "A2")]
+
+    with_header = write(tmp_path, "faqs.csv", 'answer,question\n"Yes, it is",Is it?\n', newline='')
+    assert list(iter_faq_records(with_header)) == [("Is it?", "Yes, it is")]
+    no_header = write(tmp_path, "plain.csv", "Is it?,Yes\nWhy?,Because\n", newline='')
+    assert list(iter_faq_records(no_header)) == [("Is it?", "Yes"), ("Why?", "Because")]
+
+
+def test_empty_files(tmp_path):
+    path = write(tmp_path, "empty.txt", "")
+    assert list(iter_blocks(path)) == []
+    assert read_training_data(path) == ""
+
+
+def test_data_loader_merges_faq_files(tmp_path):
+    write(tmp_path, "training_faqs.txt", "Is it?\nFrom text\n\nOnly text?\nYes")
+    write(tmp_path, "training_faqs.jsonl", json.dumps({"question": "Is it?", "answer": "From jsonl"}))
+    write(tmp_path, "training_data.txt", "\r\nSome context\r\n")
+    loader = DataLoader(str(tmp_path))
+    assert loader.faqs["Is it?"] == "From jsonl"
+    assert loader.faqs["Only text?"] == "Yes"
+    assert loader.training_data == "Some context"
@@ -0,0 +1,48 @@
+"""
+Tests for hot reloading of knowledge data
+"""
+import os
+from src.chatbot_logic import Chatbot
+from src.data_loader import DataLoader
+from src.data_watcher import DataWatcher
+
+
+def write_faqs(data_dir, text):
+    path = os.path.join(data_dir, "training_faqs.txt")
+    with open(path, "w") as f:
+        f.write(text)
+    # Make sure the change is visible even on filesystems with coarse mtimes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_reload_swaps_in_a_new_snapshot(tmp_path):
+    write_faqs(tmp_path, "What is this?\nA test.")
+    loader = DataLoader(str(tmp_path))
+    old = loader.snapshot
+
+    write_faqs(tmp_path, "What is this?\nAn updated test.")
+    assert loader.reload()
+
+    # Readers holding the old snapshot still see consistent old data
+    assert old.faqs["What is this?"] == "A test."
+    assert loader.faqs["What is this?"] == "An updated test."
+    assert loader.faq_version == old.faq_version + 1
+    assert not loader.reload()
+
+
+def test_watcher_reloads_changed_files(tmp_path):
+    write_faqs(tmp_path, "What is this?\nA test.")
+    bot = Chatbot(lazy_load=True)
+    bot.data_loader = DataLoader(str(tmp_path))
+    bot._data_initialized = True
+    watcher = DataWatcher(bot, str(tmp_path))
+    watcher._signature = watcher._scan()
+
+    watcher.check()
+    assert watcher.reloads == 0
+
+    write_faqs(tmp_path, "What is this?\nAn updated test.")
+    watcher.check()
+    assert watcher.reloads == 1
+    assert bot.data_loader.faqs["What is this?"] == "An updated test."
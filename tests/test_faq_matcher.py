@@ -0,0 +1,42 @@
+"""
+Tests for the FAQ short-circuit matcher
+"""
+from src.faq_matcher import FAQMatcher, FAQMatchStats, normalize_question
+
+FAQS = {
+    "How do I integrate the chatbot with my website?": "Add the widget code to your site.",
+    "Is the conversation secure?": "Yes, conversations are encrypted.",
+}
+
+
+def test_normalize_question():
+    assert normalize_question("  Is the  Conversation SECURE?!  ") == "is the conversation secure"
+
+
+def test_exact_match_ignores_case_and_punctuation():
+    match = FAQMatcher(FAQS).match("is the conversation secure")
+    assert match.kind == "exact"
+    assert match.answer == "Yes, conversations are encrypted."
+
+
+def test_fuzzy_match_above_threshold():
+    match = FAQMatcher(FAQS, threshold=0.8).match("How do I integrate the chat bot with my web site")
+    assert match is not None
+    assert match.kind == "fuzzy"
+    assert match.answer == "Add the widget code to your site."
+
+
+def test_unrelated_question_is_not_matched():
+    assert FAQMatcher(FAQS).match("What is the weather like in Paris tomorrow?") is None
+
+
+def test_stats_report_hit_rate_and_savings():
+    matcher = FAQMatcher(FAQS)
+    stats = FAQMatchStats()
+    stats.record_lookup(matcher.match("Is the conversation secure?"), 0.0001)
+    stats.record_lookup(matcher.match("Tell me a joke"), 0.0001)
+    stats.record_llm_call(1.0)
+
+    snapshot = stats.snapshot()
+    assert snapshot["hit_rate"] == 0.5
+    assert snapshot["latency_saved_seconds"] > 0.99
@@ -0,0 +1,41 @@
+"""
+Tests for the pre-compressed landing page and its conditional GETs
+"""
+import gzip
+from config import chatbot_config as config
+from src.precompressed import PrecompressedPage
+
+
+def test_encoding_negotiation():
+    page = PrecompressedPage("<html>" + "hello " * 100 + "</html>")
+    assert page.choose_encoding("gzip, deflate") == "gzip"
+    assert page.choose_encoding("gzip;q=0, deflate") == "identity"
+    assert page.choose_encoding(None) == "identity"
+    assert gzip.decompress(page.bodies["gzip"]) == page.bodies["identity"]
+    assert page.etag("gzip") != page.etag("identity")
+
+
+def test_landing_page_is_compressed_and_revalidated(monkeypatch):
+    monkeypatch.setattr(config, "STATE_BACKEND", "memory")
+    monkeypatch.setattr(config, "DATA_WATCH_ENABLED", False)
+    from src import web_embed_generator as web
+    client = web.app.test_client()
+
+    plain = client.get('/')
+    assert plain.status_code == 200
+    assert b"AI Assistant" in plain.data
+    assert 'Content-Encoding' not in plain.headers
+
+    compressed = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert len(compressed.data) < len(plain.data) / 3
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert compressed.headers['Cache-Control'].startswith('public')
+
+    etag = compressed.headers['ETag']
+    cached = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b""
+    # A stale ETag gets the full page
+    assert client.get('/', headers={'If-None-Match': '"old"'}).status_code == 200
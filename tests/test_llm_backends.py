@@ -0,0 +1,46 @@
+"""
+Tests for the pluggable LLM backends
+"""
+import asyncio
+import pytest
+from src import llm_backends
+from src.llm_backends import LocalModelBackend, StubBackend, create_llm_backend
+from src.llm_client import AsyncCompletionClient
+
+
+def params(question, max_tokens=150):
+    return {"model": "stub", "messages": [{"role": "user", "content": question}], "max_tokens": max_tokens}
+
+
+def test_stub_samples_are_deterministic_per_seed_and_request():
+    backend = StubBackend(first_token_ms=100, output_tokens=40, seed=1)
+    assert backend.sample(params("hello")) == backend.sample(params("hello"))
+    assert backend.sample(params("hello")) != StubBackend(first_token_ms=100, output_tokens=40, seed=2).sample(params("hello"))
+    assert len(backend.sample(params("hello", max_tokens=5))[2]) <= 5
+
+
+def test_completion_client_runs_on_the_stub_backend():
+    backend = StubBackend(first_token_ms=5, tokens_per_second=2000, output_tokens=20)
+    client = AsyncCompletionClient(backend)
+    try:
+        assert client.model == "stub"
+        response = client.submit(**params("What are your hours?")).result(timeout=5)
+        text = response.choices[0].message.content
+        assert response.usage.completion_tokens == len(text.split())
+
+        async def stream():
+            return [delta async for delta in client.stream(**params("What are your hours?"))]
+        assert "".join(asyncio.run(stream())) == text
+        assert client.stats()["backend"]["requests"] == 2
+    finally:
+        client.close()
+
+
+def test_backend_selection():
+    assert create_llm_backend("stub").name == "stub"
+    assert create_llm_backend("openai").name == "openai"
+    with pytest.raises(ValueError):
+        create_llm_backend("carrier-pigeon")
+    if llm_backends.transformers is None:
+        with pytest.raises(RuntimeError):
+            LocalModelBackend("tiny-model")
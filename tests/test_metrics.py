@@ -0,0 +1,65 @@
+"""
+Tests for the per-thread metrics registry and its cross-worker merge
+"""
+import multiprocessing
+import threading
+from src.metrics import MetricsRegistry
+
+
+def make_registry(directory=None):
+    registry = MetricsRegistry(directory)
+    registry.counter("requests_total", "Requests")
+    registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    return registry
+
+
+def test_threads_record_into_shards_that_add_up():
+    registry = make_registry()
+
+    def work():
+        for _ in range(100):
+            registry.inc("requests_total", status="ok")
+            registry.observe("latency_seconds", 0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # A new thread folds the shards of the exited ones
+    registry.inc("requests_total", status="error")
+    assert len(registry._shards) == 1
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"][("requests_total", (("status", "ok"),))] == 400
+    assert snapshot["histograms"][("latency_seconds", ())] == [0, 400, 0, 200.0]
+
+    text = registry.render()
+    assert 'requests_total{status="ok"} 400' in text
+    assert 'latency_seconds_bucket{le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 400' in text
+    assert "latency_seconds_count 400" in text
+
+
+def _worker(directory):
+    registry = make_registry(directory)
+    registry.gauge("sessions", "Sessions", lambda: 5)
+    registry.inc("requests_total", 3)
+    registry.flush()
+
+
+def test_workers_merge_through_the_shared_directory(tmp_path):
+    worker = multiprocessing.get_context("fork").Process(target=_worker, args=(str(tmp_path),))
+    worker.start()
+    worker.join()
+
+    registry = make_registry(str(tmp_path))
+    registry.gauge("sessions", "Sessions", lambda: 2)
+    registry.inc("requests_total", 4)
+    merged = registry.collect()
+    assert merged["counters"][("requests_total", ())] == 7
+    # The exited worker's counters still count, its gauge doesn't
+    assert merged["gauges"][("sessions", ())] == 2
+
+    registry.clear_directory()
+    assert not list(tmp_path.iterdir())
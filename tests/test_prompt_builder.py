@@ -0,0 +1,78 @@
+"""
+Tests for the token-budgeted prompt builder
+"""
+from src.prompt_builder import PromptBuilder, PromptTokenStats, TokenCounter
+
+SYSTEM = "You are a helpful assistant."
+
+
+def make_builder(**kwargs):
+    counter = TokenCounter("gpt-3.5-turbo")
+    counter._encoding = None  # Deterministic estimates, whether or not tiktoken is installed
+    return PromptBuilder(counter, **kwargs)
+
+
+def test_messages_are_role_separated():
+    builder = make_builder(context_window=4096, max_output_tokens=150)
+    history = [("user", "Hi there"), ("assistant", "Hello! How can I help?")]
+    prompt = builder.build(SYSTEM, "Support is open on weekdays.", "Refunds take five days.",
+                           history, "How long do refunds take?")
+
+    system, *middle, question = prompt.messages
+    assert system == {"role": "system", "content": SYSTEM + "\n\nContext:\nSupport is open on weekdays."}
+    assert middle == [{"role": "user", "content": "Hi there"},
+                      {"role": "assistant", "content": "Hello! How can I help?"}]
+    assert question["role"] == "user"
+    assert question["content"].endswith("Refunds take five days.\n\nQuestion: How long do refunds take?")
+    # The system prompt and the question each appear exactly once
+    assert sum(m["content"].count(SYSTEM) for m in prompt.messages) == 1
+    assert sum(m["content"].count("How long do refunds take?") for m in prompt.messages) == 1
+    assert prompt.usage["truncated"] == []
+    assert prompt.usage["total"] <= builder.input_budget
+
+
+def test_system_message_is_a_stable_prefix():
+    builder = make_builder()
+    first = builder.build(SYSTEM, "static facts", "passage one", [], "first question?")
+    second = builder.build(SYSTEM, "static facts", "passage two", [("user", "first question?")], "second?")
+    assert first.messages[0] == second.messages[0]
+
+
+def test_budget_truncates_context_and_drops_oldest_history():
+    builder = make_builder(context_window=400, max_output_tokens=100, context_budget=100)
+    history = [("user", "old message " * 80), ("assistant", "recent answer")]
+    prompt = builder.build(SYSTEM, "", "fact " * 500, history, "question?")
+
+    usage = prompt.usage
+    assert usage["context"] <= 100
+    assert usage["history_dropped"] == 1
+    assert usage["truncated"] == ["context", "history"]
+    contents = [m["content"] for m in prompt.messages]
+    assert "recent answer" in contents
+    assert not any("old message" in content for content in contents)
+    assert usage["total"] <= builder.input_budget
+
+
+def test_oversized_user_input_is_truncated():
+    builder = make_builder(context_window=300, max_output_tokens=100)
+    prompt = builder.build(SYSTEM, "", "", [], "word " * 1000)
+    assert "user" in prompt.usage["truncated"]
+    assert prompt.usage["total"] <= builder.input_budget
+
+
+def test_stats_average_usage():
+    builder = make_builder()
+    stats = PromptTokenStats()
+    for question in ["one?", "two?"]:
+        stats.record(builder.build(SYSTEM, "context", "", [], question).usage)
+    snapshot = stats.snapshot()
+    assert snapshot["requests"] == 2
+    assert snapshot["avg_tokens"]["total"] == snapshot["last"]["total"]
+
+
+def test_summary_goes_between_the_prefix_and_the_history():
+    builder = make_builder()
+    prompt = builder.build(SYSTEM, "", "", [("user", "recent")], "next?", summary="The user is Ada.")
+    assert prompt.messages[1] == {"role": "system", "content": "Summary of the earlier conversation:\nThe user is Ada."}
+    assert prompt.messages[2] == {"role": "user", "content": "recent"}
+    assert prompt.usage["summary"] > 0
@@ -0,0 +1,94 @@
+"""
+Tests for upstream deadlines, retries, hedging and the circuit breaker
+"""
+import asyncio
+import openai
+import pytest
+from src.llm_backends import StubBackend, current_attempt
+from src.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class FlakyUpstream:
+    """Fails the first calls with the given errors, then answers after delays[attempt] seconds"""
+
+    def __init__(self, errors=(), delays=None):
+        self.errors = list(errors)
+        self.delays = delays or {}
+        self.attempts = []
+
+    async def create(self):
+        attempt = current_attempt.get()
+        self.attempts.append(attempt)
+        await asyncio.sleep(self.delays.get(attempt, 0))
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"answer {attempt}"
+
+    async def stream(self):
+        yield await self.create()
+        yield "more"
+
+
+def test_transient_errors_are_retried_within_the_deadline():
+    policy = RetryPolicy(attempt_timeout=0.05, max_attempts=3, backoff_base=0.01)
+    upstream = FlakyUpstream([openai.error.ServiceUnavailableError("busy")], delays={1: 1})
+    # A 503, then an attempt that misses its deadline, then an answer
+    assert asyncio.run(policy.call(upstream.create)) == "answer 2"
+    assert upstream.attempts == [0, 1, 2]
+
+    upstream = FlakyUpstream([openai.error.InvalidRequestError("bad request", "messages")])
+    with pytest.raises(openai.error.InvalidRequestError):
+        asyncio.run(policy.call(upstream.create))
+    assert upstream.attempts == [0]
+
+    async def collect():
+        return [item async for item in policy.stream(upstream.stream)]
+
+    upstream = FlakyUpstream([openai.error.APIConnectionError("reset")])
+    assert asyncio.run(collect()) == ["answer 1", "more"]
+
+
+def test_circuit_opens_after_failures_and_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    policy = RetryPolicy(max_attempts=1, breaker=breaker)
+    upstream = FlakyUpstream([openai.error.Timeout("slow")] * 2)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(openai.error.Timeout):
+                await policy.call(upstream.create)
+        # Open: fails fast without calling the upstream
+        with pytest.raises(CircuitOpenError):
+            await policy.call(upstream.create)
+        assert len(upstream.attempts) == 2
+
+        await asyncio.sleep(0.06)
+        upstream.delays = {0: 0.05}
+        probe = asyncio.ensure_future(policy.call(upstream.create))
+        await asyncio.sleep(0.01)
+        with pytest.raises(CircuitOpenError):
+            await policy.call(upstream.create)
+        assert await probe == "answer 0"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+    assert breaker.stats()["times_opened"] == 1 and breaker.rejected == 2
+
+
+def test_a_slow_request_is_hedged_and_the_stub_samples_each_attempt():
+    policy = RetryPolicy(attempt_timeout=1, max_attempts=2, hedge_after=0.02)
+    upstream = FlakyUpstream(delays={0: 0.5})
+    # The hedge is numbered after the retries
+    assert asyncio.run(policy.call(upstream.create)) == "answer 2"
+    assert upstream.attempts == [0, 2]
+
+    backend = StubBackend(seed=1, error_rate=0.5)
+    params = {"messages": [{"role": "user", "content": "hello"}]}
+    samples = []
+    for attempt in range(8):
+        token = current_attempt.set(attempt)
+        samples.append(backend.sample(params))
+        current_attempt.reset(token)
+    assert samples[0] == backend.sample(params)
+    assert len(set(map(str, samples))) == 8
+    assert {fails for *_, fails in samples} == {True, False}
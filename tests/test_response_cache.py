@@ -0,0 +1,58 @@
+"""
+Tests for the LLM response cache
+"""
+import time
+from src.response_cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend, make_cache_key
+
+PARAMS = {
+    "model": "gpt-3.5-turbo",
+    "messages": [{"role": "user", "content": "What  is this\nchatbot?"}],
+    "max_tokens": 150,
+    "temperature": 0.7,
+}
+
+
+def test_cache_key_normalizes_whitespace_but_not_parameters():
+    same = dict(PARAMS, messages=[{"role": "user", "content": "What is this chatbot?"}])
+    assert make_cache_key(PARAMS) == make_cache_key(same)
+    assert make_cache_key(PARAMS) != make_cache_key(dict(PARAMS, temperature=0.2))
+
+
+def test_hit_miss_counters():
+    cache = ResponseCache(MemoryCacheBackend())
+    assert cache.get(PARAMS) is None
+    cache.set(PARAMS, "An AI assistant.")
+    assert cache.get(PARAMS) == "An AI assistant."
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_memory_backend_lru_and_ttl():
+    backend = MemoryCacheBackend(ttl_seconds=60, max_entries=2)
+    backend.set("a", "1")
+    backend.set("b", "2")
+    backend.get("a")
+    backend.set("c", "3")
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+
+    expiring = MemoryCacheBackend(ttl_seconds=0.01)
+    expiring.set("a", "1")
+    time.sleep(0.02)
+    assert expiring.get("a") is None
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCacheBackend(path).set("key", "value")
+    assert SQLiteCacheBackend(path).get("key") == "value"
+
+
+def test_sqlite_backend_evicts_least_recently_used(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=5)
+    backend.EVICT_EVERY = 1
+    for i in range(8):
+        backend.set(f"key{i}", str(i))
+    assert len(backend) == 5
+    assert backend.get("key0") is None
+    assert backend.get("key7") == "7"
@@ -0,0 +1,32 @@
+"""
+Tests for retrieval-based context selection
+"""
+from src.retrieval import RetrievalIndex, chunk_text, estimate_tokens
+
+PASSAGES = [
+    "Q: How do I integrate the chatbot with my website?\nA: Add the JavaScript widget code to your site.",
+    "Q: Is the conversation secure?\nA: Conversations are encrypted in transit.",
+    "Q: What are the pricing tiers?\nA: Basic, Standard and Advanced.",
+]
+
+
+def test_search_ranks_relevant_passage_first():
+    index = RetrievalIndex(PASSAGES)
+    results = index.search("integrate widget on website", top_k=2)
+    assert results[0][0] == 0
+    assert index.search("completely unrelated zebra") == []
+
+
+def test_select_respects_token_budget():
+    index = RetrievalIndex(PASSAGES)
+    budget = estimate_tokens(PASSAGES[1])
+    selected = index.select("secure conversation pricing tiers", top_k=3, token_budget=budget)
+    assert sum(estimate_tokens(p) for p in selected) <= budget
+    assert len(selected) == 1
+
+
+def test_chunk_text_limits_words():
+    text = "one two three four five\n\nsix seven\n\n" + " ".join(["word"] * 12)
+    chunks = chunk_text(text, max_words=5)
+    assert all(len(chunk.split()) <= 5 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
@@ -0,0 +1,61 @@
+"""
+Tests for the per-session conversation store
+"""
+import time
+from src.session_store import SessionStore
+
+
+def test_sessions_are_isolated():
+    store = SessionStore()
+    first = store.get_or_create()
+    second = store.get_or_create()
+    first.add_message("user", "hello")
+    first.conversation_steps += 1
+
+    assert first.session_id != second.session_id
+    assert list(second.conversation_history) == []
+    assert store.get(first.session_id) is first
+
+
+def test_client_session_id_is_reused_or_replaced():
+    store = SessionStore()
+    session = store.get_or_create("visitor-12345678")
+    assert session.session_id == "visitor-12345678"
+    assert store.get_or_create("visitor-12345678") is session
+
+    # Malformed ids from clients are never stored as-is
+    assert store.get_or_create("bad id!").session_id != "bad id!"
+
+
+def test_lru_eviction_by_count():
+    store = SessionStore(max_sessions=2)
+    a = store.get_or_create()
+    b = store.get_or_create()
+    store.get(a.session_id)  # a is now most recently used
+    store.get_or_create()
+
+    assert store.get(b.session_id) is None
+    assert store.get(a.session_id) is a
+    assert store.stats()["evictions"] == 1
+
+
+def test_memory_bound_evicts_oldest():
+    store = SessionStore(max_bytes=5000)
+    a = store.get_or_create()
+    a.add_message("user", "x" * 3000)
+    store.save(a)
+    b = store.get_or_create()
+    b.add_message("user", "y" * 3000)
+    store.save(b)
+
+    assert store.get(a.session_id) is None
+    assert store.get(b.session_id) is b
+    assert store.stats()["bytes"] <= 5000
+
+
+def test_ttl_expiry():
+    store = SessionStore(ttl_seconds=0.01)
+    session = store.get_or_create()
+    time.sleep(0.02)
+    assert store.get(session.session_id) is None
+    assert len(store) == 0
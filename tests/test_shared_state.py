@@ -0,0 +1,74 @@
+"""
+Tests for state shared between workers
+"""
+import json
+import os
+from src.data_loader import DataLoader
+from src.shared_state import KnowledgeSync, SharedSessionStore, SQLiteStateBackend
+from src.snapshot import MappedFAQs, main as snapshot_main
+
+
+def test_session_continues_on_another_worker(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    worker_a = SharedSessionStore(SQLiteStateBackend(path))
+    worker_b = SharedSessionStore(SQLiteStateBackend(path))
+
+    session = worker_a.get_or_create()
+    session.add_message("user", "hello")
+    session.conversation_steps = 1
+    worker_a.save(session)
+
+    restored = worker_b.get(session.session_id)
+    assert list(restored.conversation_history) == [("user", "hello")]
+    assert restored.conversation_steps == 1
+
+
+def test_trim_keeps_most_recent_sessions(tmp_path):
+    backend = SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+    for i in range(5):
+        backend.set("session", f"session-{i}", "x" * 10)
+    backend.trim("session", max_entries=3)
+    assert backend.count("session") == 3
+    backend.trim("session", max_bytes=25)
+    assert backend.count("session") == 2
+    assert backend.get("session", "session-4") is not None
+
+
+def test_knowledge_published_by_one_worker_reaches_another(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    sync_a = KnowledgeSync(SQLiteStateBackend(path), check_interval=0)
+    sync_b = KnowledgeSync(SQLiteStateBackend(path), check_interval=0)
+    loader_a = DataLoader(str(tmp_path), use_defaults=True)
+    loader_b = DataLoader(str(tmp_path), use_defaults=True)
+    sync_a.publish(loader_a)
+    sync_b.refresh(loader_b)
+
+    loader_a.replace_data({"Is it new?": "Yes."}, "Updated training data.")
+    sync_a.publish(loader_a)
+
+    assert sync_b.refresh(loader_b)
+    assert loader_b.faqs == {"Is it new?": "Yes."}
+    assert loader_b.training_data == "Updated training data."
+    assert not sync_b.refresh(loader_b)
+
+
+def test_a_compiled_snapshot_is_published_by_path(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    with open(os.path.join(data_dir, "training_faqs.txt"), "w") as f:
+        f.write("How do refunds work?\nRefunds take five days.")
+    with open(os.path.join(data_dir, "training_data.txt"), "w") as f:
+        f.write("Invoices are emailed monthly.")
+    snapshot_main(["compile", "--data-dir", str(data_dir)])
+
+    backend = SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+    sync_a, sync_b = KnowledgeSync(backend, check_interval=0), KnowledgeSync(backend, check_interval=0)
+    loader_a = DataLoader(str(data_dir))
+    loader_b = DataLoader(str(data_dir), use_defaults=True)
+    sync_a.publish(loader_a)
+    # Only the file's location goes through the store, not the corpus
+    assert set(json.loads(backend.get(KnowledgeSync.NAMESPACE, "data"))) == {"snapshot"}
+
+    assert sync_b.refresh(loader_b)
+    assert isinstance(loader_b.faqs, MappedFAQs)
+    assert loader_b.faqs["How do refunds work?"] == "Refunds take five days."
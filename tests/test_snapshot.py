@@ -0,0 +1,53 @@
+"""
+Tests for compiled knowledge snapshots
+"""
+import os
+import pytest
+from src.data_loader import DataLoader
+from src.snapshot import SnapshotError, default_snapshot_path, load_snapshot, main
+
+
+def write_data(data_dir):
+    with open(os.path.join(data_dir, "training_faqs.txt"), "w") as f:
+        f.write("How do refunds work?\nRefunds take five days.\n\nCan I change my plan?\nYes, from billing.")
+    with open(os.path.join(data_dir, "training_data.txt"), "w") as f:
+        f.write("Invoices are emailed monthly.\n\nSupport is open on weekdays.")
+
+
+def test_snapshot_matches_the_text_loader(tmp_path):
+    write_data(tmp_path)
+    assert main(["compile", "--data-dir", str(tmp_path)]) == 0
+
+    text = DataLoader(str(tmp_path), use_snapshot=False)
+    compiled = DataLoader(str(tmp_path), use_snapshot=True)
+    assert dict(compiled.faqs) == dict(text.faqs)
+    assert compiled.faqs["How do refunds work?"] == "Refunds take five days."
+    assert compiled.training_data == text.training_data
+    assert compiled.get_context() == text.get_context()
+    for query in ["refunds", "change plan billing", "invoices monthly", "unknown words"]:
+        assert compiled.get_index().search(query) == text.get_index().search(query)
+        assert compiled.get_context(query) == text.get_context(query)
+    # The FAQ matcher is mapped from the snapshot too
+    assert compiled.snapshot._derived['faq_matcher'][1] is compiled.get_faq_matcher()
+    for question in ["how do refunds work", "Can I change my plan please?", "unknown words"]:
+        mapped, built = compiled.get_faq_matcher().match(question), text.get_faq_matcher().match(question)
+        assert (mapped and (mapped.answer, mapped.score)) == (built and (built.answer, built.score))
+
+
+def test_stale_snapshot_is_ignored(tmp_path):
+    write_data(tmp_path)
+    main(["compile", "--data-dir", str(tmp_path)])
+    with open(os.path.join(tmp_path, "training_faqs.txt"), "a") as f:
+        f.write("\n\nIs it new?\nYes.")
+
+    loader = DataLoader(str(tmp_path))
+    assert not loader.load_compiled()
+    assert loader.faqs["Is it new?"] == "Yes."
+
+
+def test_corrupt_snapshot_is_rejected(tmp_path):
+    path = default_snapshot_path(str(tmp_path))
+    with open(path, "wb") as f:
+        f.write(b"not a snapshot at all")
+    with pytest.raises(SnapshotError):
+        load_snapshot(path)
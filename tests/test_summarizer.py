@@ -0,0 +1,86 @@
+"""
+Tests for the history ring buffer and background conversation summaries
+"""
+from concurrent.futures import Future
+from types import SimpleNamespace
+from config import chatbot_config as config
+from src.prompt_builder import PromptBuilder, TokenCounter
+from src.session_store import ConversationSession, SessionStore
+from src.summarizer import ConversationSummarizer
+
+
+class FakeClient:
+    """Completion client whose requests are resolved by the test"""
+
+    model = "fake"
+
+    def __init__(self):
+        self.requests = []
+
+    def submit(self, **params):
+        future = Future()
+        self.requests.append((params, future))
+        return future
+
+    def resolve(self, text):
+        params, future = self.requests.pop(0)
+        message = SimpleNamespace(content=text)
+        future.set_result(SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+        return params
+
+
+def test_history_is_a_bounded_ring_buffer():
+    session = ConversationSession("s" * 16, max_messages=4)
+    for i in range(10):
+        session.add_message("user", f"message {i}")
+    assert [content for _, content in session.conversation_history] == [f"message {i}" for i in range(6, 10)]
+    # Evicted messages wait for the summarizer, bounded as well
+    assert [content for _, content in session.pending] == [f"message {i}" for i in range(2, 6)]
+
+
+def test_summary_replaces_pending_messages_off_the_request_path():
+    client = FakeClient()
+    store = SessionStore(history_messages=2)
+    session = store.get_or_create()
+    summarizer = ConversationSummarizer(client, min_pending=2)
+    for text in ["My name is Ada", "Hi Ada", "I use the pro plan", "Noted"]:
+        session.add_message("user", text)
+
+    assert summarizer.schedule(session, store) is not None
+    # Only one summary per session at a time
+    assert summarizer.schedule(session, store) is None
+    session.add_message("user", "newer message")  # Arrives while the summary is pending
+
+    params = client.resolve("The user is Ada.")
+    assert "My name is Ada" in params["messages"][1]["content"]
+    assert session.summary == "The user is Ada."
+    assert [content for _, content in session.pending] == ["I use the pro plan"]
+    assert summarizer.stats() == {"summaries": 1, "errors": 0}
+
+
+def test_every_past_message_is_in_the_prompt_or_the_summary():
+    client = FakeClient()
+    store = SessionStore(history_messages=config.HISTORY_MAX_MESSAGES)
+    session = store.get_or_create()
+    summarizer = ConversationSummarizer(client, min_pending=config.SUMMARY_MIN_MESSAGES)
+    counter = TokenCounter("gpt-3.5-turbo")
+    counter._encoding = None
+    builder = PromptBuilder(counter, history_messages=config.PROMPT_HISTORY_MESSAGES)
+    said, summarized = [], []
+
+    for turn in range(8):
+        question = f"question {turn}"
+        prompt = builder.build("System.", "", "", session.conversation_history, question, session.summary)
+        in_prompt = " ".join(m["content"] for m in prompt.messages)
+        pending = [content for _, content in session.pending or ()]
+        for content in said:
+            assert content in in_prompt or content in pending or content in summarized, content
+
+        for role, content in (("user", question), ("assistant", f"answer {turn}")):
+            session.add_message(role, content)
+            said.append(content)
+        if summarizer.schedule(session, store):
+            params = client.resolve("summary")
+            summarized += [line.split(": ", 1)[1] for line in params["messages"][1]["content"].splitlines()
+                           if line.startswith(("User: ", "Assistant: "))]
+    assert summarized
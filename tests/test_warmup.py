@@ -0,0 +1,24 @@
+"""
+Tests for worker warm-up and readiness reporting
+"""
+from config import chatbot_config as config
+
+
+def test_health_reports_ready_only_after_warm_up(monkeypatch):
+    monkeypatch.setattr(config, "STATE_BACKEND", "memory")
+    monkeypatch.setattr(config, "DATA_WATCH_ENABLED", False)
+    monkeypatch.setattr(config, "OPENAI_WARM_CONNECTIONS", 0)
+    from src import web_embed_generator as web
+    client = web.app.test_client()
+
+    if not web.is_ready():
+        assert client.get('/health').status_code == 503
+    web.start_worker()
+
+    assert web.is_ready()
+    assert client.get('/health').status_code == 200
+    # The knowledge data was loaded and indexed before any chat request
+    snapshot = web.chatbot.data_loader.snapshot
+    assert 'index' in snapshot._derived
+    # Retrieval prompts never read the full context, so it isn't rendered
+    assert 'context' not in snapshot._derived
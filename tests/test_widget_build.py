@@ -0,0 +1,46 @@
+"""
+Tests for the widget bundle build and its cache headers
+"""
+import json
+from config import chatbot_config as config
+from src import widget_build
+
+
+def test_build_writes_a_hashed_bundle_and_a_loader(tmp_path):
+    (tmp_path / "widget.000000000000.js").write_text("old")
+    (tmp_path / "widget.111111111111.js").write_text("older")
+    (tmp_path / "manifest.json").write_text(json.dumps({"bundle": "widget.000000000000.js"}))
+
+    manifest = widget_build.build(str(tmp_path))
+    bundle = (tmp_path / manifest["bundle"]).read_text()
+    loader = (tmp_path / "loader.js").read_text()
+
+    assert widget_build.BUNDLE_PATTERN.match(manifest["bundle"])
+    assert "__WIDGET_CSS__" not in bundle and "#chatbot-widget .cbw-header{" in bundle
+    assert "/*" not in bundle and "\n    " not in bundle
+    assert manifest["bundle"] in loader
+    # The previous bundle stays for pages with a cached loader, older ones go
+    assert manifest["previous"] == "widget.000000000000.js"
+    assert sorted(p.name for p in tmp_path.glob("widget.*.js")) == sorted([manifest["bundle"], "widget.000000000000.js"])
+    assert widget_build.ensure_built(str(tmp_path)) == manifest
+
+
+def test_minify_js_keeps_strings_and_line_breaks_that_matter(monkeypatch):
+    monkeypatch.setattr(widget_build, "rjsmin", None)
+    source = "var a = 'x  //  y';  // comment\nvar b = a + 1\n/* block */\nif (a) {\n    b = 2;\n}\n"
+    assert widget_build.minify_js(source) == "var a='x  //  y';var b=a + 1\nif(a){b=2;}"
+
+
+def test_widget_files_get_long_lived_cache_headers(monkeypatch):
+    monkeypatch.setattr(config, "STATE_BACKEND", "memory")
+    monkeypatch.setattr(config, "DATA_WATCH_ENABLED", False)
+    from src import web_embed_generator as web
+    manifest = widget_build.ensure_built()
+    client = web.app.test_client()
+
+    bundle = client.get(f"/static/widget/{manifest['bundle']}")
+    assert bundle.status_code == 200
+    assert bundle.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    loader = client.get("/static/widget/loader.js")
+    assert loader.headers["Cache-Control"] == f"public, max-age={config.WIDGET_LOADER_MAX_AGE}"
+    assert "loader.js" in client.get("/widget").get_data(as_text=True)
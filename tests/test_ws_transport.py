@@ -0,0 +1,155 @@
+"""
+Tests for the WebSocket chat transport, driven through its ASGI interface
+"""
+import asyncio
+import json
+from concurrent.futures import Future
+from types import SimpleNamespace
+from src.session_store import SessionStore
+from src.shared_state import SharedSessionStore, SQLiteStateBackend
+from src.summarizer import ConversationSummarizer
+from src.ws_transport import CLOSE_MESSAGE_TOO_BIG, WebSocketTransport
+
+
+class FakeBot:
+    """Chatbot that streams a fixed reply and counts the tokens it produced"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.produced = 0
+
+    async def stream_response(self, user_input, session=None):
+        session.add_message("user", user_input)
+        for token in self.tokens:
+            self.produced += 1
+            yield token
+            await asyncio.sleep(0)
+        session.add_message("assistant", "".join(self.tokens))
+
+    def summarize_history(self, session, store=None):
+        pass
+
+
+class FakeSocket:
+    """The server side of a WebSocket: the frames the client sent and received"""
+
+    def __init__(self, frames, send_delay=0):
+        self.incoming = asyncio.Queue()
+        for frame in [{"type": "websocket.connect"}] + frames:
+            self.incoming.put_nowait(frame)
+        self.sent = []
+        self.send_delay = send_delay
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        await asyncio.sleep(self.send_delay)
+        self.sent.append(message)
+
+    def frames(self):
+        return [json.loads(m["text"]) for m in self.sent if m["type"] == "websocket.send"]
+
+    def disconnect(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+
+def text(frame):
+    return {"type": "websocket.receive", "text": json.dumps(frame)}
+
+
+async def converse(transport, socket, until):
+    task = asyncio.ensure_future(transport({"type": "websocket", "path": "/ws"}, socket.receive, socket.send))
+    while not until(socket.frames()):
+        await asyncio.sleep(0.01)
+    socket.disconnect()
+    await asyncio.wait_for(task, 5)
+
+
+def test_replies_are_streamed_and_tagged_over_one_connection():
+    store = SessionStore()
+    bot = FakeBot(["Hello", " there"])
+    transport = WebSocketTransport(lambda: bot, store)
+    socket = FakeSocket([
+        text({"type": "message", "id": "a", "message": "Hi"}),
+        text({"type": "message", "id": "b", "message": "Again"}),
+        text({"type": "ping"}),
+        {"type": "websocket.receive", "text": "not json"},
+    ])
+    asyncio.run(converse(transport, socket, lambda frames: sum(f["type"] == "done" for f in frames) == 2))
+
+    frames = socket.frames()
+    assert frames[0]["type"] == "session"
+    session_id = frames[0]["session_id"]
+    for reply_id in ("a", "b"):
+        assert [f["token"] for f in frames if f.get("id") == reply_id and f["type"] == "token"] == ["Hello", " there"]
+    assert {"type": "pong"} in frames
+    assert {"type": "error", "id": None, "error": "Invalid frame"} in frames
+    # Both turns went into the one session looked up at the handshake
+    assert len(store.get(session_id).conversation_history) == 4
+    assert transport.connections == 0 and transport.total_connections == 1
+
+
+def test_a_slow_client_pauses_its_reply():
+    bot = FakeBot(["token"] * 200)
+    transport = WebSocketTransport(lambda: bot, SessionStore(), send_queue_size=4)
+    socket = FakeSocket([text({"type": "message", "id": 1, "message": "Hi"})], send_delay=0.005)
+    asyncio.run(converse(transport, socket, lambda frames: len(frames) >= 10))
+
+    # The reply only ran ahead of the client by the queue size, then was cancelled
+    assert bot.produced <= len(socket.frames()) + 4 + 1
+    assert bot.produced < 200
+
+
+def test_oversized_frames_close_the_connection():
+    transport = WebSocketTransport(lambda: FakeBot([]), SessionStore(), max_message_bytes=100)
+    socket = FakeSocket([text({"type": "message", "id": 1, "message": "x" * 200})])
+    asyncio.run(asyncio.wait_for(
+        transport({"type": "websocket", "path": "/ws"}, socket.receive, socket.send), 5))
+
+    assert socket.sent[-1] == {"type": "websocket.close", "code": CLOSE_MESSAGE_TOO_BIG}
+
+
+class SummarizingBot(FakeBot):
+    """FakeBot whose summaries are produced at once, recording the summary each question saw"""
+
+    def __init__(self):
+        super().__init__(["Hello"])
+        self.summarizer = ConversationSummarizer(self, min_pending=2, model="fake")
+        self.summaries_seen = []
+
+    def submit(self, **params):
+        future = Future()
+        message = SimpleNamespace(content=f"summary {self.summarizer.summaries + 1}")
+        future.set_result(SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+        return future
+
+    async def stream_response(self, user_input, session=None):
+        self.summaries_seen.append(session.summary)
+        async for token in super().stream_response(user_input, session):
+            yield token
+
+    def summarize_history(self, session, store=None):
+        self.summarizer.schedule(session, store)
+
+
+def test_summaries_reach_later_questions_with_a_shared_store(tmp_path):
+    store = SharedSessionStore(SQLiteStateBackend(str(tmp_path / "state.sqlite3")), history_messages=2)
+    bot = SummarizingBot()
+    transport = WebSocketTransport(lambda: bot, store)
+    socket = FakeSocket([])
+
+    async def scenario():
+        task = asyncio.ensure_future(transport({"type": "websocket", "path": "/ws"}, socket.receive, socket.send))
+        for turn in range(5):
+            socket.incoming.put_nowait(text({"type": "message", "id": turn, "message": f"question {turn}"}))
+            while sum(f["type"] == "done" for f in socket.frames()) <= turn:
+                await asyncio.sleep(0.01)
+        socket.disconnect()
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(scenario())
+    # Each summary was written to the store and read back by the next question
+    assert bot.summaries_seen == ["", "", "summary 1", "summary 2", "summary 3"]
+    session = store.get(socket.frames()[0]["session_id"])
+    assert session.summary == "summary 4" and not session.pending